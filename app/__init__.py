@@ -1,6 +1,7 @@
 """__init__.py"""
 #pylint: disable=wrong-import-position ungrouped-imports wrong-import-order
 from app.extensions import db, migrate # Must be imported before anything else
+import functools
 import logging
 import importlib
 import os
@@ -9,11 +10,29 @@ from dotenv import find_dotenv, load_dotenv
 from flask import Flask
 from flask_login import LoginManager
 from flask_assets import Environment, Bundle
+from sqlalchemy import inspect
 from app.admin import admin
-from app.routes import bp as main_bp
-from app.socket_events import socketio
-from app.models import User
+from app.routes import bp as main_bp, site_view_cache, status_feed
+from app.socket_events import (
+    socketio,
+    log_broker,
+    stats_hub,
+    stream_registry,
+    status_log,
+    job_queue,
+    emit_image_progress,
+    broadcast_statuses,
+    service_status,
+)
+from app.models import User, Service
+from app.models.service import ServiceStat
+from app.service_state import service_state
+from app.stats_history import stats_history
 from app.docker_service_manager import DockerServiceManager
+from app.startup import StartupPipeline
+from app.leader_lock import leader_lock_for
+from app.reconciler import Reconciler
+from app.pg_pubsub import PostgresManager
 #pylint: enable=wrong-import-position ungrouped-imports wrong-import-order
 
 # Initialize dotenv settings
@@ -50,8 +69,137 @@ def format_datetime(value, date_format="%b %Y"):
     return value.strftime(date_format)
 
 
-def create_app():
-    """Create and configure an instance of the Flask application."""
+##### Startup steps #####
+def create_tables(_app):
+    """Create any missing database tables."""
+    db.create_all()
+
+
+def tables_exist(_app) -> bool:
+    """Check whether every database table has been created (by the leader)."""
+    existing = set(inspect(db.engine).get_table_names())
+    return all(table.name in existing for table in db.metadata.sorted_tables)
+
+
+def build_container_index(app):
+    """Index the host's containers for fast lookups."""
+    app.docker_manager.container_index.build()
+
+
+def start_event_listener(app):
+    """Start the Docker event listener that keeps the index and service state current."""
+    docker_event_listener = threading.Thread(
+        target=app.docker_manager.listen_for_events,
+        args=(app,),
+        daemon=True
+    )
+    docker_event_listener.start()
+    app.docker_event_listener = docker_event_listener
+
+
+def handle_daemons(app):
+    """Bring up every daemon service."""
+    app.docker_manager.handle_daemons()
+
+
+def start_reconciler(app):
+    """Start the periodic reconciliation of service rows against Docker."""
+    reconciler = Reconciler(
+        app.docker_manager, app, interval=app.config["RECONCILE_INTERVAL"]
+    )
+    app.docker_manager.reconciler = reconciler
+    reconciler.start()
+
+
+def start_log_archiver(app):
+    """Start archiving the logs of every running managed container."""
+    app.docker_manager.log_archiver.start()
+
+
+def start_stats_history(_app):
+    """Start sampling unwatched services and persisting stats rollups."""
+    stats_history.start()
+
+
+def cache_images(app):
+    """Pre-cache every service image."""
+    app.docker_manager.cache_images()
+
+
+##### Socket.IO #####
+# Events sent between workers go to a room with no members, so they only
+# travel through the message queue. Followers send the leader the state
+# changes they persist, and every worker drops its cached site view when
+# another commits a site change
+QUEUE_ROOM = "queue"
+STATE_FLUSH_EVENT = "service_state_flushed"
+SITE_VIEW_EVENT = "site_view_changed"
+
+
+def init_socketio(app):
+    """Attach Socket.IO, relaying emits between workers through the configured message queue."""
+    message_queue = app.config["SOCKETIO_MESSAGE_QUEUE"]
+    if message_queue == "postgres":
+        manager = PostgresManager(app.config["SQLALCHEMY_DATABASE_URI"])
+        # Followers learn of the leader's status broadcasts as they pass through,
+        # and the leader numbers the state changes followers persisted
+        manager.watch("service_status_batch", relay_status_batch)
+        manager.watch(STATE_FLUSH_EVENT, functools.partial(relay_state_flush, app))
+        manager.watch(SITE_VIEW_EVENT, relay_site_view_change)
+        site_view_cache.on_commit = publish_site_view_change
+        socketio.init_app(app, cors_allowed_origins="*", client_manager=manager)
+    elif message_queue and message_queue != "none":
+        socketio.init_app(app, cors_allowed_origins="*", message_queue=message_queue)
+    else:
+        socketio.init_app(app, cors_allowed_origins="*")
+
+
+def publish_state_flush(app, states):
+    """Refresh the cached site view and broadcast the service states a state store flush wrote.
+
+    Only the leader numbers status batches, so a follower hands its changes
+    to the leader through the message queue.
+    """
+    site_view_cache.invalidate()
+    statuses = [service_status(state, "state") for state in states]
+    if app.startup.is_leader:
+        broadcast_statuses(statuses)
+    else:
+        socketio.emit(
+            STATE_FLUSH_EVENT, {"statuses": statuses}, namespace="/service", to=QUEUE_ROOM
+        )
+
+
+def relay_state_flush(app, data):
+    """Broadcast the service states a follower wrote, if this worker is the leader."""
+    if app.startup.is_leader:
+        broadcast_statuses(data["statuses"])
+
+
+def publish_site_view_change():
+    """Tell the other workers a site change was committed, so they drop their cached site view."""
+    socketio.emit(SITE_VIEW_EVENT, {}, namespace="/service", to=QUEUE_ROOM)
+
+
+def relay_site_view_change(_data):
+    """Drop this worker's cached site view after a site change committed by any worker."""
+    site_view_cache.invalidate()
+
+
+def relay_status_batch(batch):
+    """Record a status batch broadcast by the leader and refresh this worker's cached statuses."""
+    if status_log.adopt(batch["epoch"], batch["seq"], batch["statuses"]):
+        site_view_cache.invalidate()
+
+
+def create_app(warmup=True):
+    """Create and configure an instance of the Flask application.
+
+    Args:
+        warmup (bool, optional): Run the background warmup pipeline (Docker
+            and database bring-up). Defaults to True; scripts that only need
+            the app context can skip it.
+    """
     app = Flask(__name__)
 
     # Configure app settings
@@ -123,19 +271,159 @@ def create_app():
             "SQLALCHEMY_DATABASE_URI"
         )
 
+    # Database connection pool, per worker: green threads share DB_POOL_SIZE
+    # connections plus DB_MAX_OVERFLOW extra under load, waiting up to
+    # DB_POOL_TIMEOUT seconds for one. Connections are checked before use and
+    # recycled after DB_POOL_RECYCLE seconds, so a restarted database or a
+    # dropped idle connection never surfaces as a failed request. The defaults
+    # are SQLAlchemy's own (5 + 10); each worker also holds two Socket.IO queue
+    # connections and the leader one lock connection, so the Dockerfile's four
+    # workers need at most 4 * (5 + 10 + 2) + 1 = 69 of Postgres' default 100
+    # max_connections. Keep that sum below max_connections when raising either.
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"pool_pre_ping": True}
+    if app.config["SQLALCHEMY_DATABASE_URI"].startswith("postgres"):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"].update(
+            {
+                "pool_size": int(os.environ.get("DB_POOL_SIZE", "5")),
+                "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", "10")),
+                "pool_timeout": float(os.environ.get("DB_POOL_TIMEOUT", "10")),
+                "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", "1800")),
+            }
+        )
+
+    # Cap how often shared stats samples are pushed to each service's viewers
+    app.config["STATS_MAX_PUSH_RATE"] = float(
+        os.environ.get("STATS_MAX_PUSH_RATE", "1.0")
+    )
+
+    # Log lines are sent to each viewer in batches of up to LOG_BATCH_LINES, at
+    # least every LOG_FLUSH_INTERVAL_MS; a viewer that falls more than
+    # LOG_CLIENT_BUFFER_LINES behind loses its oldest lines
+    app.config["LOG_BATCH_LINES"] = int(os.environ.get("LOG_BATCH_LINES", "200"))
+    app.config["LOG_FLUSH_INTERVAL_MS"] = int(
+        os.environ.get("LOG_FLUSH_INTERVAL_MS", "100")
+    )
+    app.config["LOG_CLIENT_BUFFER_LINES"] = int(
+        os.environ.get("LOG_CLIENT_BUFFER_LINES", "2000")
+    )
+
+    # Accept regular expressions as log filters from clients (run on RE2 if
+    # installed, else bounded in complexity and time); set to false to match
+    # every filter as plain text
+    app.config["LOG_FILTER_ALLOW_REGEX"] = (
+        os.environ.get("LOG_FILTER_ALLOW_REGEX", "true").lower() == "true"
+    )
+
+    # Number of existing log lines sent when a log viewer opens; older pages are
+    # fetched on demand
+    app.config["LOG_DEFAULT_TAIL"] = int(os.environ.get("LOG_DEFAULT_TAIL", "300"))
+
+    # Cap live log/stats subscriptions overall and per socket session (0 = unlimited)
+    app.config["MAX_LIVE_STREAMS"] = int(os.environ.get("MAX_LIVE_STREAMS", "100"))
+    app.config["MAX_STREAMS_PER_SESSION"] = int(
+        os.environ.get("MAX_STREAMS_PER_SESSION", "10")
+    )
+
+    # Bound the background workers and backlog for Docker start/stop/restart jobs
+    app.config["DOCKER_JOB_WORKERS"] = int(os.environ.get("DOCKER_JOB_WORKERS", "2"))
+    app.config["DOCKER_JOB_QUEUE_DEPTH"] = int(
+        os.environ.get("DOCKER_JOB_QUEUE_DEPTH", "16")
+    )
+
+    # Number of service images pulled at the same time during pre-caching
+    app.config["IMAGE_CACHE_PARALLELISM"] = int(
+        os.environ.get("IMAGE_CACHE_PARALLELISM", "2")
+    )
+
+    # Only the leader runs the one-off warmup steps and singleton Docker tasks:
+    # the holder of a Postgres advisory lock, or of this lock file for other
+    # databases. Followers retry every LEADER_RETRY_INTERVAL seconds.
+    app.config["WARMUP_LOCK_FILE"] = os.environ.get(
+        "WARMUP_LOCK_FILE", "/tmp/mission-control-warmup.lock"
+    )
+    app.config["LEADER_RETRY_INTERVAL"] = float(os.environ.get("LEADER_RETRY_INTERVAL", "10"))
+
+    # Worker processes gunicorn runs (it reads WEB_CONCURRENCY itself). With
+    # more than one, Socket.IO emits are relayed between workers over
+    # SOCKETIO_MESSAGE_QUEUE: "postgres" (LISTEN/NOTIFY on the app database,
+    # the default), a Redis/Kombu URL, or "none"
+    app.config["WORKERS"] = int(os.environ.get("WEB_CONCURRENCY", "1"))
+    app.config["SOCKETIO_MESSAGE_QUEUE"] = os.environ.get(
+        "SOCKETIO_MESSAGE_QUEUE", "postgres" if app.config["WORKERS"] > 1 else "none"
+    )
+
+    # Upper bound (seconds) on how stale the cached landing page may get
+    app.config["SITE_VIEW_CACHE_TTL"] = int(os.environ.get("SITE_VIEW_CACHE_TTL", "60"))
+
+    # Longest a /services/status long poll is held, and the SSE keepalive period
+    app.config["STATUS_LONG_POLL_MAX"] = int(os.environ.get("STATUS_LONG_POLL_MAX", "30"))
+
+    # Status broadcasts kept in memory for clients that reconnect; clients
+    # further behind than this get a snapshot instead
+    app.config["STATUS_DELTA_LOG_SIZE"] = int(os.environ.get("STATUS_DELTA_LOG_SIZE", "256"))
+
+    # How often observed service state changes are written to the database
+    app.config["SERVICE_STATE_FLUSH_INTERVAL"] = float(
+        os.environ.get("SERVICE_STATE_FLUSH_INTERVAL", "1.0")
+    )
+
+    # Seconds between reconciliations of the service table against Docker
+    app.config["RECONCILE_INTERVAL"] = int(os.environ.get("RECONCILE_INTERVAL", "60"))
+
+    # Compressed log archive that keeps service logs after their containers are
+    # removed; segments beyond the per-service size or the age limit are deleted
+    app.config["LOG_ARCHIVE_DIR"] = os.environ.get("LOG_ARCHIVE_DIR", "/data/logs")
+    app.config["LOG_ARCHIVE_SEGMENT_MB"] = int(os.environ.get("LOG_ARCHIVE_SEGMENT_MB", "8"))
+    app.config["LOG_ARCHIVE_MAX_MB"] = int(os.environ.get("LOG_ARCHIVE_MAX_MB", "256"))
+    app.config["LOG_ARCHIVE_MAX_AGE_DAYS"] = int(
+        os.environ.get("LOG_ARCHIVE_MAX_AGE_DAYS", "14")
+    )
+
+    # Stats history: raw samples kept in memory per service, with 1m/10m/1h
+    # rollups written to the database every STATS_FLUSH_INTERVAL seconds
+    app.config["STATS_SAMPLE_INTERVAL"] = int(os.environ.get("STATS_SAMPLE_INTERVAL", "30"))
+    app.config["STATS_FLUSH_INTERVAL"] = int(os.environ.get("STATS_FLUSH_INTERVAL", "60"))
+    app.config["STATS_RAW_SAMPLES"] = int(os.environ.get("STATS_RAW_SAMPLES", "720"))
+
+    # Host overview: containers sampled at most HOST_OVERVIEW_PARALLELISM at a
+    # time, rounds shared by every viewer for HOST_OVERVIEW_TTL seconds
+    app.config["HOST_OVERVIEW_PARALLELISM"] = int(
+        os.environ.get("HOST_OVERVIEW_PARALLELISM", "4")
+    )
+    app.config["HOST_OVERVIEW_TTL"] = float(os.environ.get("HOST_OVERVIEW_TTL", "5"))
+    app.config["HOST_DISK_PATH"] = os.environ.get("HOST_DISK_PATH", "/")
+
     # Configure CSRF protection
     app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "SUPERSECRETKEY")
 
     # Register app blueprints (routes)
     app.register_blueprint(main_bp)
+    site_view_cache.ttl = app.config["SITE_VIEW_CACHE_TTL"]
+    site_view_cache.watch()
+    site_view_cache.on_invalidate = status_feed.changed
 
     # Configure database, migrations, and SocketIO
     db.init_app(app)
     migrate.init_app(app, db)
-    socketio.init_app(app, cors_allowed_origins="*")
-
-    with app.app_context():
-        db.create_all()
+    init_socketio(app)
+    stats_hub.max_push_rate = app.config["STATS_MAX_PUSH_RATE"]
+    log_broker.batch_lines = app.config["LOG_BATCH_LINES"]
+    log_broker.flush_interval = app.config["LOG_FLUSH_INTERVAL_MS"] / 1000
+    log_broker.max_pending = app.config["LOG_CLIENT_BUFFER_LINES"]
+    status_log.capacity = app.config["STATUS_DELTA_LOG_SIZE"]
+    stream_registry.max_streams = app.config["MAX_LIVE_STREAMS"]
+    stream_registry.max_streams_per_session = app.config["MAX_STREAMS_PER_SESSION"]
+    job_queue.max_workers = app.config["DOCKER_JOB_WORKERS"]
+    job_queue.max_depth = app.config["DOCKER_JOB_QUEUE_DEPTH"]
+    job_queue.init_app(app)
+    service_state.flush_interval = app.config["SERVICE_STATE_FLUSH_INTERVAL"]
+    service_state.on_flush = functools.partial(publish_state_flush, app)
+    service_state.init_app(app, Service)
+    stats_history.sample_interval = app.config["STATS_SAMPLE_INTERVAL"]
+    stats_history.flush_interval = app.config["STATS_FLUSH_INTERVAL"]
+    stats_history.raw_capacity = app.config["STATS_RAW_SAMPLES"]
+    stats_history.init_app(app, ServiceStat)
+    stats_hub.on_sample = stats_history.record
 
     # Register Jinja2 filters
     app.jinja_env.filters["datetime"] = format_datetime
@@ -146,18 +434,33 @@ def create_app():
 
     # Register custom services with Flask context
     dsm = DockerServiceManager()
-    with app.app_context():
-        dsm.cache_images()
-        dsm.handle_daemons()
+    dsm.image_cache.max_parallel = app.config["IMAGE_CACHE_PARALLELISM"]
+    dsm.image_cache.on_progress = emit_image_progress
+    dsm.host_overview.max_parallel = app.config["HOST_OVERVIEW_PARALLELISM"]
+    dsm.host_overview.ttl = app.config["HOST_OVERVIEW_TTL"]
+    dsm.host_overview.disk_path = app.config["HOST_DISK_PATH"]
+    dsm.log_archive.root = app.config["LOG_ARCHIVE_DIR"]
+    dsm.log_archive.segment_bytes = app.config["LOG_ARCHIVE_SEGMENT_MB"] * 1024 * 1024
+    dsm.log_archive.max_bytes = app.config["LOG_ARCHIVE_MAX_MB"] * 1024 * 1024
+    dsm.log_archive.max_age = app.config["LOG_ARCHIVE_MAX_AGE_DAYS"] * 24 * 3600
     app.docker_manager = dsm
 
-    # Start docker event listener
-    docker_event_listener = threading.Thread(
-        target=app.docker_manager.listen_for_events,
-        args=(app,),
-        daemon=True
+    # Warm up Docker and the database in the background so the app serves immediately
+    startup = StartupPipeline(
+        app,
+        leader_lock_for(app.config["SQLALCHEMY_DATABASE_URI"], app.config["WARMUP_LOCK_FILE"]),
+        retry_interval=app.config["LEADER_RETRY_INTERVAL"],
     )
-    docker_event_listener.start()
-    app.docker_event_listener = docker_event_listener
+    startup.add_step("create_tables", create_tables, exclusive=True, ready_check=tables_exist)
+    startup.add_step("build_container_index", build_container_index)
+    startup.add_step("start_event_listener", start_event_listener)
+    startup.add_step("handle_daemons", handle_daemons, exclusive=True)
+    startup.add_step("start_reconciler", start_reconciler, exclusive=True)
+    startup.add_step("start_log_archiver", start_log_archiver, exclusive=True, required=False)
+    startup.add_step("start_stats_history", start_stats_history, exclusive=True, required=False)
+    startup.add_step("cache_images", cache_images, exclusive=True, required=False)
+    app.startup = startup
+    if warmup:
+        startup.start(socketio)
 
     return app
@@ -0,0 +1,241 @@
+"""In-memory index of Docker containers kept current from the Docker event stream."""
+import logging
+import threading
+import time
+import docker
+
+logger = logging.getLogger(__name__)
+
+# Ownership labels stamped on every container started by DockerServiceManager
+LABEL_PREFIX = "space.makurspace.mission-control"
+SERVICE_LABEL = f"{LABEL_PREFIX}.service-id"
+SITE_LABEL = f"{LABEL_PREFIX}.site-id"
+SPEC_HASH_LABEL = f"{LABEL_PREFIX}.spec-hash"
+
+# Server-side filter matching only containers owned by mission-control
+MANAGED_FILTER = {"label": SERVICE_LABEL}
+
+# Docker event statuses that change what the index knows about a container
+RUNNING_EVENTS = ("start", "restart", "unpause")
+STOPPED_EVENTS = ("die", "stop", "kill", "oom", "pause")
+REMOVED_EVENTS = ("destroy",)
+
+
+class ContainerIndex:
+    """Class to index managed containers by id and service label.
+
+    The index is built with a single sparse, label-filtered `containers.list`
+    call and then updated from Docker events, so lookups are dictionary hits
+    and unrelated containers on the host cost nothing. The Docker API is only
+    consulted when a lookup misses.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.built_at = None
+        self._lock = threading.Lock()
+        self._by_id = {}
+        self._by_service = {}
+
+    def build(self) -> int:
+        """(Re)build the index from every managed container on the host.
+
+        Returns:
+            int: The number of containers indexed.
+        """
+        built_at = int(time.time())
+        containers = self.client.containers.list(
+            all=True, sparse=True, filters=MANAGED_FILTER
+        )
+        with self._lock:
+            self._by_id.clear()
+            self._by_service.clear()
+            for container in containers:
+                self._add(container)
+            self.built_at = built_at
+        logger.info("Indexed %s containers", len(containers))
+        return len(containers)
+
+    def get(self, container_id) -> docker.models.containers.Container:
+        """Get a container by id, falling back to the Docker API on a miss.
+
+        Args:
+            container_id (str): Full container id.
+
+        Returns:
+            docker.models.containers.Container: The container, or None if it does not exist.
+        """
+        with self._lock:
+            container = self._by_id.get(container_id)
+        if container:
+            return container
+
+        logger.debug("Container index miss for id %s", container_id)
+        try:
+            container = self.client.containers.get(container_id)
+        except docker.errors.NotFound:
+            return None
+        with self._lock:
+            self._add(container)
+        return container
+
+    def peek(self, container_id) -> docker.models.containers.Container:
+        """Get a container by id from the index only, without an API fallback."""
+        with self._lock:
+            return self._by_id.get(container_id)
+
+    def update(self, containers) -> None:
+        """Add or refresh containers listed from the Docker API."""
+        with self._lock:
+            for container in containers:
+                self._add(container)
+
+    def find_by_service(self, service_id) -> docker.models.containers.Container:
+        """Get the container labelled with a service id, falling back to the Docker API on a miss.
+
+        Args:
+            service_id (int): The service id stamped on the container.
+
+        Returns:
+            docker.models.containers.Container: The container, preferring a running one, or None.
+        """
+        with self._lock:
+            container = self._by_id.get(self._by_service.get(str(service_id)))
+        if container:
+            return container
+
+        logger.debug("Container index miss for service %s", service_id)
+        containers = self.client.containers.list(
+            all=True, sparse=True, filters={"label": f"{SERVICE_LABEL}={service_id}"}
+        )
+        if not containers:
+            return None
+        containers.sort(key=lambda candidate: candidate.status == "running")
+        self.update(containers)
+        return containers[-1]
+
+    def find_unlabelled(self, image, exclude=()) -> docker.models.containers.Container:
+        """Get a container created from an image without ownership labels, from the Docker API.
+
+        Containers started before ownership labels were stamped can only be
+        matched by the image they were created from.
+
+        Args:
+            image (str): Image reference, including the tag.
+            exclude (iterable, optional): Container ids already claimed by other services.
+
+        Returns:
+            docker.models.containers.Container: The container, preferring a running one, or None.
+        """
+        containers = [
+            container
+            for container in self.client.containers.list(
+                all=True, sparse=True, filters={"ancestor": image}
+            )
+            if SERVICE_LABEL not in labels_of(container) and container.id not in exclude
+        ]
+        if not containers:
+            return None
+        containers.sort(key=lambda candidate: candidate.status == "running")
+        self.update(containers[-1:])
+        return containers[-1]
+
+    def managed(self) -> list:
+        """Get (service id, container) for the indexed container of every service."""
+        with self._lock:
+            return [
+                (int(service_id), self._by_id[container_id])
+                for service_id, container_id in self._by_service.items()
+                if service_id.isdigit()
+            ]
+
+    def apply_event(self, event) -> None:
+        """Update the index from a decoded Docker container event."""
+        container_id = event_container_id(event)
+        status = event_status(event)
+        if not container_id or not status:
+            return
+
+        with self._lock:
+            if status in REMOVED_EVENTS:
+                self._remove(container_id)
+                return
+
+            container = self._by_id.get(container_id)
+            if container is None:
+                attributes = event.get("Actor", {}).get("Attributes", {})
+                container = self.client.containers.prepare_model(
+                    {
+                        "Id": container_id,
+                        "Image": attributes.get("image"),
+                        "Labels": attributes,
+                        "State": "created",
+                    }
+                )
+                self._add(container)
+
+            if status in RUNNING_EVENTS:
+                _set_status(container, "running")
+            elif status in STOPPED_EVENTS:
+                _set_status(container, "paused" if status == "pause" else "exited")
+
+    def __len__(self):
+        with self._lock:
+            return len(self._by_id)
+
+    ##### Internal helpers (caller holds the lock) #####
+    def _add(self, container) -> None:
+        self._remove(container.id)
+        self._by_id[container.id] = container
+        service_id = labels_of(container).get(SERVICE_LABEL)
+        if service_id:
+            self._by_service[service_id] = container.id
+
+    def _remove(self, container_id) -> None:
+        container = self._by_id.pop(container_id, None)
+        if container is None:
+            return
+        service_id = labels_of(container).get(SERVICE_LABEL)
+        if service_id and self._by_service.get(service_id) == container_id:
+            del self._by_service[service_id]
+
+
+##### Static methods #####
+def event_container_id(event) -> str:
+    """Get the container id of a decoded event (newer API versions drop the top-level `id`)."""
+    return event.get("id") or event.get("Actor", {}).get("ID")
+
+
+def event_status(event) -> str:
+    """Get the action of a decoded event (newer API versions drop the top-level `status`)."""
+    return event.get("status") or event.get("Action")
+
+
+def labels_of(container) -> dict:
+    """Get the labels from sparse or fully inspected container attrs."""
+    attrs = container.attrs
+    if isinstance(attrs.get("Config"), dict):
+        return attrs["Config"].get("Labels") or {}
+    return attrs.get("Labels") or {}
+
+
+def health_of(container) -> str:
+    """Get the healthcheck status from sparse or fully inspected container attrs, if any."""
+    state = container.attrs.get("State")
+    if isinstance(state, dict):
+        return (state.get("Health") or {}).get("Status")
+    status = container.attrs.get("Status") or ""
+    for health in ("healthy", "unhealthy", "health: starting"):
+        if f"({health})" in status:
+            return health.replace("health: ", "")
+    return None
+
+
+def _set_status(container, status) -> None:
+    """Set the cached status on sparse or fully inspected container attrs."""
+    state = container.attrs.get("State")
+    if isinstance(state, dict):
+        state["Status"] = status
+        state["Running"] = status == "running"
+    else:
+        container.attrs["State"] = status
@@ -0,0 +1,193 @@
+"""Concurrent, dependency-aware bring-up of daemon services."""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.models import Service
+
+logger = logging.getLogger(__name__)
+
+# How long to wait for a daemon without a healthcheck to report running
+DEFAULT_START_TIMEOUT = 30
+
+
+class DaemonStartResult:
+    """Outcome of bringing up a single daemon."""
+
+    def __init__(self, service_id, name):
+        self.service_id = service_id
+        self.name = name
+        self.status = "pending"
+        self.error = None
+        self.latency = None
+
+    def to_dict(self) -> dict:
+        """Serialize for logging and the daemons endpoint."""
+        return {
+            "service_id": self.service_id,
+            "name": self.name,
+            "status": self.status,
+            "error": self.error,
+            "latency": self.latency,
+        }
+
+
+class DaemonSupervisor:
+    """Class to bring every daemon service up concurrently.
+
+    Daemons start in parallel except where `Service.depends_on` names another
+    daemon, which is waited for first. Containers that are already running and
+    healthy are left alone, and a start counts as done once Docker reports the
+    container healthy (or running, if it has no healthcheck).
+    """
+
+    def __init__(self, manager, poll_interval=1.0):
+        self.manager = manager
+        self.poll_interval = poll_interval
+        self.results = {}
+
+    def bring_up(self, app, services) -> dict:
+        """Bring up every daemon service.
+
+        Args:
+            app (Flask): The app, used to open an app context per daemon.
+            services (list): The daemon services to bring up.
+
+        Returns:
+            dict: A DaemonStartResult per service id.
+        """
+        daemon_ids = {service.id for service in services}
+        depends_on = {
+            service.id: service.depends_on_id
+            for service in services
+            if service.depends_on_id in daemon_ids
+        }
+        _break_cycles(depends_on)
+
+        done = {service.id: threading.Event() for service in services}
+        self.results = {
+            service.id: DaemonStartResult(service.id, service.name) for service in services
+        }
+        if not services:
+            return self.results
+
+        def run(service_id):
+            dependency = depends_on.get(service_id)
+            if dependency:
+                done[dependency].wait()
+                if self.results[dependency].status == "failed":
+                    logger.warning(
+                        "Starting daemon %s although its dependency %s failed",
+                        service_id,
+                        dependency,
+                    )
+            try:
+                with app.app_context():
+                    self._bring_up_one(service_id)
+            finally:
+                done[service_id].set()
+
+        with ThreadPoolExecutor(max_workers=len(services)) as pool:
+            list(pool.map(run, done))
+        return self.results
+
+    def _bring_up_one(self, service_id) -> None:
+        """Start one daemon if needed and wait for it to become healthy."""
+        service = Service.get_with_graph(service_id)
+        result = self.results[service_id]
+        started = time.monotonic()
+        try:
+            container = self.manager.find_container(service)
+            if container:
+                container.reload()
+            if container and _is_healthy(container):
+                result.status = "already_running"
+                logger.info("Daemon service %s is already running and healthy", service.name)
+                return
+
+            if (
+                container
+                and container.status == "running"
+                and _health_status(container) == "starting"
+            ):
+                # Still inside its start period; restarting would only add downtime
+                logger.info("Daemon service %s is starting. Waiting for it...", service.name)
+            elif container and container.status == "running":
+                logger.info("Daemon service %s is unhealthy. Restarting...", service.name)
+                container.restart()
+            else:
+                logger.info("Daemon service %s is not running. Starting...", service.name)
+                container = self.manager.start_service(service)
+
+            self._wait_until_healthy(container, _start_timeout(service))
+            service.update_state(True, container.id)
+            result.status = "started"
+        except Exception as e:  # pylint: disable=broad-except
+            result.status = "failed"
+            result.error = str(e)
+            logger.error("Daemon service %s failed to start: %s", service.name, e)
+        finally:
+            result.latency = round(time.monotonic() - started, 3)
+            logger.info(
+                "Daemon service %s %s in %.2fs", service.name, result.status, result.latency
+            )
+
+    def _wait_until_healthy(self, container, timeout) -> None:
+        """Poll the container until it is healthy, raising if it is not within the timeout."""
+        deadline = time.monotonic() + timeout
+        while True:
+            container.reload()
+            if _is_healthy(container):
+                return
+            health = _health_status(container)
+            if container.status in ("exited", "dead") or health == "unhealthy":
+                raise RuntimeError(
+                    f"Container {container.short_id} is {health or container.status}"
+                )
+            if time.monotonic() >= deadline:
+                raise TimeoutError(
+                    f"Container {container.short_id} not healthy after {timeout}s"
+                )
+            time.sleep(self.poll_interval)
+
+
+##### Static methods #####
+def _health_status(container) -> str:
+    """Get the Docker healthcheck status of an inspected container, if it has one."""
+    health = container.attrs.get("State", {}).get("Health")
+    return health.get("Status") if health else None
+
+
+def _is_healthy(container) -> bool:
+    """Check whether a container is running and, if it has a healthcheck, healthy."""
+    if container.status != "running":
+        return False
+    health = _health_status(container)
+    return health is None or health == "healthy"
+
+
+def _start_timeout(service) -> int:
+    """Get how long a daemon may take to become healthy, from its healthcheck settings."""
+    healthcheck = service.docker_healthcheck
+    if not healthcheck:
+        return DEFAULT_START_TIMEOUT
+    return (
+        healthcheck.start_period
+        + (healthcheck.interval + healthcheck.timeout) * (healthcheck.retries + 1)
+    )
+
+
+def _break_cycles(depends_on) -> None:
+    """Drop dependencies that form a cycle so that bring-up cannot deadlock."""
+    for service_id in list(depends_on):
+        seen = {service_id}
+        previous, current = service_id, depends_on.get(service_id)
+        while current is not None:
+            if current in seen:
+                logger.warning(
+                    "Ignoring circular daemon dependency of service %s", previous
+                )
+                depends_on.pop(previous, None)
+                break
+            seen.add(current)
+            previous, current = current, depends_on.get(current)
@@ -0,0 +1,151 @@
+"""Resilient, batched pipeline from the Docker event stream to service state."""
+import logging
+import queue
+import threading
+import time
+from app.container_index import SERVICE_LABEL, event_container_id, event_status
+from app.models import Service
+
+logger = logging.getLogger(__name__)
+
+# Only containers carrying the ownership label reach the pipeline
+EVENT_FILTERS = {
+    "type": ["container"],
+    "event": ["start", "stop", "die", "destroy"],
+    "label": [SERVICE_LABEL],
+}
+
+
+class ContainerChange:
+    """The latest known state of one container within a batch of events."""
+
+    def __init__(self, container_id, status, service_id):
+        self.container_id = container_id
+        self.status = status
+        self.service_id = service_id
+
+    @property
+    def is_running(self) -> bool:
+        return self.status == "start"
+
+    @classmethod
+    def from_event(cls, event):
+        """Build a change from a decoded event, using only the attributes it carries."""
+        attributes = event.get("Actor", {}).get("Attributes", {})
+        service_id = attributes.get(SERVICE_LABEL)
+        return cls(
+            event_container_id(event),
+            event_status(event),
+            int(service_id) if service_id and service_id.isdigit() else None,
+        )
+
+
+class DockerEventPipeline:
+    """Class to turn the Docker event stream into batched service state updates.
+
+    A reader keeps the event stream open, reconnecting with backoff and
+    replaying from the last event seen (`since`) so that nothing is lost while
+    disconnected. Events feed the container index straight away and are then
+    collected for `batch_window` seconds, coalesced to the last state of each
+    container (a restart's stop/die/start becomes a single start), and applied
+    to the database and broadcast to clients once per batch. When several
+    workers run, every one keeps its index current but only the one for which
+    `is_leader()` is true applies and broadcasts the batches.
+    """
+
+    def __init__(
+        self, manager, app, batch_window=0.5, max_backoff=30, on_reconnect=None, is_leader=None
+    ):
+        self.manager = manager
+        self.app = app
+        self.batch_window = batch_window
+        self.max_backoff = max_backoff
+        self.on_reconnect = on_reconnect
+        self.is_leader = is_leader
+        self.reconnects = 0
+        self.last_event_nano = None
+        self._events = queue.Queue()
+
+    def run(self) -> None:
+        """Run the pipeline; the reader runs here and the batcher in a background thread."""
+        threading.Thread(target=self._apply_batches, daemon=True).start()
+        self._read_events()
+
+    def _read_events(self) -> None:
+        """Read events forever, reconnecting and replaying after any failure."""
+        since = self.manager.container_index.built_at
+        backoff = 1
+        while True:
+            try:
+                if self.last_event_nano is not None:
+                    since = self.last_event_nano // 1_000_000_000
+                events = self.manager.client.events(
+                    since=since, filters=EVENT_FILTERS, decode=True
+                )
+                if self.reconnects:
+                    logger.info("Docker event stream reconnected; replaying since %s", since)
+                    if self.on_reconnect:
+                        self.on_reconnect()
+                backoff = 1
+                for event in events:
+                    self._accept(event)
+                logger.warning("Docker event stream closed")
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error("Docker event stream failed: %s", e)
+            self.reconnects += 1
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _accept(self, event) -> None:
+        """Feed one event into the index and the batch queue, skipping replayed duplicates."""
+        time_nano = event.get("timeNano")
+        if time_nano is not None:
+            if self.last_event_nano is not None and time_nano <= self.last_event_nano:
+                return
+            self.last_event_nano = time_nano
+        logger.debug(
+            "Docker event: %s for container %s", event_status(event), event_container_id(event)
+        )
+        self.manager.container_index.apply_event(event)
+        self._events.put(event)
+
+    def _apply_batches(self) -> None:
+        """Collect events into batches and apply each batch in one transaction."""
+        while True:
+            batch = [self._events.get()]
+            deadline = time.monotonic() + self.batch_window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._events.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            if self.is_leader and not self.is_leader():
+                continue
+            changes = coalesce(batch)
+            logger.debug("Applying %s container changes from %s events", len(changes), len(batch))
+            with self.app.app_context():
+                try:
+                    Service.apply_docker_changes(changes)
+                except Exception as e:  # pylint: disable=broad-except
+                    logger.error("Error applying Docker events: %s", e)
+            for change in changes:
+                if change.is_running and change.service_id:
+                    self.manager.log_archiver.follow(change.service_id, change.container_id)
+
+
+##### Static methods #####
+def coalesce(events) -> list:
+    """Reduce a batch of events to the last change for each container, in order."""
+    changes = {}
+    for event in events:
+        change = ContainerChange.from_event(event)
+        previous = changes.pop(change.container_id, None)
+        if previous:
+            # Keep what earlier events knew if the later one lacks it
+            change.service_id = change.service_id or previous.service_id
+        changes[change.container_id] = change
+    return list(changes.values())
@@ -1,10 +1,28 @@
 """Module to manage docker containers."""
 import os
+import json
+import math
+import hashlib
 import logging
 import docker
-from docker.errors import ImageNotFound, APIError
+from flask import current_app
 
 from app.models import Service
+from app.container_index import (
+    ContainerIndex,
+    SERVICE_LABEL,
+    SITE_LABEL,
+    SPEC_HASH_LABEL,
+    health_of,
+    labels_of,
+)
+from app.image_cache import ImageCache
+from app.host_overview import HostOverview, derive_metrics
+from app.log_archive import LogArchive, LogArchiver
+from app.log_filter import source_of
+from app.log_framing import frame_lines, split_timestamp, timestamp_ns
+from app.daemon_supervisor import DaemonSupervisor
+from app.docker_events import DockerEventPipeline
 
 logger = logging.getLogger(__name__)
 
@@ -14,10 +32,26 @@ class DockerServiceManager:
 
     def __init__(self):
         self.client = docker.from_env()
+        self.container_index = ContainerIndex(self.client)
+        self.image_cache = ImageCache(self.client)
+        self.daemon_supervisor = DaemonSupervisor(self)
+        self.log_archive = LogArchive()
+        self.log_archiver = LogArchiver(self, self.log_archive)
+        self.host_overview = HostOverview(self)
+        self.event_pipeline = None
+        self.reconciler = None
+        self._legacy_checked = set()
 
     def find_container(self, service) -> docker.models.containers.Container:
         """Find a container by service definition.
 
+        Containers are matched by their recorded id or by the service id label
+        stamped on them at start. Lookups are served from the container index
+        and only fall back to a label-filtered Docker API call on a miss.
+        Containers started before ownership labels were stamped are looked up
+        by image:tag once per service; a match has its id recorded on the
+        service, so later lookups find it by id.
+
         Args:
             service (Service): The service to find the container for.
 
@@ -28,50 +62,34 @@ class DockerServiceManager:
         try:
             target_container = None
             if service.docker_container_id:
-                try:
-                    logger.debug(
-                        "Searching for existing container %s",
-                        service.docker_container_id,
-                    )
-                    target_container = self.client.containers.get(
-                        service.docker_container_id
-                    )
-                except docker.errors.NotFound:
-                    logger.debug(
-                        "Container not found. Updating state and searching by image name."
-                    )
-                    service.update_state(False, None)
-                    target_container = self.find_container(service)
-
+                logger.debug(
+                    "Searching for existing container %s",
+                    service.docker_container_id,
+                )
+                target_container = self.container_index.get(
+                    service.docker_container_id
+                )
                 if target_container:
                     logger.debug("Found existing container %s", target_container)
                 else:
                     logger.debug(
-                        "Container recorded in database not found. Updating state and searching by image name."
+                        "Container recorded in database not found. "
+                        "Updating state and searching by label."
                     )
                     service.update_state(False, None)
-                    target_container = self.find_container(service)
-            else:
-                # If the container ID is not set, try to find it by image name
-                containers = self.client.containers.list()
-                logger.debug(
-                    "No container ID found. Searching by image name %s:%s",
-                    service.docker_image,
-                    service.docker_image_tag,
-                )
-                for container in containers:
-                    logger.debug("Container image: %s", container.image.tags[0])
-                    if (
-                        container.image.tags[0]
-                        == service.docker_image + ":" + service.docker_image_tag
-                    ):
-                        target_container = container
-                        break
+
+            if not target_container:
+                target_container = self.container_index.find_by_service(service.id)
+
+            if not target_container and service.id not in self._legacy_checked:
+                target_container = self._find_legacy_container(service)
 
             logger.debug("Target container: %s", target_container)
             if target_container:
                 service.update_state(
-                    target_container.status == "running", target_container.id
+                    target_container.status == "running",
+                    target_container.id,
+                    health_of(target_container),
                 )
             return target_container
         except docker.errors.NotFound as e:
@@ -81,65 +99,65 @@ class DockerServiceManager:
             logger.error("API error occurred: %s", e)
             raise
 
-    def listen_for_events(self, app) -> None:
-        """Listen for Docker events."""
-        event_filters = {
-            "type": ["container"],
-            "event": ["start", "stop", "die", "destroy"],
+    def _find_legacy_container(self, service) -> docker.models.containers.Container:
+        """Look up an unlabelled container created from the service's image:tag."""
+        self._legacy_checked.add(service.id)
+        image = f"{service.docker_image}:{service.docker_image_tag}"
+        claimed = {
+            container_id
+            for (container_id,) in Service.query.with_entities(Service.docker_container_id)
+            .filter(Service.id != service.id, Service.docker_container_id.isnot(None))
+            .all()
         }
-
-        for event in self.client.events(filters=event_filters, decode=True):
-            logger.debug(
-                "Docker event: %s for container %s",
-                event.get("status"),
-                event.get("id"),
+        container = self.container_index.find_unlabelled(image, exclude=claimed)
+        if container:
+            logger.info(
+                "Adopting unlabelled container %s of image %s for service %s",
+                container.short_id,
+                image,
+                service.name,
             )
-            # Extract the container id and event info
-            container_id = event["id"]
-            status = event["status"]
-            container = self.client.containers.get(container_id)
+        return container
+
+    def listen_for_events(self, app) -> None:
+        """Listen for Docker events, reconnecting as needed, and apply them in batches."""
+        self.event_pipeline = DockerEventPipeline(
+            self,
+            app,
+            on_reconnect=self._on_events_reconnect,
+            is_leader=lambda: app.startup.is_leader is not False,
+        )
+        self.event_pipeline.run()
 
-            # Handle the event
-            with app.app_context():
-                Service.handle_docker_event(app, container, status)
+    def _on_events_reconnect(self) -> None:
+        """Reconcile right away after the event stream was down, in case events were missed."""
+        if self.reconciler:
+            self.reconciler.trigger()
 
     def start_service(self, service) -> docker.models.containers.Container:
         """Start a container from a service definition."""
         try:
+            spec = container_spec(service)
+            labels = ownership_labels(service, spec)
             # Search for an existing container
             container = self.find_container(service)
             if container:
-                # If the container isn't running but already exists, start it
-                if not container.status == "running":
+                if container.status == "running":
+                    return container
+                if labels_of(container).get(SPEC_HASH_LABEL) == labels[SPEC_HASH_LABEL]:
+                    # If the container isn't running but already exists, start it
                     container.start()
-                return container, None
-
-            # Time values are stored in seconds but need to be in nanoseconds for docker-py
-            if service.docker_healthcheck:
-                healthcheck = {
-                    "test": service.docker_healthcheck.test,
-                    "interval": service.docker_healthcheck.interval * 1_000_000_000,
-                    "timeout": service.docker_healthcheck.timeout * 1_000_000_000,
-                    "retries": service.docker_healthcheck.retries,
-                    "start_period": service.docker_healthcheck.start_period
-                    * 1_000_000_000,
-                }
-            else:
-                healthcheck = None
+                    return container
+                # The service definition changed since this container was created
+                logger.info(
+                    "Service %s definition changed. Recreating container %s",
+                    service.name,
+                    container.short_id,
+                )
+                container.remove()
 
             container = self.client.containers.run(
-                image=service.docker_image,
-                volumes=get_volume_mappings(service),
-                ports={
-                    f"{port.container_port}/tcp": port.host_port
-                    for port in service.docker_ports
-                },
-                healthcheck=healthcheck,
-                devices=[
-                    f"{device.host_path}:{device.container_path}:{device.cgroup_permissions}"
-                    for device in service.docker_devices
-                ],
-                labels={label.key: label.value for label in service.docker_labels},
+                **{**spec, "labels": {**spec["labels"], **labels}},
                 restart_policy={"Name": "unless-stopped"},
                 detach=True,
             )
@@ -174,35 +192,116 @@ class DockerServiceManager:
         except ServiceContainerNotFound:
             return self.start_service(service)
 
-    def stream_container_logs(self, service) -> str:
-        """Stream logs from a container."""
+    def open_log_stream(
+        self, service, tail="all", since=None, until=None, source="all", timestamps=False
+    ):
+        """Open a raw, closable log stream for a service's container.
+
+        Args:
+            service (Service): The service whose logs to read.
+            tail (int | str, optional): Number of existing lines to start with, or "all".
+            since (float, optional): Only lines after this epoch time (seconds).
+            until (float, optional): Only lines before this epoch time; the
+                stream then ends instead of following new output.
+            source (str, optional): "all", "stdout" or "stderr".
+            timestamps (bool, optional): Prefix every line with its RFC 3339 timestamp.
+
+        Returns:
+            docker.types.daemon.CancellableStream: The log stream, or None if no container
+                was found.
+        """
         container = self.find_container(service)
+        if not container:
+            return None
         try:
-            if container:
-                for line in container.logs(stream=True, follow=True):
-                    yield line.decode("utf-8")
+            return container.logs(
+                stream=True,
+                follow=until is None,
+                timestamps=timestamps,
+                **log_window(tail, since, until, source),
+            )
+        except docker.errors.APIError as e:
+            logger.error("API error occurred: %s", e)
+            raise
+
+    def stream_container_logs(self, service, tail="all", since=None, until=None) -> str:
+        """Stream logs from a container, one complete line at a time."""
+        log_stream = self.open_log_stream(service, tail, since, until)
+        try:
+            if log_stream:
+                yield from frame_lines(log_stream)
             else:
                 yield "warning: Container not found"
         except docker.errors.APIError as e:
             logger.error("API error occurred: %s", e)
             raise
 
+    def read_logs(self, service, tail="all", since=None, until=None, source="all") -> list:
+        """Read a window of existing log lines without following the log.
+
+        Returns:
+            list: (timestamp, line) tuples, oldest first, or None if no container was found.
+        """
+        container = self.find_container(service)
+        if not container:
+            return None
+        try:
+            output = container.logs(
+                stream=False, timestamps=True, **log_window(tail, since, until, source)
+            )
+        except docker.errors.APIError as e:
+            logger.error("API error occurred: %s", e)
+            raise
+        return [split_timestamp(line) for line in frame_lines([output])]
+
+    def page_logs(self, service, before=None, since=None, limit=200) -> dict:
+        """Get the page of log lines that precedes a cursor.
+
+        Docker can only bound a log read by whole seconds and by a line count
+        from the end, so the read is widened until it holds `limit` lines
+        older than the cursor or the log is exhausted.
+
+        Args:
+            service (Service): The service whose logs to read.
+            before (str, optional): Cursor from a previous page; None for the newest lines.
+            since (float, optional): Don't page back past this epoch time (seconds).
+            limit (int, optional): Maximum number of lines in the page.
+
+        Returns:
+            dict: The lines, oldest first, and the cursor of the next older page (None when done).
+        """
+        before_ns = timestamp_ns(before) if before else None
+        until = before_ns // 1_000_000_000 + 1 if before_ns is not None else None
+        tail = limit + 1
+        while True:
+            entries = self.read_logs(service, tail, since, until)
+            if entries is None:
+                raise ServiceContainerNotFound()
+            read = len(entries)
+            if before_ns is not None:
+                entries = [
+                    (timestamp, line)
+                    for timestamp, line in entries
+                    if timestamp_ns(timestamp) < before_ns
+                ]
+            if len(entries) > limit or read < tail:
+                break
+            tail *= 2
+
+        has_more = len(entries) > limit
+        entries = entries[-limit:]
+        return {
+            "service_id": service.id,
+            "lines": [{"timestamp": timestamp, "line": line} for timestamp, line in entries],
+            "cursor": entries[0][0] if has_more else None,
+        }
+
     def stream_container_stats(self, service) -> dict:
         """Get container stats from a container."""
         container = self.find_container(service)
         try:
             if container:
-                for stats in container.stats(stream=True, decode=True):
-                    cpu_usage = calculate_cpu_percent(stats)
-                    memory_usage = stats["memory_stats"]["usage"]
-                    disk_usage_list = stats["blkio_stats"]["io_service_bytes_recursive"]
-                    disk_usage = disk_usage_list[0]["value"] if disk_usage_list else 0
-
-                    yield {
-                        "cpu_usage": cpu_usage,
-                        "memory_usage": memory_usage,
-                        "disk_usage": disk_usage,
-                    }
+                yield from summarized_stats(container.stats(stream=True, decode=True))
             else:
                 yield {
                     "cpu_usage": "Container not found",
@@ -213,50 +312,66 @@ class DockerServiceManager:
             logger.error("API error occurred: %s", e)
             raise
 
+    def open_stats_stream(self, service):
+        """Open a stream of summarized stats for a service's container.
+
+        Returns:
+            generator: Summarized stats samples, or None if no container was found.
+                Closing it closes the Docker stats stream.
+        """
+        container = self.find_container(service)
+        if not container:
+            return None
+        try:
+            upstream = container.stats(stream=True, decode=True)
+        except docker.errors.APIError as e:
+            logger.error("API error occurred: %s", e)
+            raise
+        return summarized_stats(upstream)
+
     def handle_daemons(self) -> bool:
-        """All is_daemon services are handled here."""
+        """All is_daemon services are handled here.
+
+        Daemons are brought up concurrently by the DaemonSupervisor; the
+        per-service outcome and start latency are kept in `daemon_results`.
+
+        Returns:
+            bool: True if every daemon is running.
+        """
         daemon_services = Service.query.filter_by(
             is_daemon=True, is_disabled=False
         ).all()
-        for service in daemon_services:
-            logger.debug("Checking daemon service %s", service.name)
-            container = self.find_container(service)
-            if container:
-                logger.debug(
-                    "Found container %s for service %s", container, service.name
-                )
-                if service.is_running:
-                    logger.debug("Daemon service %s is running. Restarting...", service.name)
-                    container.restart()
-                    return True
-            logger.debug("Daemon service %s is not running. Starting...", service.name)
-            container = self.start_service(service)
-            if container:
-                logger.debug("Daemon service %s started successfully", service.name)
-                return True
-            logger.debug("Daemon service %s failed to start", service.name)
-            return False
+        logger.info("Bringing up %s daemon services", len(daemon_services))
+        results = self.daemon_supervisor.bring_up(
+            current_app._get_current_object(),  # pylint: disable=protected-access
+            daemon_services,
+        )
+        return all(result.status != "failed" for result in results.values())
+
+    @property
+    def daemon_results(self) -> list:
+        """Get the outcome and start latency of the last daemon bring-up."""
+        return [result.to_dict() for result in self.daemon_supervisor.results.values()]
+
+    def cache_images(self) -> dict:
+        """Cache the images of every enabled service, pulling missing ones concurrently.
 
-    def cache_images(self) -> bool:
-        """Cache all images in the database."""
+        Returns:
+            dict: Pull progress for each image, keyed by `image:tag`.
+        """
         services = (
             Service.query.filter_by(is_disabled=False).order_by(Service.is_daemon).all()
         )
         logger.info("Caching images...")
         logger.info("Found %s services", len(services))
-        for service in services:
-            logger.debug(
-                "Caching image %s:%s for %s",
-                service.docker_image,
-                service.docker_image_tag,
-                service.name,
-            )
-            self.get_or_pull_image(service.docker_image)
-            logger.debug(
-                "Image %s:%s cached", service.docker_image, service.docker_image_tag
-            )
+        progress = self.image_cache.cache(
+            (service.docker_image, service.docker_image_tag) for service in services
+        )
+        failed = [name for name, image in progress.items() if image["status"] == "failed"]
+        if failed:
+            logger.warning("Image caching failed for %s", ", ".join(failed))
         logger.info("Image caching complete.")
-        return True
+        return progress
 
     def get_or_pull_image(self, image_name, tag="latest") -> docker.models.images.Image:
         """
@@ -267,22 +382,89 @@ class DockerServiceManager:
             tag (str): The tag of the image, defaults to 'latest'.
 
         Returns:
-            docker.models.images.Image: The Docker image object.
+            docker.models.images.Image: The Docker image object, or None if the pull failed.
         """
-        full_image_name = f"{image_name}:{tag}"
-
-        try:
-            logger.debug("Checking for image: %s", full_image_name)
-            return self.client.images.get(full_image_name)
-        except ImageNotFound:
-            logger.debug("Image not found locally. Pulling %s...", full_image_name)
-            return self.client.images.pull(image_name, tag=tag)
-        except APIError as e:
-            logger.debug("An error occurred while pulling the image: %s", e)
-            raise
+        return self.image_cache.get_or_pull(image_name, tag)
 
 
 ##### Static methods #####
+@staticmethod
+def log_window(tail="all", since=None, until=None, source="all") -> dict:
+    """Build docker-py `logs` arguments from client supplied tail/since/until/stream values.
+
+    Raises:
+        ValueError: If a value is not a positive number or the stream is unknown.
+    """
+    source = source_of(source)
+    window = {
+        "tail": "all" if tail in (None, "all") else _positive(tail, int),
+        "stdout": source != "stderr",
+        "stderr": source != "stdout",
+    }
+    if since:
+        window["since"] = _positive(since, float)
+    if until:
+        # docker-py only accepts whole seconds here
+        window["until"] = math.ceil(_positive(until, float))
+    return window
+
+
+@staticmethod
+def _positive(value, cast):
+    """Cast a client supplied value, rejecting negative numbers."""
+    number = cast(value)
+    if number < 0:
+        raise ValueError(f"Expected a positive number, got {value}")
+    return number
+
+
+@staticmethod
+def container_spec(service) -> dict:
+    """Get the `containers.run` arguments that a service definition determines."""
+    # Time values are stored in seconds but need to be in nanoseconds for docker-py
+    if service.docker_healthcheck:
+        healthcheck = {
+            "test": service.docker_healthcheck.test,
+            "interval": service.docker_healthcheck.interval * 1_000_000_000,
+            "timeout": service.docker_healthcheck.timeout * 1_000_000_000,
+            "retries": service.docker_healthcheck.retries,
+            "start_period": service.docker_healthcheck.start_period * 1_000_000_000,
+        }
+    else:
+        healthcheck = None
+
+    return {
+        "image": f"{service.docker_image}:{service.docker_image_tag}",
+        "volumes": get_volume_mappings(service),
+        "ports": {
+            f"{port.container_port}/tcp": port.host_port for port in service.docker_ports
+        },
+        "healthcheck": healthcheck,
+        "devices": [
+            f"{device.host_path}:{device.container_path}:{device.cgroup_permissions}"
+            for device in service.docker_devices
+        ],
+        "labels": {label.key: label.value for label in service.docker_labels},
+    }
+
+
+@staticmethod
+def spec_hash(spec) -> str:
+    """Get a stable short hash of a container spec, to detect definition drift."""
+    encoded = json.dumps(spec, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+@staticmethod
+def ownership_labels(service, spec=None) -> dict:
+    """Get the labels that mark a container as owned by a service and site."""
+    return {
+        SERVICE_LABEL: str(service.id),
+        SITE_LABEL: str(service.site_id),
+        SPEC_HASH_LABEL: spec_hash(spec or container_spec(service)),
+    }
+
+
 @staticmethod
 def get_volume_mappings(service) -> dict:
     """Get a dictionary of volume mappings from a service definition."""
@@ -297,31 +479,28 @@ def get_volume_mappings(service) -> dict:
 
 
 @staticmethod
-def calculate_cpu_percent(stat) -> float:
-    """Calculate the CPU percentage from a container stat object."""
+def summarized_stats(upstream):
+    """Summarize a raw Docker stats stream, closing it when the consumer stops reading.
+
+    docker-py's stats stream holds its HTTP response open until it is closed
+    explicitly; a generator expression over it would only drop the reference.
+    """
     try:
-        cpu_delta = stat["cpu_stats"]["cpu_usage"]["total_usage"]
-        if (
-            "precpu_stats" in stat
-            and "cpu_usage" in stat["precpu_stats"]
-            and "total_usage" in stat["precpu_stats"]["cpu_usage"]
-        ):
-            cpu_delta -= stat["precpu_stats"]["cpu_usage"]["total_usage"]
-
-        system_cpu_usage = stat["cpu_stats"].get("system_cpu_usage")
-        online_cpus = stat["cpu_stats"].get(
-            "online_cpus", len(stat["cpu_stats"]["cpu_usage"]["percpu_usage"])
-        )
+        for stats in upstream:
+            yield summarize_stats(stats)
+    finally:
+        upstream.close()
 
-        # Ensure we have all needed data to calculate CPU usage
-        if system_cpu_usage and cpu_delta is not None and online_cpus:
-            return round((cpu_delta / system_cpu_usage) * online_cpus * 100.0, 2)
-        else:
-            logger.warning("Unable to calculate CPU usage: Missing data.")
-            return None
-    except KeyError as e:
-        logger.error("KeyError in calculate_cpu_percent %s", e)
-        return None
+
+@staticmethod
+def summarize_stats(stats) -> dict:
+    """Reduce a raw Docker stats sample to the values shown to clients.
+
+    Uses the same metric definitions as the host overview (`derive_metrics`),
+    so live samples and sampled rounds can share one stats history.
+    """
+    metrics = derive_metrics([stats])[0]
+    return {key: metrics[key] for key in ("cpu_usage", "memory_usage", "disk_usage")}
 
 
 class ServiceContainerNotFound(Exception):
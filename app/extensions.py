@@ -2,6 +2,10 @@
 import eventlet
 eventlet.monkey_patch()
 
+# psycopg2 is C code the monkey patching can't reach; make its waits green too
+from app.green_db import make_psycopg_green
+make_psycopg_green()
+
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 
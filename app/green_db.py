@@ -0,0 +1,38 @@
+"""Cooperative (green) Postgres I/O for the eventlet workers."""
+import logging
+import psycopg2
+from psycopg2 import extensions
+from eventlet.hubs import trampoline
+
+logger = logging.getLogger(__name__)
+
+
+def make_psycopg_green() -> None:
+    """Make psycopg2 yield to the eventlet hub while it waits on the database.
+
+    psycopg2 talks to Postgres from C, which eventlet's monkey patching can't
+    reach, so without this every query blocks the whole worker, including
+    every open log and stats stream. Connections created afterwards run in
+    async mode and wait through `eventlet_wait_callback` instead.
+    """
+    extensions.set_wait_callback(eventlet_wait_callback)
+    logger.debug("Installed the eventlet wait callback for psycopg2")
+
+
+def make_psycopg_blocking() -> None:
+    """Restore psycopg2's default blocking waits (for comparison in benchmarks)."""
+    extensions.set_wait_callback(None)
+
+
+def eventlet_wait_callback(connection, timeout=-1) -> None:  # pylint: disable=unused-argument
+    """Wait for a psycopg2 connection to become ready without blocking other green threads."""
+    while True:
+        state = connection.poll()
+        if state == extensions.POLL_OK:
+            return
+        if state == extensions.POLL_READ:
+            trampoline(connection.fileno(), read=True)
+        elif state == extensions.POLL_WRITE:
+            trampoline(connection.fileno(), write=True)
+        else:
+            raise psycopg2.OperationalError(f"Bad result from poll: {state}")
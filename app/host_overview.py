@@ -0,0 +1,250 @@
+"""Host-wide resource overview sampled concurrently across every managed container."""
+import logging
+import math
+import os
+import shutil
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Raw Docker stats values gathered into one column each before deriving metrics
+COLUMNS = {
+    "cpu_total": ("cpu_stats", "cpu_usage", "total_usage"),
+    "cpu_total_prev": ("precpu_stats", "cpu_usage", "total_usage"),
+    "system": ("cpu_stats", "system_cpu_usage"),
+    "system_prev": ("precpu_stats", "system_cpu_usage"),
+    "online_cpus": ("cpu_stats", "online_cpus"),
+    "memory_usage": ("memory_stats", "usage"),
+    "memory_limit": ("memory_stats", "limit"),
+    # cgroup v1 and v2 name the reclaimable page cache differently
+    "memory_cache": ("memory_stats", "stats", "total_inactive_file"),
+    "memory_cache_v2": ("memory_stats", "stats", "inactive_file"),
+}
+
+
+class HostOverview:
+    """Class to sample the whole host and every managed container in one round.
+
+    Each round takes a one-shot (`stream=False`) stats snapshot of every
+    running managed container, at most `max_parallel` at a time, reads host
+    CPU, memory and disk, and derives every container's metrics in a single
+    columnar pass. Rounds are cached for `ttl` seconds and concurrent callers
+    wait for the round already in progress, so any number of viewers cost one
+    round per TTL.
+    """
+
+    def __init__(self, manager, max_parallel=4, ttl=5.0, disk_path="/"):
+        self.manager = manager
+        self.max_parallel = max_parallel
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.rounds = 0
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._taken_at = 0.0
+        self._cpu_times = None
+
+    def snapshot(self) -> dict:
+        """Get the current overview, sampling a new round if the cached one is stale."""
+        if self._is_fresh():
+            self.hits += 1
+            return self._snapshot
+        with self._lock:
+            if self._is_fresh():
+                self.hits += 1
+                return self._snapshot
+            self._snapshot = self._sample()
+            self._taken_at = time.monotonic()
+            self.rounds += 1
+            return self._snapshot
+
+    def _is_fresh(self) -> bool:
+        return self._snapshot is not None and time.monotonic() - self._taken_at < self.ttl
+
+    def _sample(self) -> dict:
+        started = time.monotonic()
+        running = [
+            (service_id, container)
+            for service_id, container in self.manager.container_index.managed()
+            if container.status == "running"
+        ]
+        workers = max(1, min(self.max_parallel, len(running)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            raw = list(pool.map(_one_shot_stats, [container for _, container in running]))
+
+        containers = []
+        for (service_id, container), metrics in zip(running, derive_metrics(raw)):
+            containers.append(
+                {
+                    "service_id": service_id,
+                    "container_id": container.short_id,
+                    **metrics,
+                }
+            )
+        return {
+            "timestamp": time.time(),
+            "host": self._host_metrics(),
+            "containers": containers,
+            "sample_seconds": round(time.monotonic() - started, 3),
+        }
+
+    def _host_metrics(self) -> dict:
+        """Read host CPU (since the previous round), memory, load and disk usage."""
+        metrics = {"cpu_percent": None, "memory": None, "load": None, "disk": None}
+        try:
+            cpu_times = read_cpu_times()
+            if self._cpu_times:
+                idle = cpu_times[0] - self._cpu_times[0]
+                total = cpu_times[1] - self._cpu_times[1]
+                if total > 0:
+                    metrics["cpu_percent"] = round((1 - idle / total) * 100.0, 2)
+            self._cpu_times = cpu_times
+            metrics["memory"] = read_memory()
+            metrics["load"] = os.getloadavg()
+        except OSError as e:
+            logger.debug("Host CPU/memory unavailable: %s", e)
+        try:
+            disk = shutil.disk_usage(self.disk_path)
+            metrics["disk"] = {
+                "total": disk.total,
+                "used": disk.used,
+                "percent": round(disk.used / disk.total * 100.0, 2) if disk.total else None,
+            }
+        except OSError as e:
+            logger.debug("Host disk usage unavailable: %s", e)
+        return metrics
+
+
+##### Static methods #####
+def _one_shot_stats(container) -> dict:
+    """Take one stats snapshot of a container, or None if it failed."""
+    try:
+        return container.stats(stream=False)
+    except Exception as e:  # pylint: disable=broad-except
+        logger.debug("Stats snapshot of %s failed: %s", container.short_id, e)
+        return None
+
+
+def derive_metrics(samples) -> list:
+    """Derive the metrics of a batch of raw Docker stats in one columnar pass.
+
+    Every raw value is first gathered into a flat float column (NaN when a
+    sample lacks it), and each metric is then computed column-wise, so the
+    cost is a handful of tight loops however many containers there are.
+    This is the only definition of the metrics: the live stats streams
+    summarize their samples through it too, so both feed one history.
+
+    Returns:
+        list: One dict per sample, in order; None values where a metric is unavailable.
+    """
+    columns = {
+        name: array("d", (_dig(sample, path) for sample in samples))
+        for name, path in COLUMNS.items()
+    }
+    cpu_percent = [
+        cpu_delta / system_delta * _or(cpus, 1.0) * 100.0
+        if system_delta > 0 and cpu_delta >= 0
+        else math.nan
+        for cpu_delta, system_delta, cpus in zip(
+            _subtract(columns["cpu_total"], columns["cpu_total_prev"]),
+            _subtract(columns["system"], columns["system_prev"]),
+            columns["online_cpus"],
+        )
+    ]
+    memory_used = [
+        usage - _or(cache, _or(cache_v2, 0.0))
+        for usage, cache, cache_v2 in zip(
+            columns["memory_usage"], columns["memory_cache"], columns["memory_cache_v2"]
+        )
+    ]
+    memory_percent = [
+        used / limit * 100.0 if limit > 0 else math.nan
+        for used, limit in zip(memory_used, columns["memory_limit"])
+    ]
+    network = [_sum_network(sample) for sample in samples]
+    block = [_sum_block_io(sample) for sample in samples]
+
+    rows = zip(
+        samples, cpu_percent, memory_used, columns["memory_limit"], memory_percent, block, network
+    )
+    return [
+        {
+            "available": sample is not None,
+            "cpu_usage": _round(cpu),
+            "memory_usage": _round(used, 0),
+            "memory_limit": _round(limit, 0),
+            "memory_percent": _round(percent),
+            "disk_usage": disk[0],
+            "disk_write": disk[1],
+            "network_rx": net[0],
+            "network_tx": net[1],
+        }
+        for sample, cpu, used, limit, percent, disk, net in rows
+    ]
+
+
+def read_cpu_times() -> tuple:
+    """Read cumulative (idle, total) CPU jiffies from /proc/stat."""
+    with open("/proc/stat", encoding="utf-8") as stat:
+        values = [int(value) for value in stat.readline().split()[1:9]]
+    # idle + iowait count as idle time
+    return values[3] + values[4], sum(values)
+
+
+def read_memory() -> dict:
+    """Read total and available memory (bytes) from /proc/meminfo."""
+    meminfo = {}
+    with open("/proc/meminfo", encoding="utf-8") as memory:
+        for line in memory:
+            key, _, value = line.partition(":")
+            meminfo[key] = int(value.split()[0]) * 1024
+    total, available = meminfo["MemTotal"], meminfo.get("MemAvailable", meminfo["MemFree"])
+    return {
+        "total": total,
+        "used": total - available,
+        "percent": round((total - available) / total * 100.0, 2),
+    }
+
+
+def _dig(sample, path) -> float:
+    """Get a nested numeric stats value as a float, or NaN if it is missing."""
+    value = sample
+    for key in path:
+        if not isinstance(value, dict):
+            return math.nan
+        value = value.get(key)
+    return float(value) if isinstance(value, (int, float)) else math.nan
+
+
+def _or(value, default) -> float:
+    """Get a column value, or a default if it is NaN."""
+    return default if math.isnan(value) else value
+
+
+def _subtract(left, right) -> list:
+    return [a - b for a, b in zip(left, right)]
+
+
+def _round(value, digits=2):
+    return None if math.isnan(value) else round(value, digits)
+
+
+def _sum_network(sample) -> tuple:
+    """Sum received and transmitted bytes over every network interface."""
+    networks = (sample or {}).get("networks") or {}
+    return (
+        sum(network.get("rx_bytes", 0) for network in networks.values()),
+        sum(network.get("tx_bytes", 0) for network in networks.values()),
+    )
+
+
+def _sum_block_io(sample) -> tuple:
+    """Sum bytes read and written over every block device."""
+    entries = ((sample or {}).get("blkio_stats") or {}).get("io_service_bytes_recursive") or []
+    read_bytes = sum(entry["value"] for entry in entries if entry.get("op", "").lower() == "read")
+    write_bytes = sum(entry["value"] for entry in entries if entry.get("op", "").lower() == "write")
+    return read_bytes, write_bytes
@@ -0,0 +1,162 @@
+"""Concurrent image pre-caching with per-image pull progress."""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import docker
+from docker.errors import ImageNotFound, APIError
+
+logger = logging.getLogger(__name__)
+
+# Pull statuses that mean a layer is on disk
+LAYER_DONE_STATUSES = ("Pull complete", "Already exists")
+
+
+class ImagePullProgress:
+    """Progress of a single image pull, aggregated over its layers."""
+
+    def __init__(self, image, tag):
+        self.image = image
+        self.tag = tag
+        self.status = "pending"
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self._layers = {}
+        self._done_layers = set()
+
+    @property
+    def name(self) -> str:
+        return f"{self.image}:{self.tag}"
+
+    def update(self, event) -> None:
+        """Fold a decoded `docker pull` progress event into the totals."""
+        layer = event.get("id")
+        if not layer or layer == self.tag:
+            return
+        detail = event.get("progressDetail") or {}
+        if event.get("status") in LAYER_DONE_STATUSES:
+            self._done_layers.add(layer)
+            current, total = self._layers.get(layer, (0, 0))
+            self._layers[layer] = (total or current, total)
+        elif "Downloading" in event.get("status", "") and detail.get("total"):
+            self._layers[layer] = (detail.get("current", 0), detail["total"])
+        else:
+            self._layers.setdefault(layer, (0, 0))
+
+    def to_dict(self) -> dict:
+        """Serialize for the image cache endpoint and socket event."""
+        return {
+            "image": self.name,
+            "status": self.status,
+            "error": self.error,
+            "layers_total": len(self._layers),
+            "layers_done": len(self._done_layers),
+            "bytes_total": sum(total for _, total in self._layers.values()),
+            "bytes_done": sum(current for current, _ in self._layers.values()),
+            "duration": (
+                round((self.finished_at or time.time()) - self.started_at, 2)
+                if self.started_at
+                else None
+            ),
+        }
+
+
+class ImageCache:
+    """Class to pull service images concurrently with bounded parallelism.
+
+    Progress for every image is kept for the image cache endpoint and is
+    pushed through `on_progress` no more often than `progress_interval`
+    seconds per image, plus once on every status change.
+    """
+
+    def __init__(self, client, max_parallel=2, progress_interval=0.5, on_progress=None):
+        self.client = client
+        self.max_parallel = max_parallel
+        self.progress_interval = progress_interval
+        self.on_progress = on_progress
+        self._lock = threading.Lock()
+        self._progress = {}
+
+    def cache(self, images) -> dict:
+        """Make sure every image is available locally, pulling missing ones concurrently.
+
+        Args:
+            images (iterable): (image, tag) pairs; duplicates are pulled once.
+
+        Returns:
+            dict: Progress for each image, keyed by `image:tag`.
+        """
+        pulls = []
+        with self._lock:
+            for image, tag in dict.fromkeys(images):
+                progress = ImagePullProgress(image, tag)
+                self._progress[progress.name] = progress
+                pulls.append(progress)
+
+        logger.info("Caching %s images, %s at a time", len(pulls), self.max_parallel)
+        with ThreadPoolExecutor(max_workers=max(1, self.max_parallel)) as pool:
+            list(pool.map(self._cache_one, pulls))
+        return self.snapshot()
+
+    def snapshot(self) -> dict:
+        """Get the progress of every image, keyed by `image:tag`."""
+        with self._lock:
+            return {name: progress.to_dict() for name, progress in self._progress.items()}
+
+    def get_or_pull(self, image, tag="latest") -> docker.models.images.Image:
+        """Get an image locally, pulling it with progress tracking if it is missing."""
+        progress = ImagePullProgress(image, tag)
+        with self._lock:
+            self._progress[progress.name] = progress
+        return self._cache_one(progress)
+
+    def _cache_one(self, progress) -> docker.models.images.Image:
+        progress.started_at = time.time()
+        try:
+            logger.debug("Checking for image: %s", progress.name)
+            image = self.client.images.get(progress.name)
+            self._set_status(progress, "cached")
+            return image
+        except ImageNotFound:
+            logger.info("Image %s not found locally. Pulling...", progress.name)
+        except APIError as e:
+            logger.error("An error occurred while checking image %s: %s", progress.name, e)
+            self._set_status(progress, "failed", str(e))
+            return None
+
+        self._set_status(progress, "pulling")
+        last_report = 0.0
+        try:
+            for event in self.client.api.pull(
+                progress.image, tag=progress.tag, stream=True, decode=True
+            ):
+                if "error" in event:
+                    raise APIError(event["error"])
+                progress.update(event)
+                now = time.monotonic()
+                if now - last_report >= self.progress_interval:
+                    last_report = now
+                    self._report(progress)
+            image = self.client.images.get(progress.name)
+        except APIError as e:
+            logger.error("An error occurred while pulling image %s: %s", progress.name, e)
+            self._set_status(progress, "failed", str(e))
+            return None
+        self._set_status(progress, "cached")
+        logger.info("Pulled image %s", progress.name)
+        return image
+
+    def _set_status(self, progress, status, error=None) -> None:
+        progress.status = status
+        progress.error = error
+        if status in ("cached", "failed"):
+            progress.finished_at = time.time()
+        self._report(progress)
+
+    def _report(self, progress) -> None:
+        if self.on_progress:
+            try:
+                self.on_progress(progress.to_dict())
+            except Exception as e:  # pylint: disable=broad-except
+                logger.debug("Error reporting image progress: %s", e)
@@ -0,0 +1,167 @@
+"""Bounded background queue for long-running Docker operations."""
+import logging
+import queue
+import threading
+import time
+import uuid
+from enum import Enum
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "/service"
+
+
+class JobStatus(str, Enum):
+    """Lifecycle of a queued job."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class JobQueueFull(Exception):
+    """Exception raised when the job queue is at its depth limit."""
+
+    def __init__(self, message="Too many pending operations; try again shortly"):
+        self.message = message
+        super().__init__(self.message)
+
+
+class Job:
+    """A single queued operation and its outcome."""
+
+    def __init__(self, action, service_id, func, sid=None, on_done=None):
+        self.id = uuid.uuid4().hex
+        self.action = action
+        self.service_id = service_id
+        self.func = func
+        self.sid = sid
+        self.on_done = on_done
+        self.status = JobStatus.QUEUED
+        self.result = None
+        self.error = None
+        self.exception = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self) -> dict:
+        """Serialize the job for a job_status event."""
+        return {
+            "job_id": self.id,
+            "action": self.action,
+            "service_id": self.service_id,
+            "status": self.status.value,
+            "error": self.error,
+            "queued_for": round((self.started_at or time.time()) - self.created_at, 3),
+            "duration": (
+                round(self.finished_at - self.started_at, 3) if self.finished_at else None
+            ),
+        }
+
+
+class JobQueue:
+    """Class to run Docker operations on a bounded pool of background workers.
+
+    Socket handlers submit jobs and return immediately with a job id, so a
+    slow `container.stop()` or image pull never holds up the handler. Each job
+    runs inside an app context and reports its progress to the submitting
+    session as `job_status` events on the /service namespace.
+    """
+
+    def __init__(self, socketio, max_workers=2, max_depth=16):
+        self.socketio = socketio
+        self.max_workers = max_workers
+        self.max_depth = max_depth
+        self.app = None
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._workers_started = False
+
+    def init_app(self, app) -> None:
+        """Bind the queue to an app so that jobs run inside its app context."""
+        self.app = app
+
+    def submit(self, action, service_id, func, sid=None, on_done=None) -> Job:
+        """Queue a job.
+
+        Args:
+            action (str): Name of the operation, e.g. "start".
+            service_id (int): The service the operation applies to.
+            func (callable): Called with the job inside an app context; its return value is
+                the job result.
+            sid (str, optional): Socket session to send progress events to.
+            on_done (callable, optional): Called with the finished job inside the same app context.
+
+        Returns:
+            Job: The queued job.
+
+        Raises:
+            JobQueueFull: If `max_depth` jobs are already pending.
+        """
+        job = Job(action, service_id, func, sid=sid, on_done=on_done)
+        with self._lock:
+            if self.max_depth and len(self._pending) >= self.max_depth:
+                raise JobQueueFull()
+            self._pending[job.id] = job
+            if not self._workers_started:
+                for _ in range(self.max_workers):
+                    self.socketio.start_background_task(self._work)
+                self._workers_started = True
+        self._queue.put(job)
+        logger.info("Queued %s job %s for service %s", action, job.id, service_id)
+        self._emit_status(job)
+        return job
+
+    @property
+    def depth(self) -> int:
+        """Get the number of queued and running jobs."""
+        with self._lock:
+            return len(self._pending)
+
+    def _work(self) -> None:
+        """Worker loop: run queued jobs one at a time."""
+        while True:
+            job = self._queue.get()
+            job.status = JobStatus.RUNNING
+            job.started_at = time.time()
+            self._emit_status(job)
+            with self.app.app_context():
+                try:
+                    job.result = job.func(job)
+                    job.status = JobStatus.SUCCEEDED
+                except Exception as e:  # pylint: disable=broad-except
+                    logger.error("%s job %s failed: %s", job.action, job.id, e)
+                    job.error = str(e)
+                    job.exception = e
+                    job.status = JobStatus.FAILED
+                job.finished_at = time.time()
+                with self._lock:
+                    self._pending.pop(job.id, None)
+                logger.info(
+                    "%s job %s for service %s %s in %.2fs",
+                    job.action,
+                    job.id,
+                    job.service_id,
+                    job.status.value,
+                    job.finished_at - job.started_at,
+                )
+                self._emit_status(job)
+                if job.on_done:
+                    try:
+                        job.on_done(job)
+                    except Exception as e:  # pylint: disable=broad-except
+                        logger.error("Error completing %s job %s: %s", job.action, job.id, e)
+
+    def _emit_status(self, job) -> None:
+        """Send a job's progress to the session that submitted it."""
+        if job.sid is None:
+            return
+        self.socketio.emit(
+            "job_status",
+            {**job.to_dict(), "queue_depth": self.depth},
+            to=job.sid,
+            namespace=NAMESPACE,
+        )
@@ -0,0 +1,117 @@
+"""Locks that elect the one worker process running the singleton Docker tasks."""
+import fcntl
+import logging
+import os
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_lock key shared by every mission-control worker ("mcleader")
+ADVISORY_LOCK_KEY = 0x6D636C6561646572
+
+
+class FileLeaderLock:
+    """Class to elect a leader among the workers of one host with a lock file.
+
+    The lock is held until the process exits, at which point the kernel
+    releases it and another worker can take over.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def acquire(self) -> bool:
+        """Take the lock if no other process holds it.
+
+        Returns:
+            bool: True if this process now holds the lock.
+        """
+        if self._file is not None:
+            return True
+        try:
+            lock_dir = os.path.dirname(self.path)
+            if lock_dir:
+                os.makedirs(lock_dir, exist_ok=True)
+            lock_file = open(  # pylint: disable=consider-using-with
+                self.path, "a", encoding="utf-8"
+            )
+        except OSError as e:
+            logger.warning("Cannot open leader lock %s (%s); leading anyway", self.path, e)
+            return True
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # Held open (and so locked) until the process exits
+        self._file = lock_file
+        return True
+
+    def is_held(self) -> bool:
+        """Check that the lock is still held; a file lock can't be lost while the process lives."""
+        return True
+
+
+class PostgresLeaderLock:
+    """Class to elect a leader among every worker sharing a database with an advisory lock.
+
+    The lock belongs to a dedicated connection and so lasts as long as that
+    connection: it is released when the worker exits or the connection
+    drops, whichever host the worker runs on.
+    """
+
+    def __init__(self, url, key=ADVISORY_LOCK_KEY):
+        self.dsn = libpq_dsn(url)
+        self.key = key
+        self._connection = None
+
+    def acquire(self) -> bool:
+        """Take the advisory lock if no other session holds it.
+
+        Returns:
+            bool: True if this process now holds the lock.
+        """
+        if self._connection is not None and self.is_held():
+            return True
+        try:
+            connection = psycopg2.connect(self.dsn, application_name="mission-control-leader")
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_try_advisory_lock(%s)", (self.key,))
+                acquired = cursor.fetchone()[0]
+        except psycopg2.Error as e:
+            logger.warning("Cannot contend for the leader lock: %s", e)
+            return False
+        if not acquired:
+            connection.close()
+            return False
+        self._connection = connection
+        return True
+
+    def is_held(self) -> bool:
+        """Check that the connection holding the lock is still alive."""
+        if self._connection is None:
+            return False
+        try:
+            with self._connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except psycopg2.Error as e:
+            logger.error("Lost the leader lock connection: %s", e)
+            self._connection = None
+            return False
+
+
+##### Static methods #####
+def leader_lock_for(database_uri, lock_path):
+    """Get the advisory lock for a Postgres database, or the file lock for anything else."""
+    if database_uri.startswith(("postgres://", "postgresql://", "postgresql+psycopg2://")):
+        return PostgresLeaderLock(database_uri)
+    return FileLeaderLock(lock_path)
+
+
+def libpq_dsn(url) -> str:
+    """Convert a SQLAlchemy database URL to one libpq accepts (without the driver suffix)."""
+    scheme, separator, rest = url.partition("://")
+    return f"{scheme.split('+')[0]}{separator}{rest}"
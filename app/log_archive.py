@@ -0,0 +1,374 @@
+"""Persistent, compressed per-service log archive with a sparse time index."""
+import gzip
+import logging
+import os
+import threading
+import time
+from app.log_framing import frame_lines, split_timestamp, timestamp_ns
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".log.gz"
+INDEX_SUFFIX = ".idx"
+
+
+class _Segment:
+    """The segment currently being appended to for one service."""
+
+    def __init__(self, directory, start_ns):
+        self.start_ns = start_ns
+        self.path = os.path.join(directory, f"{start_ns}{SEGMENT_SUFFIX}")
+        self.data = open(self.path, "ab")  # pylint: disable=consider-using-with
+        self.index = open(  # pylint: disable=consider-using-with
+            os.path.join(directory, f"{start_ns}{INDEX_SUFFIX}"), "a", encoding="utf-8"
+        )
+        self.size = self.data.tell()
+
+    def close(self) -> None:
+        self.data.close()
+        self.index.close()
+
+
+class _Buffer:
+    """Lines received for one service but not yet written."""
+
+    def __init__(self):
+        self.lines = []
+        self.size = 0
+        self.first_ns = None
+        self.last_ns = None
+
+
+class LogArchive:
+    """Class to keep every managed service's logs on disk after its container is gone.
+
+    Lines are buffered per service and written as compressed blocks, each a
+    complete gzip member, to the end of the service's current segment file.
+    Segments rotate at `segment_bytes` and every block gets one line in the
+    segment's index (first timestamp, byte offset, last timestamp). Range
+    queries therefore decompress only the blocks they need, and the disk only
+    ever sees sequential appends plus whole-file deletes for retention, which
+    keeps SD card wear down.
+
+    Layout: `<root>/<service_id>/<first ns>.log.gz` and `<first ns>.idx`.
+    """
+
+    def __init__(
+        self,
+        root="/data/logs",
+        block_bytes=64 * 1024,
+        segment_bytes=8 * 1024 * 1024,
+        max_bytes=256 * 1024 * 1024,
+        max_age=14 * 24 * 3600,
+    ):
+        self.root = root
+        self.block_bytes = block_bytes
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.blocks_written = 0
+        self.bytes_written = 0
+        self.segments_deleted = 0
+        self._lock = threading.Lock()
+        self._buffers = {}
+        self._segments = {}
+        self._last_ns = {}
+
+    def append(self, service_id, ns, line) -> None:
+        """Add a line (with its Docker timestamp prefix) to a service's archive.
+
+        Args:
+            service_id (int): The service the line belongs to.
+            ns (int): The line's timestamp in epoch nanoseconds.
+            line (str): The line as read with `timestamps=True`.
+        """
+        with self._lock:
+            buffer = self._buffers.setdefault(service_id, _Buffer())
+            buffer.lines.append(line)
+            buffer.size += len(line) + 1
+            buffer.first_ns = buffer.first_ns or ns
+            buffer.last_ns = ns
+            self._last_ns[service_id] = ns
+            if buffer.size >= self.block_bytes:
+                self._write_block(service_id)
+
+    def flush(self, service_id=None) -> None:
+        """Write buffered lines for one service, or for every service."""
+        with self._lock:
+            for buffered_id in [service_id] if service_id is not None else list(self._buffers):
+                if buffered_id in self._buffers:
+                    self._write_block(buffered_id)
+
+    def close(self, service_id) -> None:
+        """Flush a service's buffer and close its open segment."""
+        with self._lock:
+            if service_id in self._buffers:
+                self._write_block(service_id)
+            segment = self._segments.pop(service_id, None)
+        if segment:
+            segment.close()
+
+    def last_timestamp(self, service_id) -> int:
+        """Get the timestamp (epoch ns) of the newest archived line of a service, if any."""
+        with self._lock:
+            if service_id in self._last_ns:
+                return self._last_ns[service_id]
+        blocks = self._blocks(service_id)
+        last_ns = blocks[-1][3] if blocks else None
+        with self._lock:
+            return self._last_ns.setdefault(service_id, last_ns)
+
+    def page(self, service_id, before=None, since=None, limit=200) -> dict:
+        """Get the page of archived lines that precedes a cursor.
+
+        Takes and returns the same cursors as `DockerServiceManager.page_logs`.
+        Blocks are located through the index, newest first, and only the ones
+        overlapping the requested range are decompressed.
+        """
+        before_ns = timestamp_ns(before) if before else None
+        since_ns = int(float(since) * 1_000_000_000) if since else None
+        self.flush(service_id)
+        entries = []
+        for path, offset, length, first_ns, last_ns in reversed(self._blocks(service_id)):
+            if before_ns is not None and first_ns >= before_ns:
+                continue
+            if since_ns is not None and last_ns < since_ns:
+                break
+            block = [
+                (timestamp, line)
+                for timestamp, line, ns in _read_block(path, offset, length)
+                if (before_ns is None or ns < before_ns) and (since_ns is None or ns >= since_ns)
+            ]
+            entries = block + entries
+            if len(entries) > limit:
+                break
+
+        has_more = len(entries) > limit
+        entries = entries[-limit:]
+        return {
+            "service_id": service_id,
+            "lines": [{"timestamp": timestamp, "line": line} for timestamp, line in entries],
+            "cursor": entries[0][0] if has_more else None,
+            "archived": True,
+        }
+
+    def enforce_retention(self) -> int:
+        """Delete the oldest closed segments of each service beyond the size and age limits.
+
+        Returns:
+            int: The number of segments deleted.
+        """
+        deleted = 0
+        now = time.time()
+        for service_id in self._service_ids():
+            with self._lock:
+                current = self._segments.get(service_id)
+                current_path = current.path if current else None
+            segments = [path for path in self._segment_paths(service_id) if path != current_path]
+            total = sum(os.path.getsize(path) for path in segments)
+            if current:
+                total += current.size
+            for path in segments:
+                is_expired = self.max_age and now - os.path.getmtime(path) > self.max_age
+                is_over = self.max_bytes and total > self.max_bytes
+                if not (is_expired or is_over):
+                    break
+                total -= os.path.getsize(path)
+                _remove_segment(path)
+                deleted += 1
+        self.segments_deleted += deleted
+        if deleted:
+            logger.info("Log archive retention deleted %s segments", deleted)
+        return deleted
+
+    def stats(self) -> dict:
+        """Get write counters and the on-disk size of each service's archive."""
+        return {
+            "root": self.root,
+            "blocks_written": self.blocks_written,
+            "bytes_written": self.bytes_written,
+            "segments_deleted": self.segments_deleted,
+            "services": {
+                service_id: sum(
+                    os.path.getsize(path) for path in self._segment_paths(service_id)
+                )
+                for service_id in self._service_ids()
+            },
+        }
+
+    ##### Internal helpers #####
+    def _write_block(self, service_id) -> None:
+        """Compress and append a service's buffer as one block (caller holds the lock)."""
+        buffer = self._buffers.pop(service_id)
+        if not buffer.lines:
+            return
+        segment = self._segments.get(service_id)
+        if segment is None or segment.size >= self.segment_bytes:
+            if segment is not None:
+                segment.close()
+            directory = os.path.join(self.root, str(service_id))
+            os.makedirs(directory, exist_ok=True)
+            segment = _Segment(directory, buffer.first_ns)
+            self._segments[service_id] = segment
+
+        block = gzip.compress(("\n".join(buffer.lines) + "\n").encode("utf-8"), mtime=0)
+        offset = segment.size
+        segment.data.write(block)
+        segment.data.flush()
+        # The index line is written after the block so it never points past the data
+        segment.index.write(f"{buffer.first_ns} {offset} {buffer.last_ns}\n")
+        segment.index.flush()
+        segment.size += len(block)
+        self.blocks_written += 1
+        self.bytes_written += len(block)
+
+    def _blocks(self, service_id) -> list:
+        """Get (path, offset, length, first ns, last ns) for every indexed block, oldest first."""
+        blocks = []
+        for path in self._segment_paths(service_id):
+            index_path = path[: -len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+            try:
+                with open(index_path, encoding="utf-8") as index:
+                    # A crash can leave a partial last line behind
+                    entries = [line.split() for line in index if len(line.split()) == 3]
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                continue
+            for position, (first_ns, offset, last_ns) in enumerate(entries):
+                end = int(entries[position + 1][1]) if position + 1 < len(entries) else size
+                blocks.append((path, int(offset), end - int(offset), int(first_ns), int(last_ns)))
+        return blocks
+
+    def _segment_paths(self, service_id) -> list:
+        """Get a service's segment files, oldest first."""
+        directory = os.path.join(self.root, str(service_id))
+        try:
+            names = [name for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX)]
+        except FileNotFoundError:
+            return []
+        names.sort(key=lambda name: int(name[: -len(SEGMENT_SUFFIX)]))
+        return [os.path.join(directory, name) for name in names]
+
+    def _service_ids(self) -> list:
+        try:
+            return [int(name) for name in os.listdir(self.root) if name.isdigit()]
+        except FileNotFoundError:
+            return []
+
+
+class LogArchiver:
+    """Class to follow every running managed container's log into the LogArchive.
+
+    One follower runs per container. It resumes just after the newest
+    archived line, so restarts of mission-control don't duplicate or lose
+    output, and it ends on its own when the container stops.
+    """
+
+    def __init__(self, manager, archive, flush_interval=5.0, retention_interval=3600):
+        self.manager = manager
+        self.archive = archive
+        self.flush_interval = flush_interval
+        self.retention_interval = retention_interval
+        self.started = False
+        self._lock = threading.Lock()
+        self._following = {}
+
+    def start(self) -> None:
+        """Follow every running managed container and start the periodic flusher."""
+        self.started = True
+        threading.Thread(target=self._flush_forever, daemon=True).start()
+        self.sync()
+
+    def sync(self) -> None:
+        """Follow any running managed container that is not being archived yet."""
+        for service_id, container in self.manager.container_index.managed():
+            if container.status == "running":
+                self.follow(service_id, container.id)
+
+    def follow(self, service_id, container_id) -> bool:
+        """Start archiving a container's log, unless it is already being archived.
+
+        Returns:
+            bool: True if a new follower was started.
+        """
+        if not self.started:
+            return False
+        with self._lock:
+            if container_id in self._following:
+                return False
+            self._following[container_id] = service_id
+        threading.Thread(
+            target=self._follow, args=(service_id, container_id), daemon=True
+        ).start()
+        return True
+
+    def stats(self) -> dict:
+        """Get the containers being archived and the archive counters."""
+        with self._lock:
+            following = dict(self._following)
+        return {"following": following, **self.archive.stats()}
+
+    def _follow(self, service_id, container_id) -> None:
+        try:
+            container = self.manager.container_index.get(container_id)
+            if container is None:
+                return
+            last_ns = self.archive.last_timestamp(service_id)
+            # Docker's `since` has whole-second resolution; the overlap is skipped below
+            since = last_ns // 1_000_000_000 if last_ns else None
+            logger.info(
+                "Archiving logs of service %s from container %s", service_id, container.short_id
+            )
+            upstream = container.logs(
+                stream=True, follow=True, timestamps=True, since=since or None
+            )
+            for line in frame_lines(upstream):
+                timestamp, _ = split_timestamp(line)
+                try:
+                    ns = timestamp_ns(timestamp)
+                except ValueError:
+                    continue
+                if last_ns is not None and ns <= last_ns:
+                    continue
+                self.archive.append(service_id, ns, line)
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error("Error archiving logs of service %s: %s", service_id, e)
+        finally:
+            self.archive.close(service_id)
+            with self._lock:
+                self._following.pop(container_id, None)
+
+    def _flush_forever(self) -> None:
+        last_retention = 0.0
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.archive.flush()
+                if time.monotonic() - last_retention >= self.retention_interval:
+                    last_retention = time.monotonic()
+                    self.archive.enforce_retention()
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error("Error writing the log archive: %s", e)
+
+
+##### Static methods #####
+def _read_block(path, offset, length):
+    """Yield (timestamp, line, ns) for every line in one compressed block."""
+    with open(path, "rb") as segment:
+        segment.seek(offset)
+        data = gzip.decompress(segment.read(length))
+    for line in data.decode("utf-8", errors="replace").splitlines():
+        timestamp, text = split_timestamp(line)
+        try:
+            yield timestamp, text, timestamp_ns(timestamp)
+        except ValueError:
+            continue
+
+
+def _remove_segment(path) -> None:
+    """Delete a segment file and its index."""
+    for file_path in (path, path[: -len(SEGMENT_SUFFIX)] + INDEX_SUFFIX):
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,381 @@
+"""Shared fan-out of container log streams to Socket.IO sessions."""
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from app.log_filter import get_filter
+from app.log_framing import LineFramer, split_timestamp, timestamp_ns
+from app.wire_format import LOGS_DEFLATE, deflate_lines
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "/service"
+
+
+class _LogClient:
+    """A subscribed session's undelivered lines and delivery state."""
+
+    def __init__(self, sid, log_filter, max_pending):
+        self.sid = sid
+        self.log_filter = log_filter
+        self.pending = deque(maxlen=max_pending)
+        self.skipped = 0
+        self.sent_at = None
+
+    def push(self, lines) -> None:
+        """Queue lines for delivery, dropping the oldest ones if the buffer is full."""
+        overflow = len(self.pending) + len(lines) - self.pending.maxlen
+        if overflow > 0:
+            self.skipped += overflow
+        self.pending.extend(lines)
+
+    def is_ready(self, now, ack_timeout) -> bool:
+        """Check whether the session has lines waiting and no batch in flight."""
+        if not self.pending:
+            return False
+        return self.sent_at is None or now - self.sent_at >= ack_timeout
+
+    def take(self) -> tuple:
+        """Take every pending line and the number of lines dropped before them."""
+        lines, skipped = list(self.pending), self.skipped
+        self.pending.clear()
+        self.skipped = 0
+        return lines, skipped
+
+
+class _LogStream:
+    """A single upstream Docker log connection and the sessions reading it."""
+
+    def __init__(self, service_id, source, upstream, backlog_size, history=()):
+        self.service_id = service_id
+        self.source = source
+        self.upstream = upstream
+        self.framer = LineFramer()
+        self.backlog = deque(history, maxlen=backlog_size)
+        # Lines at or before the history's last one were already read; skip them
+        self.after_ns = _last_ns(history)
+        self.clients = {}
+        self.groups = {}
+        self.wake = threading.Event()
+        self.closed = False
+
+    @property
+    def key(self) -> tuple:
+        return (self.service_id, self.source)
+
+    def add_client(self, client) -> None:
+        """Add a session, grouping it with every other session using the same filter."""
+        self.clients[client.sid] = client
+        group = self.groups.setdefault(client.log_filter.key, (client.log_filter, set()))
+        group[1].add(client.sid)
+
+    def remove_client(self, sid):
+        """Remove a session, dropping its filter group if it was the last one using it."""
+        client = self.clients.pop(sid, None)
+        if client is not None:
+            _, sids = self.groups[client.log_filter.key]
+            sids.discard(sid)
+            if not sids:
+                del self.groups[client.log_filter.key]
+        return client
+
+
+class LogBroker:
+    """Class to fan one Docker log stream per service out to every subscribed session.
+
+    The first subscriber opens the upstream stream and the upstream is closed
+    when the last one leaves; sessions reading only stdout or stderr share a
+    separate upstream per stream. Raw chunks are framed into whole lines once,
+    each distinct filter is applied once per chunk for all the sessions that
+    use it, and only matching lines are delivered to each session in batches:
+    as soon as `batch_lines` are waiting or every `flush_interval` seconds,
+    whichever comes first.
+
+    Upstreams are read with Docker timestamps. The most recent `backlog_size`
+    lines of each stream are kept with their timestamps, so later subscribers
+    can be sent their history from memory (see `recent`), and a subscriber's
+    history and the live lines are joined on the timestamp of its last
+    history line: nothing written in between is lost or sent twice.
+
+    Each session has at most one batch in flight until the client acknowledges
+    it (or `ack_timeout` passes), and at most `max_pending` lines queued. When
+    a slow browser falls further behind than that, its oldest lines are
+    dropped and the next batch reports how many were skipped, so a slow client
+    never makes the server buffer without limit. Sessions that negotiated
+    compact mode get each batch deflated into a binary attachment.
+    """
+
+    def __init__(
+        self,
+        socketio,
+        backlog_size=500,
+        batch_lines=200,
+        flush_interval=0.1,
+        max_pending=2000,
+        ack_timeout=5.0,
+        on_stream_end=None,
+        wire_modes=None,
+    ):
+        self.socketio = socketio
+        self.backlog_size = backlog_size
+        self.batch_lines = batch_lines
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.ack_timeout = ack_timeout
+        self.on_stream_end = on_stream_end
+        self.wire_modes = wire_modes
+        self.lines_skipped = 0
+        self.lines_read = 0
+        self.lines_matched = 0
+        self._lock = threading.Lock()
+        self._streams = {}
+        self._sessions = {}
+
+    def recent(self, service_id, source="all", tail=None):
+        """Get the last lines of an open log stream, to serve history without reading Docker.
+
+        Args:
+            service_id (int): The service whose logs to read.
+            source (str, optional): "all", "stdout" or "stderr".
+            tail (int, optional): Number of lines wanted.
+
+        Returns:
+            list: (timestamp, line) tuples, oldest first, or None if no stream
+                is open or its backlog holds fewer than `tail` lines.
+        """
+        if tail in (None, "all"):
+            return None
+        tail = int(tail)
+        with self._lock:
+            stream = self._streams.get((service_id, source))
+            if stream is None or tail < 0 or len(stream.backlog) < tail:
+                return None
+            return list(stream.backlog)[len(stream.backlog) - tail :]
+
+    def subscribe(
+        self, sid, service_id, open_upstream, history=None, source="all", log_filter=None
+    ) -> bool:
+        """Subscribe a socket session to a service's logs.
+
+        Subscribing again replaces the session's previous stream and filter.
+
+        Args:
+            sid (str): Socket.IO session id.
+            service_id (int): The service whose logs to stream.
+            open_upstream (callable): Opens the timestamped Docker log stream
+                for `source`, starting after the last `history` line; only
+                called when no such stream is open yet. May return None.
+            history (list, optional): (timestamp, line) tuples to send before
+                live output, followed by any backlog lines newer than the last
+                of them; the recent backlog of the shared stream is sent if omitted.
+            source (str, optional): "all", "stdout" or "stderr".
+            log_filter (LogFilter, optional): Only send lines that match.
+
+        Returns:
+            bool: True if the session is now receiving logs.
+        """
+        log_filter = log_filter or get_filter()
+        self.unsubscribe(sid, service_id)
+        upstream = None
+        while True:
+            with self._lock:
+                stream = self._streams.get((service_id, source))
+                if stream is None and upstream is not None:
+                    stream = _LogStream(
+                        service_id, source, upstream, self.backlog_size, history or ()
+                    )
+                    upstream = None
+                    self._streams[stream.key] = stream
+                    self.socketio.start_background_task(self._pump, stream)
+                    self.socketio.start_background_task(self._deliver, stream)
+                    logger.info("Opened %s log stream for service %s", source, service_id)
+                if stream is not None:
+                    entries = stream.backlog if history is None else _join(history, stream.backlog)
+                    client = _LogClient(sid, log_filter, self.max_pending)
+                    client.push(log_filter.apply([line for _, line in entries]))
+                    stream.add_client(client)
+                    self._sessions[(sid, service_id)] = stream.key
+                    break
+            # Opening the upstream waits on Docker, so it's done without the
+            # lock every other stream needs; the stream is installed above
+            upstream = open_upstream()
+            if upstream is None:
+                return False
+        if upstream is not None:
+            # Another session opened the same stream in the meantime
+            _close(upstream)
+        stream.wake.set()
+        return True
+
+    def unsubscribe(self, sid, service_id) -> None:
+        """Unsubscribe a socket session, closing the upstream if it was the last one."""
+        with self._lock:
+            stream = self._streams.get(self._sessions.pop((sid, service_id), None))
+            if stream is None or stream.remove_client(sid) is None:
+                return
+            if stream.clients:
+                return
+            del self._streams[stream.key]
+            stream.closed = True
+
+        logger.info("Closing %s log stream for service %s", stream.source, service_id)
+        stream.wake.set()
+        _close(stream.upstream)
+
+    def subscriber_count(self, service_id) -> int:
+        """Get the number of sessions reading a service's logs."""
+        with self._lock:
+            return sum(
+                len(stream.clients)
+                for stream in self._streams.values()
+                if stream.service_id == service_id
+            )
+
+    def _pump(self, stream) -> None:
+        """Read the upstream log stream and queue whole lines for every subscriber."""
+        try:
+            for chunk in stream.upstream:
+                self._publish(stream, self._stamped(stream, stream.framer.feed(chunk)))
+        except Exception as e:  # pylint: disable=broad-except
+            # Closing the upstream from another greenlet surfaces here
+            logger.debug("Log stream for service %s ended: %s", stream.service_id, e)
+        finally:
+            self._publish(stream, self._stamped(stream, stream.framer.flush()))
+            with self._lock:
+                is_current = self._streams.get(stream.key) is stream
+                if is_current:
+                    del self._streams[stream.key]
+                stream.closed = True
+                subscribers = set(stream.clients)
+                for sid in subscribers:
+                    if self._sessions.get((sid, stream.service_id)) == stream.key:
+                        del self._sessions[(sid, stream.service_id)]
+            stream.wake.set()
+            if is_current:
+                logger.info("Log stream for service %s ended upstream", stream.service_id)
+                if self.on_stream_end:
+                    self.on_stream_end(stream.service_id, subscribers)
+                _close(stream.upstream)
+
+    def _stamped(self, stream, lines) -> list:
+        """Split framed lines into (timestamp, line) tuples, dropping lines the history had."""
+        entries = [split_timestamp(line) for line in lines]
+        if stream.after_ns is not None and entries:
+            fresh = _newer_than(entries, stream.after_ns)
+            if fresh:
+                # Past the overlap with the history; no need to check again
+                stream.after_ns = None
+            entries = fresh
+        return entries
+
+    def _publish(self, stream, entries) -> None:
+        """Queue framed lines for every subscriber, applying each distinct filter once."""
+        if not entries:
+            return
+        lines = [line for _, line in entries]
+        with self._lock:
+            stream.backlog.extend(entries)
+            self.lines_read += len(lines)
+            is_full = False
+            for log_filter, sids in stream.groups.values():
+                matched = log_filter.apply(lines)
+                if not matched:
+                    continue
+                self.lines_matched += len(matched)
+                for sid in sids:
+                    client = stream.clients[sid]
+                    client.push(matched)
+                    is_full = is_full or len(client.pending) >= self.batch_lines
+        if is_full:
+            stream.wake.set()
+
+    def _deliver(self, stream) -> None:
+        """Send each subscriber its pending lines as batches until the stream closes."""
+        while True:
+            stream.wake.wait(self.flush_interval)
+            stream.wake.clear()
+            now = time.monotonic()
+            with self._lock:
+                is_final = stream.closed
+                batches = []
+                for client in stream.clients.values():
+                    if (is_final and client.pending) or client.is_ready(now, self.ack_timeout):
+                        client.sent_at = now
+                        batches.append((client, *client.take()))
+
+            for client, lines, skipped in batches:
+                self._send(stream, client, lines, skipped)
+            if is_final:
+                return
+
+    def _send(self, stream, client, lines, skipped) -> None:
+        """Emit one batch to a session, asking it to acknowledge receipt."""
+        if skipped:
+            self.lines_skipped += skipped
+            logger.debug(
+                "Dropped %s log lines for slow session %s on service %s",
+                skipped,
+                client.sid,
+                stream.service_id,
+            )
+            lines.insert(0, f"... {skipped} lines skipped ...")
+        payload = {"service_id": stream.service_id, "lines": lines, "skipped": skipped}
+        if self.wire_modes and self.wire_modes.accepts(client.sid, LOGS_DEFLATE):
+            # Sent as a binary attachment rather than a JSON text frame
+            deflated = deflate_lines(lines)
+            self.wire_modes.record(payload, len(deflated))
+            payload = {"service_id": stream.service_id, "deflated": deflated, "skipped": skipped}
+        self.socketio.emit(
+            "log_message",
+            payload,
+            to=client.sid,
+            namespace=NAMESPACE,
+            callback=functools.partial(self._acked, stream, client),
+        )
+
+    def _acked(self, stream, client, *_args) -> None:
+        """Release a session's in-flight batch so the next one can be sent."""
+        client.sent_at = None
+        if client.pending:
+            stream.wake.set()
+
+
+##### Static methods #####
+def _join(history, backlog) -> list:
+    """Append the backlog lines newer than the last history line to the history."""
+    after_ns = _last_ns(history)
+    if after_ns is None:
+        return list(history)
+    return list(history) + _newer_than(backlog, after_ns)
+
+
+def _newer_than(entries, after_ns) -> list:
+    """Get the (timestamp, line) tuples stamped after `after_ns` epoch nanoseconds."""
+    fresh = []
+    for timestamp, line in entries:
+        try:
+            if timestamp_ns(timestamp) <= after_ns:
+                continue
+        except ValueError:
+            pass
+        fresh.append((timestamp, line))
+    return fresh
+
+
+def _last_ns(entries):
+    """Get the epoch nanoseconds of the last (timestamp, line) tuple, if it has a valid one."""
+    if not entries:
+        return None
+    try:
+        return timestamp_ns(entries[-1][0])
+    except ValueError:
+        return None
+
+
+def _close(upstream) -> None:
+    """Close an upstream Docker stream, ignoring streams that are already closed."""
+    try:
+        upstream.close()
+    except Exception as e:  # pylint: disable=broad-except
+        logger.debug("Error closing log stream: %s", e)
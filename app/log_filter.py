@@ -0,0 +1,276 @@
+"""Server-side filters applied to framed log lines before they are sent."""
+import functools
+import logging
+import re
+import time
+
+try:
+    # RE2 matches in linear time, so any client pattern is safe with it
+    import re2
+
+    PATTERN_ERRORS = (re.error, re2.error)
+except ImportError:
+    re2 = None
+    PATTERN_ERRORS = (re.error,)
+
+logger = logging.getLogger(__name__)
+
+# Log levels from least to most severe, with the spellings each one is logged as
+LEVELS = {
+    "debug": ("TRACE", "DEBUG"),
+    "info": ("INFO", "NOTICE"),
+    "warning": ("WARN", "WARNING"),
+    "error": ("ERROR", "ERR"),
+    "critical": ("CRITICAL", "CRIT", "FATAL", "PANIC"),
+}
+LEVEL_RANK = {name: rank for rank, name in enumerate(LEVELS)}
+LEVEL_PATTERN = re.compile(
+    r"\b(" + "|".join(word for words in LEVELS.values() for word in words) + r")\b",
+    re.IGNORECASE,
+)
+LEVEL_BY_WORD = {word: name for name, words in LEVELS.items() for word in words}
+
+# Longest search pattern accepted from a client
+MAX_PATTERN_LENGTH = 200
+
+# Which Docker output streams a subscription reads
+SOURCES = ("all", "stdout", "stderr")
+
+# Bounds on a regular expression run by Python's backtracking engine: the
+# number of repeats it may contain, the characters of each line it searches,
+# and the time per line a batch may average before the filter falls back to
+# matching its pattern literally
+MAX_REGEX_REPEATS = 2
+MAX_SEARCH_LENGTH = 512
+LINE_TIME_BUDGET = 0.002
+
+# Quantifiers: ?, *, + and {m}, {m,}, {m,n}
+_QUANTIFIER = re.compile(r"[*+?]|\{(\d*)(,?)(\d*)\}")
+
+
+class LogFilter:
+    """Class to select the log lines a subscription wants.
+
+    A filter matches lines containing `pattern` (a substring, or a regular
+    expression if `regex` is set) whose detected level is at least
+    `min_level`. Lines without a recognisable level are dropped by a level
+    filter. Filters are immutable and built through `get_filter`, so every
+    subscription using the same settings shares one compiled instance.
+
+    Regular expressions run on RE2 when it is installed. Otherwise patterns
+    that can backtrack catastrophically (a group holding a repeat or an
+    alternation that is itself repeated, like `(a+)+`) or that have more
+    than MAX_REGEX_REPEATS repeats are refused, only the first
+    MAX_SEARCH_LENGTH characters of a line are searched, and a filter that
+    falls behind LINE_TIME_BUDGET seconds per line while filtering a batch
+    switches to literal matching for good.
+    """
+
+    def __init__(self, pattern=None, regex=False, min_level=None):
+        self.pattern = pattern
+        self.regex = regex
+        self.min_level = min_level
+        self._search = None
+        # Searches on the backtracking engine are held to LINE_TIME_BUDGET
+        self._timed = False
+        if pattern:
+            if len(pattern) > MAX_PATTERN_LENGTH:
+                raise ValueError(f"Filter longer than {MAX_PATTERN_LENGTH} characters")
+            self._search = _compile_pattern(pattern, regex).search
+            if regex and re2 is None:
+                self._search = _bounded(self._search)
+                self._timed = True
+        self._min_rank = None
+        if min_level:
+            if min_level not in LEVEL_RANK:
+                raise ValueError(f"Unknown log level {min_level}")
+            self._min_rank = LEVEL_RANK[min_level]
+
+    @property
+    def key(self) -> tuple:
+        """Get the settings that identify the filter."""
+        return (self.pattern, self.regex, self.min_level)
+
+    @property
+    def is_passthrough(self) -> bool:
+        """Check whether the filter lets every line through."""
+        return self._search is None and self._min_rank is None
+
+    def matches(self, line) -> bool:
+        """Check whether a single line passes the filter."""
+        if self._search is not None and not self._search(line):
+            return False
+        if self._min_rank is not None:
+            level = level_of(line)
+            return level is not None and LEVEL_RANK[level] >= self._min_rank
+        return True
+
+    def apply(self, lines) -> list:
+        """Get the lines that pass the filter, in order."""
+        if self.is_passthrough:
+            return list(lines)
+        if not self._timed:
+            return [line for line in lines if self.matches(line)]
+        lines = list(lines)
+        matched = []
+        started = time.perf_counter()
+        for count, line in enumerate(lines, 1):
+            if self.matches(line):
+                matched.append(line)
+            if time.perf_counter() - started > LINE_TIME_BUDGET * count:
+                logger.warning("Log filter %r is too slow; matching it literally", self.pattern)
+                self._search = _compile_pattern(self.pattern, False).search
+                self._timed = False
+                return matched + [line for line in lines[count:] if self.matches(line)]
+        return matched
+
+
+##### Static methods #####
+def get_filter(pattern=None, regex=False, min_level=None, allow_regex=True) -> LogFilter:
+    """Get the shared compiled filter for a set of client supplied filter settings.
+
+    Args:
+        pattern (str, optional): Text the lines must contain.
+        regex (bool, optional): The client asks for `pattern` to be a regular expression.
+        min_level (str, optional): Lowest log level to keep.
+        allow_regex (bool, optional): The server accepts regular expressions
+            from clients; without it every pattern is matched literally.
+
+    Raises:
+        ValueError: If the pattern or level is invalid.
+    """
+    return _compile(
+        str(pattern) if pattern else None,
+        bool(regex and allow_regex),
+        str(min_level or "").lower() or None,
+    )
+
+
+@functools.lru_cache(maxsize=128)
+def _compile(pattern, regex, min_level) -> LogFilter:
+    try:
+        return LogFilter(pattern, regex, min_level)
+    except PATTERN_ERRORS as e:
+        raise ValueError(f"Invalid filter pattern: {e}") from e
+
+
+def _compile_pattern(pattern, regex):
+    """Compile a case-insensitive search pattern, refusing ones that could backtrack without end.
+
+    Raises:
+        re.error: If the regular expression is invalid.
+        ValueError: If it is too complex to run without RE2.
+    """
+    if not regex:
+        return re.compile(re.escape(pattern), re.IGNORECASE)
+    if re2 is not None:
+        return re2.compile("(?i)" + pattern)
+    compiled = re.compile(pattern, re.IGNORECASE)
+    repeats, nested = _repeats(pattern)
+    if nested:
+        raise ValueError("Filter pattern repeats a group that repeats or alternates")
+    if repeats > MAX_REGEX_REPEATS:
+        raise ValueError(f"Filter pattern has more than {MAX_REGEX_REPEATS} repeats")
+    return compiled
+
+
+def _bounded(search):
+    """Limit a search to the first MAX_SEARCH_LENGTH characters of each line."""
+
+    def bounded_search(line):
+        return search(line[:MAX_SEARCH_LENGTH])
+
+    return bounded_search
+
+
+def _repeats(pattern) -> tuple:
+    """Count a valid pattern's repeats and spot repeated groups that repeat or alternate.
+
+    Returns:
+        tuple: (number of repeats, True if a risky group is repeated).
+    """
+    risky = [False]  # per open group: holds a repeat or an alternation
+    closed = False  # the previous atom was a risky group
+    repeats = 0
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        quantifier = _QUANTIFIER.match(pattern, index) if index else None
+        if quantifier and (char != "{" or quantifier.group(2) or quantifier.group(1)):
+            repeated = _repeats_more_than_once(char, *quantifier.groups())
+            repeats += repeated
+            if closed and repeated:
+                return repeats, True
+            risky[-1] = True
+            index = quantifier.end()
+            # Lazy and possessive markers belong to the repeat
+            if index < len(pattern) and pattern[index] in "?+":
+                index += 1
+            closed = False
+            continue
+        closed = False
+        if char == "\\":
+            index += 2
+            continue
+        if char == "[":
+            index = _class_end(pattern, index)
+            continue
+        if char == "(":
+            risky.append(False)
+            index += 1
+            if pattern.startswith("?", index):
+                # Skip the group's "?:", "?=", "?P<name>" ... prefix
+                index += 1
+                while index < len(pattern) and pattern[index] not in ":=!>)":
+                    index += 1
+                if index < len(pattern) and pattern[index] != ")":
+                    index += 1
+            continue
+        if char == ")":
+            closed = risky.pop() if len(risky) > 1 else False
+            risky[-1] = risky[-1] or closed
+        elif char == "|":
+            risky[-1] = True
+        index += 1
+    return repeats, False
+
+
+def _repeats_more_than_once(char, low, comma, high) -> bool:
+    """Check whether a quantifier can match its atom more than once."""
+    if char in "*+":
+        return True
+    if char == "?":
+        return False
+    if comma:
+        return not high or int(high) > 1
+    return int(low) > 1
+
+
+def _class_end(pattern, index) -> int:
+    """Get the index just past the character class that starts at `index`."""
+    index += 1
+    if pattern.startswith("^", index):
+        index += 1
+    if pattern.startswith("]", index):
+        index += 1
+    while index < len(pattern) and pattern[index] != "]":
+        index += 2 if pattern[index] == "\\" else 1
+    return index + 1
+
+
+def level_of(line) -> str:
+    """Get the level name of the first level word in a line, if there is one."""
+    match = LEVEL_PATTERN.search(line)
+    return LEVEL_BY_WORD[match.group(1).upper()] if match else None
+
+
+def source_of(value) -> str:
+    """Validate a client supplied output stream selector.
+
+    Raises:
+        ValueError: If the selector is not one of SOURCES.
+    """
+    source = value or "all"
+    if source not in SOURCES:
+        raise ValueError(f"Unknown log stream {value}")
+    return source
@@ -0,0 +1,68 @@
+"""Incremental framing of raw Docker log chunks into complete text lines."""
+import calendar
+import codecs
+import time
+
+
+class LineFramer:
+    """Class to turn arbitrary byte chunks into complete, decoded lines.
+
+    docker-py yields log output in whatever chunks the daemon wrote, which can
+    end mid-line or even mid-character. The framer keeps the undecoded bytes
+    and the unterminated line between calls, so every line it returns is
+    whole and multibyte characters are never split.
+    """
+
+    def __init__(self, encoding="utf-8"):
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self._partial = ""
+
+    def feed(self, chunk) -> list:
+        """Add a chunk and get the lines it completes, without line endings.
+
+        Args:
+            chunk (bytes): Raw log output.
+
+        Returns:
+            list: The completed lines, possibly empty.
+        """
+        text = self._partial + self._decoder.decode(chunk)
+        lines = text.split("\n")
+        self._partial = lines.pop()
+        return [line.rstrip("\r") for line in lines]
+
+    def flush(self) -> list:
+        """Get whatever is left once the stream has ended.
+
+        Returns:
+            list: The final unterminated line, if there is one.
+        """
+        text = self._partial + self._decoder.decode(b"", final=True)
+        self._partial = ""
+        return [text.rstrip("\r")] if text else []
+
+
+##### Static methods #####
+def frame_lines(chunks):
+    """Yield complete lines from an iterable of raw log chunks."""
+    framer = LineFramer()
+    for chunk in chunks:
+        yield from framer.feed(chunk)
+    yield from framer.flush()
+
+
+def split_timestamp(line) -> tuple:
+    """Split a line read with `timestamps=True` into its RFC 3339 timestamp and text."""
+    timestamp, _, text = line.partition(" ")
+    return timestamp, text
+
+
+def timestamp_ns(timestamp) -> int:
+    """Convert a Docker RFC 3339 (UTC, nanosecond) log timestamp to epoch nanoseconds.
+
+    Raises:
+        ValueError: If the timestamp is malformed.
+    """
+    base, _, fraction = timestamp.rstrip("Z").partition(".")
+    seconds = calendar.timegm(time.strptime(base, "%Y-%m-%dT%H:%M:%S"))
+    return seconds * 1_000_000_000 + int(fraction.ljust(9, "0")[:9] or 0)
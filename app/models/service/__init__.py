@@ -8,3 +8,4 @@ from .docker_label import DockerLabel
 from .docker_volume import DockerVolume
 from .docker_device import DockerDevice
 from .docker_healthcheck import DockerHealthcheck
+from .service_stat import ServiceStat
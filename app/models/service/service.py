@@ -3,7 +3,10 @@ import importlib
 import logging
 from enum import Enum, auto
 from flask import current_app as app
+from sqlalchemy import or_
+from sqlalchemy.orm import selectinload
 from app.extensions import db
+from app.service_state import service_state
 from app.models.base_model import BaseModel
 
 logger = logging.getLogger(__name__)
@@ -48,6 +51,37 @@ class Service(BaseModel):
     site_id = db.Column(
         db.Integer, db.ForeignKey("site.id", name="fk_site_id"), nullable=False
     )
+    # Optional daemon start-order dependency: start after this service is healthy
+    depends_on_id = db.Column(
+        db.Integer,
+        db.ForeignKey("service.id", name="fk_depends_on_id"),
+        nullable=True,
+    )
+    depends_on = db.relationship(
+        "Service", remote_side="Service.id", backref="dependents", lazy=True
+    )
+
+    @classmethod
+    def graph_options(cls) -> list:
+        """Loader options that fetch every Docker relationship with one SELECT each.
+
+        Use these wherever the whole service graph is walked (rendering,
+        starting containers) so that the number of queries stays constant no
+        matter how many services there are.
+        """
+        return [
+            selectinload(cls.docker_volumes),
+            selectinload(cls.docker_ports),
+            selectinload(cls.docker_devices),
+            selectinload(cls.docker_labels),
+            selectinload(cls.docker_healthcheck),
+            selectinload(cls.environment_vars),
+        ]
+
+    @classmethod
+    def get_with_graph(cls, service_id):
+        """Get a service with its whole Docker configuration loaded."""
+        return cls.query.options(*cls.graph_options()).get(service_id)
 
     @property
     def url(self) -> str:
@@ -67,30 +101,60 @@ class Service(BaseModel):
         return None
 
     @classmethod
-    def handle_docker_event(cls, this_app, container, status) -> None:
-        """Handle a Docker event."""
-        with this_app.app_context():
-            if status == "start":
-                # Get the image and tag from the container
-                image, tag = container.image.tags[0].split(":")
-                service = cls.query.filter_by(
-                    docker_image=image, docker_image_tag=tag
-                ).first()
-
-                if service:
-                    service.update_state(True, container.id)
-
-                    # Emit a socketio event to notify clients
-                    socket_events = importlib.import_module("app.socket_events")
-                    socket_events.emit_service_status(service, status)
-            elif status in ("die", "destroy"):
-                service = cls.query.filter_by(docker_container_id=container.id).first()
-                if service:
-                    service.update_state(False, None)
-
-                    # Emit a socketio event to notify clients
-                    socket_events = importlib.import_module("app.socket_events")
-                    socket_events.emit_service_status(service, status)
+    def apply_docker_changes(cls, changes) -> list:
+        """Apply a batch of coalesced container changes in one query and one commit.
+
+        Services are matched by the container's service label, then by the
+        container id they have recorded.
+
+        Args:
+            changes (list): ContainerChange objects, at most one per container.
+
+        Returns:
+            list: The services whose state changed.
+        """
+        if not changes:
+            return []
+        service_ids = {change.service_id for change in changes if change.service_id}
+        container_ids = {change.container_id for change in changes}
+        services = cls.query.filter(
+            or_(cls.id.in_(service_ids), cls.docker_container_id.in_(container_ids))
+        ).all()
+        by_id = {service.id: service for service in services}
+        by_container = {
+            service.docker_container_id: service
+            for service in services
+            if service.docker_container_id
+        }
+
+        changed = {}
+        for change in changes:
+            service = by_id.get(change.service_id) or by_container.get(change.container_id)
+            if service is None:
+                continue
+            if not change.is_running and service.docker_container_id not in (
+                None,
+                change.container_id,
+            ):
+                # A stale container of this service went away; the current one is unaffected
+                continue
+            container_id = change.container_id if change.is_running else None
+            if (service.is_running, service.docker_container_id) != (
+                change.is_running,
+                container_id,
+            ):
+                service.is_running = change.is_running
+                service.docker_container_id = container_id
+                changed[service.id] = (service, change.status)
+
+        if changed:
+            db.session.commit()
+            for service, _ in changed.values():
+                service_state.persisted(service)
+            # Emit a single socketio event to notify clients
+            socket_events = importlib.import_module("app.socket_events")
+            socket_events.emit_service_statuses(list(changed.values()))
+        return [service for service, _ in changed.values()]
 
     def start(self) -> bool:
         """Start the service."""
@@ -102,23 +166,23 @@ class Service(BaseModel):
         if container:
             self.docker_container_id = container.id
             self.is_running = True
-            db.session.commit()
+            self.commit_state()
             return True, None
-        return False
+        return False, "Container could not be started"
 
     def stop(self) -> bool:
         """Stop the service."""
         if not self.is_running:
             print("Service is not running.")
-            return False
+            return False, "Service is not running"
 
         result = app.docker_manager.stop_service(self)
         if result:
             self.docker_container_id = None
             self.is_running = False
-            db.session.commit()
+            self.commit_state()
             return True, None
-        return False
+        return False, "Container could not be stopped"
 
     def restart(self) -> bool:
         """Restart the service."""
@@ -126,17 +190,19 @@ class Service(BaseModel):
         if container:
             self.docker_container_id = container.id
             self.is_running = True
-            db.session.commit()
+            self.commit_state()
             return True, None
-        return False
+        return False, "Container could not be restarted"
 
-    def update_state(self, is_running, container_id) -> bool:
-        """Update the service state."""
-        try:
-            self.is_running = is_running
-            self.docker_container_id = None if not is_running else container_id
-            db.session.commit()
-        except Exception as e:
-            logger.error("Error updating service state: %s", e)
-            return False
-        return True
+    def update_state(self, is_running, container_id, health=None) -> bool:
+        """Record the observed service state; it is persisted in the background only if it changed.
+
+        Returns:
+            bool: True if the state changed.
+        """
+        return service_state.observe(self, is_running, container_id, health)
+
+    def commit_state(self) -> None:
+        """Commit a state change made directly on the service."""
+        db.session.commit()
+        service_state.persisted(self)
@@ -0,0 +1,28 @@
+"""Downsampled container stats for Service."""
+from app.extensions import db
+
+
+class ServiceStat(db.Model):
+    """One rollup bucket of a service's container stats.
+
+    Rows are written in batches by the stats history store and are not part
+    of the admin models, so this does not extend BaseModel.
+    """
+
+    __tablename__ = "service_stat"
+    service_id = db.Column(
+        db.Integer,
+        db.ForeignKey("service.id", name="fk_service_stat_service_id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    # Bucket width in seconds (60, 600 or 3600)
+    resolution = db.Column(db.Integer, primary_key=True)
+    # Bucket start, epoch seconds
+    bucket = db.Column(db.Integer, primary_key=True)
+    samples = db.Column(db.Integer, nullable=False)
+    cpu_avg = db.Column(db.Float, nullable=True)
+    cpu_max = db.Column(db.Float, nullable=True)
+    memory_avg = db.Column(db.Float, nullable=True)
+    memory_max = db.Column(db.Float, nullable=True)
+    disk_avg = db.Column(db.Float, nullable=True)
+    disk_max = db.Column(db.Float, nullable=True)
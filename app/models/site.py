@@ -1,6 +1,8 @@
 """Site model that reflects an instance of the web app."""
+from sqlalchemy.orm import joinedload, selectinload
 from app.extensions import db
 from app.models.base_model import BaseModel
+from app.models.service.service import Service
 
 class Site(BaseModel):
     """Site model to represent a website.
@@ -26,3 +28,11 @@ class Site(BaseModel):
     about = db.relationship("About", backref="site", lazy=True, uselist=False)
     services = db.relationship("Service", backref="site", lazy=True)
 
+    @classmethod
+    def get_with_services(cls):
+        """Get the site with its contact, about and service graph in a fixed number of queries."""
+        return cls.query.options(
+            joinedload(cls.contact),
+            joinedload(cls.about),
+            selectinload(cls.services).options(*Service.graph_options()),
+        ).first()
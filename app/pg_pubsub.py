@@ -0,0 +1,218 @@
+"""Socket.IO message queue between worker processes over Postgres LISTEN/NOTIFY."""
+import base64
+import itertools
+import json
+import logging
+import select
+import threading
+import time
+import zlib
+import psycopg2
+from psycopg2 import sql
+from socketio import PubSubManager
+from app.leader_lock import libpq_dsn
+
+logger = logging.getLogger(__name__)
+
+# NOTIFY payloads must stay under 8000 bytes; longer messages are sent in chunks
+CHUNK_SIZE = 7000
+
+
+class PostgresManager(PubSubManager):
+    """Class to relay Socket.IO emits between worker processes over Postgres LISTEN/NOTIFY.
+
+    Each message is encoded as JSON (never pickle: anyone able to NOTIFY the
+    channel could otherwise run code in every worker), compressed and sent
+    with `pg_notify` on one channel of the app's own database, so no extra
+    service is needed.
+    Messages too long for one notification are split into chunks sent in a
+    single transaction, which Postgres delivers together and in order, and
+    every listener reassembles them.
+
+    Emits addressed to a session connected to this process are delivered
+    directly, so the per-session log and stats streams never leave the
+    worker serving them. Rooms only ever hold this process's sessions (every
+    worker runs its own stream hubs), so closing a room is local too.
+    """
+
+    name = "postgres"
+
+    def __init__(self, url, channel="flask-socketio", write_only=False, manager_logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=manager_logger)
+        self.dsn = libpq_dsn(url)
+        self.published = 0
+        self.received = 0
+        self._watchers = {}
+        self._ids = itertools.count()
+        self._publish_lock = threading.Lock()
+        self._connection = None
+
+    def watch(self, event, handler) -> None:
+        """Call `handler(data)` for every `event` emit relayed through the queue, on each worker."""
+        self._watchers[event] = handler
+
+    def emit(
+        self,
+        event,
+        data,
+        namespace=None,
+        room=None,
+        skip_sid=None,
+        callback=None,
+        to=None,
+        **kwargs,
+    ):
+        room = to or room
+        if room is not None and self.is_connected(room, namespace or "/"):
+            kwargs["ignore_queue"] = True
+        return super().emit(
+            event,
+            data,
+            namespace=namespace,
+            room=room,
+            skip_sid=skip_sid,
+            callback=callback,
+            **kwargs,
+        )
+
+    def close_room(self, room, namespace=None):
+        # Bypass PubSubManager's relay: rooms are per process here
+        return super(PubSubManager, self).close_room(  # pylint: disable=bad-super-call
+            room, namespace
+        )
+
+    def stats(self) -> dict:
+        """Get the number of messages published and received."""
+        return {"channel": self.channel, "published": self.published, "received": self.received}
+
+    def _handle_emit(self, message):
+        super()._handle_emit(message)
+        handler = self._watchers.get(message.get("event"))
+        if handler:
+            try:
+                handler(message.get("data"))
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error("Error handling relayed %s: %s", message.get("event"), e)
+
+    def _publish(self, data):
+        message_id = f"{self.host_id}.{next(self._ids)}"
+        notifications = encode_message(message_id, data)
+        for attempt in (1, 2):
+            try:
+                with self._publish_lock:
+                    connection = self._publisher()
+                    with connection.cursor() as cursor:
+                        for notification in notifications:
+                            cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, notification))
+                    connection.commit()
+                self.published += 1
+                return
+            except psycopg2.Error as e:
+                self._reset_publisher()
+                if attempt == 2:
+                    logger.error("Cannot publish Socket.IO message: %s", e)
+
+    def _listen(self):
+        backoff = 1
+        while True:
+            try:
+                connection = psycopg2.connect(self.dsn, application_name="mission-control-pubsub")
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(sql.SQL("LISTEN {}").format(sql.Identifier(self.channel)))
+                logger.info("Listening for Socket.IO messages on %s", self.channel)
+                backoff = 1
+                assembler = MessageAssembler()
+                while True:
+                    if not select.select([connection], [], [], 60)[0]:
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        try:
+                            data = assembler.add(connection.notifies.pop(0).payload)
+                        except (ValueError, IndexError, zlib.error) as e:
+                            logger.warning("Ignoring a malformed Socket.IO message: %s", e)
+                            continue
+                        if data is not None:
+                            self.received += 1
+                            yield data
+            except psycopg2.Error as e:
+                logger.error(
+                    "Socket.IO listener lost its connection (%s); retrying in %ss", e, backoff
+                )
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def _publisher(self):
+        """Get the publishing connection, connecting if needed (caller holds the lock)."""
+        if self._connection is None or self._connection.closed:
+            self._connection = psycopg2.connect(self.dsn, application_name="mission-control-pubsub")
+        return self._connection
+
+    def _reset_publisher(self) -> None:
+        with self._publish_lock:
+            if self._connection is not None:
+                try:
+                    self._connection.close()
+                except psycopg2.Error:
+                    pass
+            self._connection = None
+
+
+class MessageAssembler:
+    """Class to put chunked notifications back together into messages."""
+
+    def __init__(self, max_partial=64):
+        self.max_partial = max_partial
+        self._partial = {}
+
+    def add(self, notification):
+        """Add one notification.
+
+        Returns:
+            The decoded message once its last chunk arrived, else None.
+        """
+        message_id, index, count, chunk = notification.split(" ", 3)
+        count = int(count)
+        if count == 1:
+            return decode_payload(chunk)
+        chunks = self._partial.setdefault(message_id, [None] * count)
+        chunks[int(index)] = chunk
+        if any(part is None for part in chunks):
+            if len(self._partial) > self.max_partial:
+                # A sender died mid-message; forget the oldest partial one
+                self._partial.pop(next(iter(self._partial)))
+            return None
+        del self._partial[message_id]
+        return decode_payload("".join(chunks))
+
+
+##### Static methods #####
+def encode_message(message_id, data) -> list:
+    """Encode a message as one or more `pg_notify` payloads of at most CHUNK_SIZE characters."""
+    encoded = json.dumps(data, separators=(",", ":"), default=_encode_bytes).encode("utf-8")
+    payload = base64.b64encode(zlib.compress(encoded)).decode("ascii")
+    chunks = [payload[start : start + CHUNK_SIZE] for start in range(0, len(payload), CHUNK_SIZE)]
+    return [f"{message_id} {index} {len(chunks)} {chunk}" for index, chunk in enumerate(chunks)]
+
+
+def decode_payload(payload):
+    """Decode a message encoded by `encode_message` from its joined chunks."""
+    decoded = zlib.decompress(base64.b64decode(payload, validate=True))
+    message = json.loads(decoded, object_hook=_decode_bytes)
+    if not isinstance(message, dict):
+        raise ValueError("Socket.IO message is not an object")
+    return message
+
+
+def _encode_bytes(value):
+    """Encode binary attachments, which JSON has no type for."""
+    if isinstance(value, (bytes, bytearray)):
+        return {"__bytes__": base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"Cannot relay a {type(value).__name__} between workers")
+
+
+def _decode_bytes(value):
+    if len(value) == 1 and "__bytes__" in value:
+        return base64.b64decode(value["__bytes__"])
+    return value
@@ -0,0 +1,139 @@
+"""Periodic reconciliation of the service table against Docker."""
+import logging
+import threading
+import time
+from app.container_index import MANAGED_FILTER, SERVICE_LABEL, labels_of
+from app.extensions import db
+from app.models import Service
+from app.service_state import service_state
+from app.socket_events import emit_service_statuses
+
+logger = logging.getLogger(__name__)
+
+
+class Reconciler:
+    """Class to periodically correct drift between `Service` rows and Docker.
+
+    Each cycle costs one label-filtered `containers.list` call and one query
+    for every service, and fixes all differences with a single commit. Cycles
+    run every `interval` seconds and straight after the Docker event stream
+    reconnects.
+    """
+
+    def __init__(self, manager, app, interval=60):
+        self.manager = manager
+        self.app = app
+        self.interval = interval
+        self.cycles = 0
+        self.last_duration = None
+        self.last_drift = 0
+        self.total_drift = 0
+        self.last_run = None
+        self._wake = threading.Event()
+
+    def start(self) -> None:
+        """Run reconciliation cycles in a background thread."""
+        threading.Thread(target=self._run_forever, daemon=True).start()
+
+    def trigger(self) -> None:
+        """Run a cycle now instead of waiting for the interval."""
+        self._wake.set()
+
+    def reconcile(self) -> list:
+        """Run one reconciliation cycle.
+
+        Returns:
+            list: The services whose recorded state was corrected.
+        """
+        started = time.monotonic()
+        containers = self.manager.client.containers.list(
+            all=True, sparse=True, filters=MANAGED_FILTER
+        )
+        self.manager.container_index.update(containers)
+        by_service = {}
+        for container in containers:
+            service_id = labels_of(container).get(SERVICE_LABEL, "")
+            if not service_id.isdigit():
+                continue
+            current = by_service.get(int(service_id))
+            # Prefer the running container if a service has more than one
+            if current is None or container.status == "running":
+                by_service[int(service_id)] = container
+
+        services = Service.query.all()
+        legacy = self._legacy_containers(services, by_service)
+
+        changed = []
+        for service in services:
+            container = by_service.get(service.id) or legacy.get(service.docker_container_id)
+            is_running = bool(container) and container.status == "running"
+            container_id = container.id if is_running else None
+            if (service.is_running, service.docker_container_id) != (is_running, container_id):
+                logger.info(
+                    "Reconciling service %s: is_running %s -> %s",
+                    service.name,
+                    service.is_running,
+                    is_running,
+                )
+                service.is_running = is_running
+                service.docker_container_id = container_id
+                changed.append(service)
+
+        if changed:
+            db.session.commit()
+            for service in changed:
+                service_state.persisted(service)
+            emit_service_statuses([(service, "reconcile") for service in changed])
+
+        # Pick up containers whose start event was missed
+        self.manager.log_archiver.sync()
+
+        self.cycles += 1
+        self.last_run = time.time()
+        self.last_duration = round(time.monotonic() - started, 3)
+        self.last_drift = len(changed)
+        self.total_drift += len(changed)
+        logger.debug(
+            "Reconciled %s containers in %.3fs; %s drifted",
+            len(containers),
+            self.last_duration,
+            self.last_drift,
+        )
+        return changed
+
+    def _legacy_containers(self, services, by_service) -> dict:
+        """Look up recorded containers created before ownership labels, in one call."""
+        container_ids = [
+            service.docker_container_id
+            for service in services
+            if service.docker_container_id and service.id not in by_service
+        ]
+        if not container_ids:
+            return {}
+        containers = self.manager.client.containers.list(
+            all=True, sparse=True, filters={"id": container_ids}
+        )
+        self.manager.container_index.update(containers)
+        return {container.id: container for container in containers}
+
+    def stats(self) -> dict:
+        """Get cycle timing and drift counts."""
+        return {
+            "interval": self.interval,
+            "cycles": self.cycles,
+            "last_run": self.last_run,
+            "last_duration": self.last_duration,
+            "last_drift": self.last_drift,
+            "total_drift": self.total_drift,
+        }
+
+    def _run_forever(self) -> None:
+        while True:
+            with self.app.app_context():
+                try:
+                    self.reconcile()
+                except Exception as e:  # pylint: disable=broad-except
+                    db.session.rollback()
+                    logger.error("Reconciliation failed: %s", e)
+            self._wake.wait(self.interval)
+            self._wake.clear()
@@ -1,23 +1,40 @@
 """routes.py - Main routes for the application."""
 import os
+import json
 import logging
 from flask import (
     Blueprint,
+    Response,
     render_template,
     flash,
     redirect,
     url_for,
     jsonify,
     request,
+    current_app,
+    stream_with_context,
 )
+from sqlalchemy.orm import selectinload
 from flask_login import login_user, logout_user, login_required, current_user
 from app import db
 from app.forms import LoginForm
-from app.models import User, Site, Service, BaseModel
+from app.models import User, Service, BaseModel
+from app.socket_events import socketio, log_broker, status_log, stream_registry, wire_modes
+from app.view_cache import SiteViewCache
+from app.status_feed import StatusFeed
+from app.service_state import service_state
+from app.stats_history import stats_history
+from app.docker_service_manager import ServiceContainerNotFound
 
 bp = Blueprint("main", __name__)
 logger = logging.getLogger(__name__)
 
+# Landing page view model, invalidated by committed site/service changes
+site_view_cache = SiteViewCache()
+
+# Versioned statuses of every service, derived from the landing page view model
+status_feed = StatusFeed(site_view_cache)
+
 @bp.context_processor
 def inject_admin_models():
     if current_user.is_authenticated and current_user.is_admin:
@@ -26,12 +43,20 @@ def inject_admin_models():
     return {"admin_models": []}
 
 
+@bp.context_processor
+def inject_socket_transports():
+    # Without sticky sessions, clients of a multi-worker server must skip HTTP long polling
+    if current_app.config.get("WORKERS", 1) > 1:
+        return {"socket_transports": ["websocket"]}
+    return {"socket_transports": ["polling", "websocket"]}
+
+
 @bp.route("/", methods=["GET", "POST"])
 @bp.route("/index", methods=["GET", "POST"])
 @bp.route("/home", methods=["GET", "POST"])
 def index():
     """Index page"""
-    site = Site.query.first()
+    site = site_view_cache.get()
     return render_template("index.html", site=site)
 
 
@@ -66,7 +91,7 @@ def logout():
 @bp.route("/upload", methods=["GET", "POST"])
 @login_required
 def upload_file():
-    site = Site.query.first()
+    site = site_view_cache.get()
     if request.method == "POST":
         files = request.files.getlist("file[]")
         for file in files:
@@ -111,13 +136,187 @@ def update_environment_vars(service_id):
 
 @bp.route("/service/<int:service_id>/is_running", methods=["GET"])
 def is_service_running(service_id):
-    service = Service.query.get(service_id)
+    service = Service.query.options(selectinload(Service.environment_vars)).get(service_id)
     if service:
         return jsonify({"is_running": service.is_running, "url": service.url})
     else:
         return jsonify({"error": "Service not found"}), 404
 
 
+@bp.route("/services/status", methods=["GET"])
+def services_status():
+    """Get the status of every service in one response.
+
+    The state version is sent as the ETag and a request whose `If-None-Match`
+    matches the current version gets a 304. With `wait=<seconds>` such a
+    request is held until the version changes (a long poll) and gets the 304
+    only if nothing changed in that time.
+    """
+    wait = request.args.get("wait", 0, type=float)
+    wait = min(max(wait, 0), current_app.config["STATUS_LONG_POLL_MAX"])
+    tag, statuses = status_feed.current()
+    if wait and request.if_none_match.contains(tag):
+        # Don't hold a database connection while the request is parked
+        db.session.remove()
+        tag, statuses = status_feed.wait(tag, wait)
+    if request.if_none_match.contains(tag):
+        response = Response(status=304)
+    else:
+        response = jsonify({"version": tag, "services": statuses})
+    response.set_etag(tag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+@bp.route("/services/status/events", methods=["GET"])
+def services_status_events():
+    """Stream the status of every service as Server-Sent Events.
+
+    An event carrying every status is sent on connect and whenever the
+    version changes, with the version as the event id; a reconnecting client
+    that sends `Last-Event-ID` only gets an event once something changed.
+    Comments are sent while idle so proxies keep the connection open.
+    """
+    keepalive = current_app.config["STATUS_LONG_POLL_MAX"]
+
+    def events(tag):
+        while True:
+            db.session.remove()
+            new_tag, statuses = status_feed.wait(tag, keepalive)
+            if new_tag == tag:
+                yield ": keepalive\n\n"
+                continue
+            tag = new_tag
+            yield f"id: {tag}\nevent: status\ndata: {json.dumps(statuses)}\n\n"
+
+    return Response(
+        stream_with_context(events(request.headers.get("Last-Event-ID"))),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@bp.route("/service/<int:service_id>/logs", methods=["GET"])
+@login_required
+def service_logs(service_id):
+    """Get a page of a service's logs, newest first by page and oldest first within one.
+
+    Query args: `before` (cursor from the previous page), `since` (epoch
+    seconds to stop paging at), `limit` (lines per page) and `archive` (read
+    the log archive instead of the container). The archive is also used
+    when the service has no container any more.
+    """
+    service = Service.query.get(service_id)
+    if not service:
+        return jsonify({"error": "Service not found"}), 404
+    manager = current_app.docker_manager
+    window = {
+        "before": request.args.get("before"),
+        "since": request.args.get("since"),
+        "limit": min(max(request.args.get("limit", 200, type=int), 1), 1000),
+    }
+    try:
+        if request.args.get("archive"):
+            return jsonify(manager.log_archive.page(service.id, **window))
+        try:
+            return jsonify(manager.page_logs(service, **window))
+        except ServiceContainerNotFound:
+            return jsonify(manager.log_archive.page(service.id, **window))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid log window: {e}"}), 400
+
+
+@bp.route("/logs/archive", methods=["GET"])
+@login_required
+def log_archive_stats():
+    """Report the log archive's size per service and its write counters."""
+    return jsonify(current_app.docker_manager.log_archiver.stats())
+
+
+@bp.route("/service/<int:service_id>/stats/history", methods=["GET"])
+@login_required
+def service_stats_history(service_id):
+    """Get a window of a service's stats history.
+
+    Query args: `since` and `until` (epoch seconds) and `resolution` ("raw",
+    "1m", "10m", "1h" or "auto").
+    """
+    try:
+        return jsonify(
+            stats_history.query(
+                service_id,
+                since=request.args.get("since"),
+                until=request.args.get("until"),
+                resolution=request.args.get("resolution", "auto"),
+            )
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@bp.route("/host/overview", methods=["GET"])
+@login_required
+def host_overview():
+    """Get host CPU/memory/disk and the current usage of every running managed container."""
+    return jsonify(current_app.docker_manager.host_overview.snapshot())
+
+
+@bp.route("/streams", methods=["GET"])
+@login_required
+def live_streams():
+    """Report how many log and stats streams this worker serves, and its message queue traffic."""
+    stats = getattr(socketio.server.manager, "stats", None)
+    return jsonify(
+        {
+            "total": len(stream_registry),
+            **stream_registry.counts(),
+            "log_lines_read": log_broker.lines_read,
+            "log_lines_matched": log_broker.lines_matched,
+            "log_lines_skipped": log_broker.lines_skipped,
+            "wire": wire_modes.stats(),
+            "message_queue": stats() if stats else None,
+        }
+    )
+
+
+@bp.route("/ready", methods=["GET"])
+def readiness():
+    """Report whether startup warmup has finished, with per-step timings."""
+    status = current_app.startup.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+
+@bp.route("/service/state", methods=["GET"])
+@login_required
+def service_runtime_state():
+    """Report the in-process service state, the database writes it saved and status resyncs."""
+    return jsonify({**service_state.snapshot(), "status_log": status_log.stats()})
+
+
+@bp.route("/reconciler", methods=["GET"])
+@login_required
+def reconciler_status():
+    """Report reconciliation cycle timing and drift counts."""
+    reconciler = current_app.docker_manager.reconciler
+    if reconciler is None:
+        return jsonify({"error": "Reconciler is not running in this process"}), 404
+    return jsonify(reconciler.stats())
+
+
+@bp.route("/daemons", methods=["GET"])
+@login_required
+def daemon_status():
+    """Report the outcome and start latency of the last daemon bring-up."""
+    return jsonify(current_app.docker_manager.daemon_results)
+
+
+@bp.route("/images/cache", methods=["GET"])
+@login_required
+def image_cache_status():
+    """Report the pull progress of every service image."""
+    return jsonify(current_app.docker_manager.image_cache.snapshot())
+
+
 # Catch all other routes and redirect to the index
 # NOTE: Must be last!
 @bp.route("/<path:unused_path>")
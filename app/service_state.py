@@ -0,0 +1,181 @@
+"""In-process store of service runtime state, persisted only on change."""
+import logging
+import threading
+import time
+from app.extensions import db
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceState:
+    """Runtime state of a single service."""
+
+    def __init__(self, service_id, is_running, container_id, name=None):
+        self.service_id = service_id
+        self.name = name
+        self.is_running = is_running
+        self.container_id = container_id
+        self.health = None
+        self.last_seen = None
+
+    @property
+    def id(self) -> int:  # pylint: disable=invalid-name
+        """Get the service id, so a state can stand in for its service in status payloads."""
+        return self.service_id
+
+    def to_dict(self) -> dict:
+        """Serialize for the service state endpoint."""
+        return {
+            "service_id": self.service_id,
+            "is_running": self.is_running,
+            "container_id": self.container_id,
+            "health": self.health,
+            "last_seen": self.last_seen,
+        }
+
+
+class ServiceStateStore:
+    """Class to keep service runtime state in memory and persist only real changes.
+
+    Lookups such as `find_container` report what they observe on every call;
+    only observations that differ from the stored state are queued, and queued
+    changes are written to the service table in one batch every
+    `flush_interval` seconds. The batch is a bulk update, which fires no
+    session events, so `on_flush(states)` is called with the state written
+    for each service, for caches to invalidate themselves and clients to be
+    told. `writes_saved` counts the commits avoided.
+    """
+
+    def __init__(self, flush_interval=1.0):
+        self.flush_interval = flush_interval
+        self.app = None
+        self.model = None
+        self.on_flush = None
+        self.writes = 0
+        self.writes_saved = 0
+        self.flushes = 0
+        self._lock = threading.Lock()
+        self._states = {}
+        self._pending = {}
+        self._flusher_started = False
+
+    def init_app(self, app, model) -> None:
+        """Bind the store to an app and the model its state is persisted to."""
+        self.app = app
+        self.model = model
+
+    def observe(self, service, is_running, container_id, health=None) -> bool:
+        """Record an observation of a service's container.
+
+        The observation is compared with the stored state, never written to
+        the service object: assigning its mapped attributes would mark it
+        dirty and the next autoflush would issue the very UPDATE the batch
+        is meant to save. Nothing is committed here.
+
+        Returns:
+            bool: True if the observation changed the persisted state.
+        """
+        container_id = container_id if is_running else None
+        with self._lock:
+            state = self._states.get(service.id)
+            if state is None:
+                state = ServiceState(
+                    service.id, service.is_running, service.docker_container_id, service.name
+                )
+                self._states[service.id] = state
+            elif service.id not in self._pending:
+                # Nothing is queued, so the row as loaded is what is persisted
+                state.is_running = service.is_running
+                state.container_id = service.docker_container_id
+            state.health = health
+            state.last_seen = time.time()
+            if (state.is_running, state.container_id) == (is_running, container_id):
+                self.writes_saved += 1
+                return False
+            state.is_running, state.container_id = is_running, container_id
+            self._pending[service.id] = {
+                "id": service.id,
+                "is_running": is_running,
+                "docker_container_id": container_id,
+            }
+            self._start_flusher()
+        return True
+
+    def persisted(self, service) -> None:
+        """Sync with a state change committed directly, dropping any queued write for it."""
+        with self._lock:
+            self._pending.pop(service.id, None)
+            state = self._states.get(service.id)
+            if state is not None:
+                state.is_running = service.is_running
+                state.container_id = service.docker_container_id
+
+    def flush(self) -> int:
+        """Write every queued change in one transaction.
+
+        Returns:
+            int: The number of services written.
+        """
+        with self._lock:
+            rows = list(self._pending.values())
+            self._pending.clear()
+        if not rows:
+            return 0
+        with self.app.app_context():
+            try:
+                db.session.bulk_update_mappings(self.model, rows)
+                db.session.commit()
+            except Exception as e:  # pylint: disable=broad-except
+                db.session.rollback()
+                logger.error("Error persisting service state: %s", e)
+                with self._lock:
+                    for row in rows:
+                        self._pending.setdefault(row["id"], row)
+                return 0
+        self.writes += len(rows)
+        self.flushes += 1
+        logger.debug("Persisted state for %s services", len(rows))
+        if self.on_flush:
+            with self._lock:
+                names = {row["id"]: self._states[row["id"]].name for row in rows}
+            self.on_flush(
+                [
+                    ServiceState(
+                        row["id"], row["is_running"], row["docker_container_id"], names[row["id"]]
+                    )
+                    for row in rows
+                ]
+            )
+        return len(rows)
+
+    def pending_states(self) -> dict:
+        """Get the running state of every service with a change not yet written, by id."""
+        with self._lock:
+            return {service_id: row["is_running"] for service_id, row in self._pending.items()}
+
+    def snapshot(self) -> dict:
+        """Get the runtime state of every observed service and the write counters."""
+        with self._lock:
+            return {
+                "services": [state.to_dict() for state in self._states.values()],
+                "pending": len(self._pending),
+                "writes": self.writes,
+                "writes_saved": self.writes_saved,
+                "flushes": self.flushes,
+            }
+
+    def _start_flusher(self) -> None:
+        """Start the background flusher (caller holds the lock)."""
+        if self._flusher_started or self.app is None:
+            return
+        self._flusher_started = True
+        threading.Thread(target=self._flush_forever, daemon=True).start()
+
+    def _flush_forever(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+# Shared by the models, the Docker manager and the routes
+service_state = ServiceStateStore()
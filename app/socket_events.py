@@ -1,22 +1,76 @@
 """Flask SocketIO events"""
 import functools
 import logging
+import time
 from flask_socketio import emit, SocketIO, disconnect
 from flask_login import current_user
-from flask import current_app as app
+from flask import current_app as app, request
 from app.models.service.service import Service
+from app.log_broker import LogBroker
+from app.log_filter import get_filter, source_of
+from app.log_framing import timestamp_ns
+from app.stats_hub import StatsHub
+from app.stream_registry import StreamKind, StreamLimitReached, StreamRegistry
+from app.job_queue import JobQueue, JobQueueFull, JobStatus
+from app.docker_service_manager import ServiceContainerNotFound
+from app.wire_format import WireModes
+from app.status_log import StatusLog
+from app.service_state import service_state
 
 socketio = SocketIO()
 logger = logging.getLogger(__name__)
 
-# Streaming status for each service
-streaming_status = {}
+# Live (sid, service_id, kind) subscriptions, released on stop or disconnect
+stream_registry = StreamRegistry()
 
-def set_streaming_status(service_id, status):
-    streaming_status[service_id] = status
 
-def get_streaming_status(service_id):
-    return streaming_status.get(service_id, False)
+def release_ended_stream(kind):
+    """Build a callback that drops registrations for a stream that ended upstream."""
+
+    def release(service_id, sids):
+        for sid in sids:
+            stream_registry.remove(sid, service_id, kind)
+
+    return release
+
+
+# Compact formats negotiated per /service session
+wire_modes = WireModes()
+
+log_broker = LogBroker(
+    socketio, on_stream_end=release_ended_stream(StreamKind.LOGS), wire_modes=wire_modes
+)
+stats_hub = StatsHub(
+    socketio, on_stream_end=release_ended_stream(StreamKind.STATS), wire_modes=wire_modes
+)
+stream_hubs = {StreamKind.LOGS: log_broker, StreamKind.STATS: stats_hub}
+
+# Sequenced status broadcasts, replayed to clients that reconnect
+status_log = StatusLog()
+
+# Docker start/stop/restart operations run here instead of in the socket handler
+job_queue = JobQueue(socketio)
+
+
+def subscribe_stream(kind, service_id, open_upstream, **options) -> bool:
+    """Register the current session for a stream and attach it to the shared upstream."""
+    stream_registry.add(request.sid, service_id, kind)
+    try:
+        subscribed = stream_hubs[kind].subscribe(
+            request.sid, service_id, open_upstream, **options
+        )
+    except Exception:
+        stream_registry.remove(request.sid, service_id, kind)
+        raise
+    if not subscribed:
+        stream_registry.remove(request.sid, service_id, kind)
+    return subscribed
+
+
+def unsubscribe_stream(kind, service_id) -> None:
+    """Release the current session's subscription to a stream."""
+    if stream_registry.remove(request.sid, service_id, kind):
+        stream_hubs[kind].unsubscribe(request.sid, service_id)
 
 
 ##### SocketIO Auth #####
@@ -63,35 +117,124 @@ def handle_disconnect():
     disconnect()
 
 
+@socketio.on("disconnect", namespace="/service")
+def handle_service_disconnect():
+    """Release every stream held by a disconnected /service session."""
+    logger.info("Client disconnected from /service")
+    for sid, service_id, kind in stream_registry.remove_session(request.sid):
+        stream_hubs[kind].unsubscribe(sid, service_id)
+    wire_modes.drop(request.sid)
+
+
+@socketio.on("negotiate_wire", namespace="/service")
+@authenticated_only
+def handle_negotiate_wire(data):
+    """Opt a session into compact payloads; the ack lists the formats accepted.
+
+    Clients that never send this keep receiving JSON. Streams the session
+    already has open keep their format until they are restarted.
+    """
+    return {"formats": wire_modes.negotiate(request.sid, (data or {}).get("formats"))}
+
+
 ##### Service events #####
 @socketio.on("get_logs", namespace="/service")
 @authenticated_only
 def handle_get_logs(data):
-    """Handle a client request for service logs."""
+    """Handle a client request for service logs.
+
+    A start request may limit the history it is sent first with `tail` (line
+    count), `since` and `until` (epoch seconds). With `until` the history is
+    sent once and no live stream is opened. The acknowledgement carries the
+    cursor for paging further back through `/service/<id>/logs`.
+
+    Lines are filtered on the server: `stream` selects stdout or stderr,
+    `filter` is a substring (or a regular expression with `regex`, if the
+    server allows them with LOG_FILTER_ALLOW_REGEX), and
+    `level` is the minimum log level. Sending start again changes the filter.
+    """
     service_id = int(data.get("serviceId"))
     command = data.get("command")
     logger.info("Client requested to %s streaming logs for service %s", command, service_id)
     service = Service.query.get(service_id)
     if command == "start":
-        set_streaming_status(service_id, True)
         if service and service.docker_container_id:
             try:
-                for log_line in app.docker_manager.stream_container_logs(service):
-                    if not get_streaming_status(service_id):
-                        break
-                    emit("log_message", {"service_id": service_id, "log": log_line})
+                source = source_of(data.get("stream"))
+                log_filter = get_filter(
+                    data.get("filter"),
+                    data.get("regex"),
+                    data.get("level"),
+                    app.config["LOG_FILTER_ALLOW_REGEX"],
+                )
+                tail = data.get("tail", app.config["LOG_DEFAULT_TAIL"])
+                entries = None
+                if not data.get("since") and not data.get("until"):
+                    # Another session's stream may already hold the lines asked for
+                    entries = log_broker.recent(service_id, source, tail)
+                read_at = time.time()
+                if entries is None:
+                    entries = app.docker_manager.read_logs(
+                        service, tail, data.get("since"), data.get("until"), source
+                    )
+                if entries is None:
+                    raise ServiceContainerNotFound()
+                if data.get("until"):
+                    history = [line for _, line in entries]
+                    emit(
+                        "log_message",
+                        {
+                            "service_id": service_id,
+                            "lines": log_filter.apply(history),
+                            "skipped": 0,
+                        },
+                    )
+                else:
+                    # Follow on from just before the last history line; the broker
+                    # drops the overlap
+                    since = (timestamp_ns(entries[-1][0]) - 1000) / 1e9 if entries else read_at
+                    subscribe_stream(
+                        StreamKind.LOGS,
+                        service_id,
+                        lambda: app.docker_manager.open_log_stream(
+                            service, since=since, source=source, timestamps=True
+                        ),
+                        history=entries,
+                        source=source,
+                        log_filter=log_filter,
+                    )
+                return {"cursor": entries[0][0] if entries else None}
+            except StreamLimitReached as e:
+                logger.warning("Refusing logs stream for service %s: %s", service_id, e)
+                emit(
+                    "get_logs_failed",
+                    {
+                        "service_id": service_id,
+                        "error": e.message,
+                        "message": "Too many live streams; close another view and retry",
+                    },
+                )
+            except ValueError as e:
+                emit(
+                    "get_logs_failed",
+                    {
+                        "service_id": service_id,
+                        "error": str(e),
+                        "message": f"Invalid log request: {e}",
+                    },
+                )
             except Exception as e:
                 logger.error("Error streaming logs: %s", e)
                 emit(
                     "get_logs_failed",
                     {
                         "service_id": service_id,
-                        "error": e,
+                        "error": str(e),
                         "message": "Error streaming logs; is the service running?",
                     },
                 )
     elif command == "stop":
-        set_streaming_status(service_id, False)
+        unsubscribe_stream(StreamKind.LOGS, service_id)
     else:
         if service.is_running:
             logger.error("Service %s is running but has no container ID", service_id)
@@ -115,73 +258,120 @@ def handle_get_stats(data):
     logger.info("Client requested to %s streaming stats for service %s", command, service_id)
     service = Service.query.get(service_id)
     if command == "start":
-        set_streaming_status(service_id, True)
         if service and service.docker_container_id:
             try:
-                for stats in app.docker_manager.stream_container_stats(service):
-                    if not get_streaming_status(service_id):
-                        break
-                    emit("stats_message", {"service_id": service_id, "stats": stats})
-            except Exception as e:
-                logger.error("Error streaming stats: %s", e)
+                subscribe_stream(
+                    StreamKind.STATS,
+                    service_id,
+                    lambda: app.docker_manager.open_stats_stream(service),
+                )
+            except StreamLimitReached as e:
+                logger.warning("Refusing stats stream for service %s: %s", service_id, e)
                 emit(
                     "get_stats_failed",
                     {
                         "service_id": service_id,
-                        "error": e,
-                        "message": "Error streaming stats; is the service running?",
+                        "error": e.message,
+                        "message": "Too many live streams; close another view and retry",
                     },
                 )
-        elif command == "stop":
-            set_streaming_status(service_id, False)
-        else:
-            if service.is_running:
-                logger.error("Service %s is running but has no container ID", service_id)
+            except Exception as e:
+                logger.error("Error streaming stats: %s", e)
                 emit(
                     "get_stats_failed",
                     {
                         "service_id": service_id,
-                        "error": "Service is running but has no container ID",
-                        "message": "Service is in a bad state; please restart it",
+                        "error": str(e),
+                        "message": "Error streaming stats; is the service running?",
                     },
                 )
+    elif command == "stop":
+        unsubscribe_stream(StreamKind.STATS, service_id)
+    else:
+        if service.is_running:
+            logger.error("Service %s is running but has no container ID", service_id)
+            emit(
+                "get_stats_failed",
+                {
+                    "service_id": service_id,
+                    "error": "Service is running but has no container ID",
+                    "message": "Service is in a bad state; please restart it",
+                },
+            )
+        else:
+            logger.info("Service %s is not running; no stats to fetch", service_id)
+
+# action -> (success event, failure event, success message, failure message)
+SERVICE_ACTIONS = {
+    "start": (
+        "service_started",
+        "service_start_failed",
+        "Service started successfully",
+        "Error starting service",
+    ),
+    "stop": (
+        "service_stopped",
+        "service_stop_failed",
+        "Service stopped successfully",
+        "Error stopping service",
+    ),
+    "restart": (
+        "service_restarted",
+        "service_restart_failed",
+        "Service restarted successfully",
+        "Error restarting service",
+    ),
+}
+
+
+def run_service_action(job):
+    """Job body: run a start/stop/restart against the service's container."""
+    service = Service.get_with_graph(job.service_id)
+    if not service:
+        raise ServiceNotFound(f"Service not found for service_id={job.service_id}")
+    return getattr(service, job.action)()
+
+
+def queue_service_action(action, service_id):
+    """Queue a start/stop/restart of a service and report the outcome to the caller.
+
+    Returns:
+        dict: Socket.IO acknowledgement carrying the job id, or the refusal reason.
+    """
+    success_event, failure_event, success_message, failure_message = SERVICE_ACTIONS[action]
+    sid = request.sid
+
+    def report(job):
+        result, error = job.result if job.status == JobStatus.SUCCEEDED else (False, job.error)
+        if result:
+            logger.info("Service %s %s job %s succeeded", service_id, action, job.id)
+            payload = {"service_id": service_id, "message": success_message}
+            event = success_event
+        else:
+            logger.error("Error running %s on service %s: %s", action, service_id, error)
+            if isinstance(job.exception, ServiceNotFound):
+                message = "Service not found"
             else:
-                logger.info("Service %s is not running; no stats to fetch", service_id)
+                message = failure_message
+            payload = {"service_id": service_id, "message": message, "error": error}
+            event = failure_event
+        socketio.emit(event, {**payload, "job_id": job.id}, to=sid, namespace="/service")
+
+    try:
+        job = job_queue.submit(action, service_id, run_service_action, sid=sid, on_done=report)
+    except JobQueueFull as e:
+        logger.warning("Refusing to %s service %s: %s", action, service_id, e)
+        emit(failure_event, {"service_id": service_id, "message": e.message, "error": e.message})
+        return {"error": e.message}
+    return {"job_id": job.id}
+
 
 @socketio.on("start_service", namespace="/service")
 @authenticated_only
 def handle_start_service(service_id):
     """Handle a client request to start a service."""
     logger.info("Client requested to start service %s", service_id)
-    service = Service.query.get(service_id)
-    if service:
-        result, error = service.start()
-        if result:
-            logger.info("Service %s started", service_id)
-            emit(
-                "service_started",
-                {"service_id": service_id, "message": "Service started successfully"},
-            )
-        else:
-            logger.error("Error starting service %s: %s", service_id, error)
-            emit(
-                "service_start_failed",
-                {
-                    "service_id": service_id,
-                    "message": "Error starting service",
-                    "error": error,
-                },
-            )
-    else:
-        logger.error("Service %s not found", service_id)
-        emit(
-            "service_start_failed",
-            {
-                "service_id": service_id,
-                "message": "Service not found",
-                "error": f"Service not found for service_id={service_id}",
-            },
-        )
+    return queue_service_action("start", service_id)
 
 
 @socketio.on("stop_service", namespace="/service")
@@ -189,35 +379,7 @@ def handle_start_service(service_id):
 def handle_stop_service(service_id):
     """Handle a client request to stop a service."""
     logger.info("Client requested to stop service %s", service_id)
-    service = Service.query.get(service_id)
-    if service:
-        result, error = service.stop()
-        if result:
-            logger.info("Service %s stopped", service_id)
-            emit(
-                "service_stopped",
-                {"service_id": service_id, "message": "Service stopped successfully"},
-            )
-        else:
-            logger.error("Error starting service %s: %s", service_id, error)
-            emit(
-                "service_stop_failed",
-                {
-                    "service_id": service_id,
-                    "message": "Error stopping service",
-                    "error": error,
-                },
-            )
-    else:
-        logger.error("Service %s not found", service_id)
-        emit(
-            "service_stop_failed",
-            {
-                "service_id": service_id,
-                "message": "Service not found",
-                "error": f"Service not found for service_id={service_id}",
-            },
-        )
+    return queue_service_action("stop", service_id)
 
 
 @socketio.on("restart_service", namespace="/service")
@@ -225,50 +387,91 @@ def handle_stop_service(service_id):
 def handle_restart_service(service_id):
     """Handle a client request to restart a service."""
     logger.info("Client requested to restart service %s", service_id)
-    service = Service.query.get(service_id)
-    if service:
-        result, error = service.restart()
-        if result:
-            logger.info("Service %s restarted", service_id)
-            emit(
-                "service_restarted",
-                {"service_id": service_id, "message": "Service restarted successfully"},
-            )
-        else:
-            logger.error("Error starting service %s: %s", service_id, error)
-            emit(
-                "service_restart_failed",
-                {
-                    "service_id": service_id,
-                    "message": "Error restarting service",
-                    "error": error,
-                },
-            )
-    else:
-        logger.error("Service %s not found", service_id)
-        emit(
-            "service_restart_failed",
-            {
-                "service_id": service_id,
-                "message": "Service not found",
-                "error": f"Service not found for service_id={service_id}",
-            },
-        )
+    return queue_service_action("restart", service_id)
+
+
+class ServiceNotFound(Exception):
+    """Exception raised when a queued job targets a service that does not exist."""
 
-def emit_service_status(service, event):
-    """Emit a service status event."""
-    emit(
-        "service_status",
-        {
-            "service_id": service.id,
-            "service_name": service.name,
-            "is_running": service.is_running,
-            "event": event,
-        },
+def service_status(service, event) -> dict:
+    """Build the status payload broadcast for a service."""
+    return {
+        "service_id": service.id,
+        "service_name": service.name,
+        "is_running": service.is_running,
+        "event": event,
+    }
+
+
+def emit_service_statuses(changes):
+    """Broadcast a batch of service status changes as a single, sequenced event.
+
+    Args:
+        changes (list): (service, event) pairs.
+    """
+    broadcast_statuses([service_status(service, event) for service, event in changes])
+
+
+def broadcast_statuses(statuses):
+    """Number a batch of status payloads in the status log and broadcast it."""
+    seq = status_log.append(statuses)
+    socketio.emit(
+        "service_status_batch",
+        {"epoch": status_log.epoch, "seq": seq, "statuses": statuses},
         namespace="/service",
-        broadcast=True,
     )
 
+
+@socketio.on("resync_status", namespace="/service")
+@authenticated_only
+def handle_resync_status(data):
+    """Catch a (re)connecting client up on the status changes it missed.
+
+    The client sends the epoch and sequence of the last batch it applied.
+    The ack carries the missed batches as `deltas`, or a `snapshot` of every
+    service's state if the client is too far behind or the server restarted.
+    A client with no sequence yet just gets the current one.
+    """
+    data = data or {}
+    seq = status_log.seq
+    if not isinstance(data.get("seq"), int):
+        return {"epoch": status_log.epoch, "seq": seq}
+    deltas = status_log.since(data.get("epoch"), data.get("seq"))
+    if deltas is not None:
+        return {
+            "epoch": status_log.epoch,
+            "seq": deltas[-1][0] if deltas else data["seq"],
+            "deltas": [{"seq": batch_seq, "statuses": statuses} for batch_seq, statuses in deltas],
+        }
+    # Read after taking the sequence, so the snapshot includes every batch up to it;
+    # changes this worker observed but hasn't written yet are newer than the rows
+    rows = Service.query.with_entities(Service.id, Service.is_running).order_by(Service.id)
+    pending = service_state.pending_states()
+    return {
+        "epoch": status_log.epoch,
+        "seq": seq,
+        "snapshot": [
+            [service_id, pending.get(service_id, is_running)] for service_id, is_running in rows
+        ],
+    }
+
+
+def emit_image_progress(progress):
+    """Broadcast the pull progress of a single image."""
+    socketio.emit("image_cache_progress", progress, namespace="/service")
+
+
+@socketio.on("get_host_overview", namespace="/service")
+@authenticated_only
+def handle_get_host_overview(_data=None):
+    """Send the host-wide resource overview to the requesting client."""
+    try:
+        emit("host_overview", app.docker_manager.host_overview.snapshot())
+    except Exception as e:
+        logger.error("Error sampling host overview: %s", e)
+        emit("host_overview_failed", {"error": str(e)})
+
+
 ##### SocketIO test events #####
 @socketio.on("message", namespace="/test")
 def handle_message(message):
@@ -0,0 +1,175 @@
+"""Background warmup pipeline run after the app is created."""
+import logging
+import os
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StartupStep:
+    """A single timed warmup step."""
+
+    def __init__(self, name, func, exclusive=False, required=True, ready_check=None):
+        self.name = name
+        self.func = func
+        self.exclusive = exclusive
+        self.required = required
+        self.ready_check = ready_check
+        self.status = "pending"
+        self.error = None
+        self.duration = None
+
+    def to_dict(self) -> dict:
+        """Serialize for the readiness endpoint."""
+        return {
+            "name": self.name,
+            "status": self.status,
+            "error": self.error,
+            "duration": self.duration,
+            "exclusive": self.exclusive,
+            "required": self.required,
+        }
+
+
+class StartupPipeline:
+    """Class to run the app's heavy warmup steps in the background.
+
+    `create_app` only registers steps; `start` runs them in order in a
+    background task, each inside an app context, timing and logging every one.
+    Steps marked exclusive (schema creation, daemon bring-up, image caching,
+    the reconciler) run in only one process: the leader, whichever first takes
+    the leader lock. Followers keep contending every `retry_interval` seconds
+    and run the exclusive steps if they take over; a leader that loses its
+    lock stops itself so that two leaders never run at once. The app is ready
+    once every required step has finished.
+
+    A required exclusive step can have a `ready_check`, called with the app,
+    that tells whether the leader has finished it (e.g. the schema exists).
+    Followers poll it every `poll_interval` seconds before moving on, so they
+    never report ready, or run later steps, ahead of the leader. A follower
+    that takes the lock while waiting runs the step itself.
+    """
+
+    def __init__(self, app, leader_lock, retry_interval=10.0, poll_interval=1.0):
+        self.app = app
+        self.leader_lock = leader_lock
+        self.retry_interval = retry_interval
+        self.poll_interval = poll_interval
+        self.steps = []
+        self.started_at = None
+        self.is_leader = None
+        self.elected_at = None
+        self._done = threading.Event()
+
+    def add_step(self, name, func, exclusive=False, required=True, ready_check=None) -> None:
+        """Register a warmup step; `func` is called with the app inside an app context."""
+        self.steps.append(
+            StartupStep(name, func, exclusive=exclusive, required=required, ready_check=ready_check)
+        )
+
+    def start(self, socketio) -> None:
+        """Run every registered step in a background task."""
+        self.started_at = time.time()
+        socketio.start_background_task(self.run)
+
+    def run(self) -> None:
+        """Run every registered step in order, then keep contending for or holding leadership."""
+        self.is_leader = self.leader_lock.acquire()
+        if self.is_leader:
+            self.elected_at = time.time()
+        logger.info(
+            "Starting warmup (%s)",
+            "leader" if self.is_leader else "follower; exclusive steps skipped",
+        )
+        for index, step in enumerate(self.steps):
+            if step.exclusive and not self.is_leader:
+                if step.required and step.ready_check:
+                    self._wait_for_leader(step, self.steps[:index])
+                if not self.is_leader:
+                    step.status = "skipped"
+                    continue
+            self._run_step(step)
+        self._done.set()
+        logger.info("Warmup finished in %.2fs", time.time() - self.started_at)
+        self._watch_leadership()
+
+    @property
+    def is_ready(self) -> bool:
+        """Check whether every required step has finished successfully."""
+        return all(
+            step.status in ("done", "skipped") for step in self.steps if step.required
+        )
+
+    def wait(self, timeout=None) -> bool:
+        """Block until every step has run."""
+        return self._done.wait(timeout)
+
+    def status(self) -> dict:
+        """Get readiness and the per-step timings."""
+        return {
+            "ready": self.is_ready,
+            "leader": self.is_leader,
+            "elected_at": self.elected_at,
+            "pid": os.getpid(),
+            "uptime": round(time.time() - self.started_at, 3) if self.started_at else None,
+            "steps": [step.to_dict() for step in self.steps],
+        }
+
+    def _run_step(self, step) -> None:
+        step.status = "running"
+        started = time.monotonic()
+        with self.app.app_context():
+            try:
+                step.func(self.app)
+                step.status = "done"
+            except Exception as e:  # pylint: disable=broad-except
+                step.status = "failed"
+                step.error = str(e)
+                logger.error("Startup step %s failed: %s", step.name, e)
+        step.duration = round(time.monotonic() - started, 3)
+        logger.info("Startup step %s %s in %.2fs", step.name, step.status, step.duration)
+
+    def _wait_for_leader(self, step, earlier_steps) -> None:
+        """Poll until the leader has finished a step, or take over if this process gets the lock."""
+        step.status = "waiting"
+        logger.info("Waiting for the leader to finish startup step %s", step.name)
+        last_contended = time.monotonic()
+        while not self._leader_finished(step):
+            time.sleep(self.poll_interval)
+            if time.monotonic() - last_contended < self.retry_interval:
+                continue
+            last_contended = time.monotonic()
+            if self.leader_lock.acquire():
+                self._take_over(earlier_steps)
+                return
+
+    def _leader_finished(self, step) -> bool:
+        with self.app.app_context():
+            try:
+                return bool(step.ready_check(self.app))
+            except Exception as e:  # pylint: disable=broad-except
+                logger.debug("Ready check for startup step %s failed: %s", step.name, e)
+                return False
+
+    def _take_over(self, steps) -> None:
+        """Become the leader and run the exclusive steps among `steps`."""
+        self.is_leader = True
+        self.elected_at = time.time()
+        logger.info("Elected leader; running the exclusive startup steps")
+        for step in steps:
+            if step.exclusive:
+                self._run_step(step)
+
+    def _watch_leadership(self) -> None:
+        """Take over the exclusive steps if the leader goes away, or stop if the lock was lost."""
+        while True:
+            time.sleep(self.retry_interval)
+            if self.is_leader:
+                if not self.leader_lock.is_held():
+                    logger.critical("Leader lock lost; stopping this worker so it can be replaced")
+                    os.kill(os.getpid(), signal.SIGTERM)
+                    return
+            elif self.leader_lock.acquire():
+                self._take_over(self.steps)
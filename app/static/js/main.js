@@ -7,8 +7,8 @@ if (window.location.hash === '#home' || window.location.hash === '#index') {
 // ##########################################
 // #            Websocket Section           #
 // ##########################################
-const socket = io();
-const service_socket = io('/service');
+const socket = io({ transports: SOCKET_TRANSPORTS });
+const service_socket = io('/service', { transports: SOCKET_TRANSPORTS });
 
 socket.on('connect_error', (error) => {
     console.error('Error connecting to websocket server:', error);
@@ -22,6 +22,43 @@ socket.on('disconnect', () => {
     console.info('Disconnected from websocket server');
 });
 
+// Ask for compact stats frames and compressed log batches; the server keeps
+// sending JSON for anything it does not accept
+service_socket.on('connect', () => {
+    var formats = ['stats-packed-v1'];
+    if (typeof DecompressionStream !== 'undefined') {
+        formats.push('logs-deflate-v1');
+    }
+    service_socket.emit('negotiate_wire', { formats: formats }, function(response) {
+        console.info('Compact wire formats: ' + response.formats.join(', '));
+    });
+
+    // Catch up on any status changes missed while disconnected
+    resyncStatus();
+});
+
+// Decompress a raw deflate log batch into its lines
+function inflateLines(deflated) {
+    var stream = new Blob([deflated]).stream().pipeThrough(new DecompressionStream('deflate-raw'));
+    return new Response(stream).text().then(function(text) {
+        return text.split('\n');
+    });
+}
+
+// Unpack a stats frame: service id (uint32), cpu % (float32), memory and disk bytes (float64)
+function unpackStats(frame) {
+    var view = new DataView(frame);
+    var orNull = function(value) { return isNaN(value) ? null : value; };
+    return {
+        service_id: view.getUint32(0, true),
+        stats: {
+            cpu_usage: orNull(view.getFloat32(4, true)),
+            memory_usage: orNull(view.getFloat64(8, true)),
+            disk_usage: orNull(view.getFloat64(16, true)),
+        },
+    };
+}
+
 // ##########################################
 // #            Services Section            #
 // ##########################################
@@ -29,7 +66,7 @@ function launchService(url) {
     window.open(url, '_blank');
 }
 
-service_socket.on('service_status', function(data) {
+function handleServiceStatus(data) {
     var serviceId = data.service_id;
     var serviceName = data.service_name;
     var isRunning = data.is_running;
@@ -37,6 +74,49 @@ service_socket.on('service_status', function(data) {
     updateLaunchButtonState(serviceId, isRunning);
     refreshSocketConnection(serviceId, isRunning);
     showToast('Service status changed- ' + serviceName + ': ' + isRunning);
+}
+
+service_socket.on('service_status', handleServiceStatus);
+
+// Docker events are coalesced server side and arrive as one sequenced batch;
+// the epoch changes when the server restarts
+var statusEpoch = null;
+var statusSeq = null;
+
+function applyStatusBatch(seq, statuses) {
+    if (statusSeq !== null && seq <= statusSeq) {
+        return; // Already applied through a resync
+    }
+    statusSeq = seq;
+    statuses.forEach(handleServiceStatus);
+}
+
+// Ask the server for the batches missed since statusSeq, or a snapshot if too far behind
+function resyncStatus() {
+    service_socket.emit('resync_status', { epoch: statusEpoch, seq: statusSeq }, function(response) {
+        statusEpoch = response.epoch;
+        if (response.deltas) {
+            response.deltas.forEach(function(batch) {
+                applyStatusBatch(batch.seq, batch.statuses);
+            });
+            return;
+        }
+        if (response.snapshot) {
+            response.snapshot.forEach(function(state) {
+                updateLaunchButtonState(state[0], state[1]);
+            });
+        }
+        statusSeq = response.seq;
+    });
+}
+
+service_socket.on('service_status_batch', function(batch) {
+    if (statusSeq !== null && (batch.epoch !== statusEpoch || batch.seq > statusSeq + 1)) {
+        resyncStatus(); // A batch was missed; the resync replays it along with this one
+        return;
+    }
+    statusEpoch = batch.epoch;
+    applyStatusBatch(batch.seq, batch.statuses);
 });
 
 function startService(serviceId, btn) {
@@ -134,6 +214,9 @@ document.addEventListener('DOMContentLoaded', function () {
 
 function updateLaunchButtonState(serviceId, is_running) {
     const launchButton = document.getElementById('launchButton-' + serviceId);
+    if (!launchButton) {
+        return;
+    }
     if (is_running) {
         launchButton.classList.remove('is-disabled');
         launchButton.classList.add('has-text-white');
@@ -169,8 +252,8 @@ function refreshSocketConnection(serviceId, is_opening_modal) {
     if(is_opening_modal) {
         // Open the socket connection
 
-        // Request the logs
-        service_socket.emit('get_logs', { serviceId: serviceId, command: 'start' });
+        // Request the most recent logs; the ack carries the cursor for paging back
+        requestLogs(serviceId);
 
         service_socket.on('get_logs_failed', function(data) {
             if (data.service_id === serviceId) {
@@ -180,19 +263,18 @@ function refreshSocketConnection(serviceId, is_opening_modal) {
             }
         });
 
-        // Listen for log messages
-        service_socket.on('log_message', function(data) {
-            var logElement = document.querySelector('#logs-' + data.service_id);
-            if (logElement) {
-                var logLine = document.createElement('div');
-                logLine.className = 'log-line';
-                logLine.textContent = data.log;
-        
-                logElement.appendChild(logLine);
-
-                // Scroll log container to the bottom
-                scrollLogsToBottom(data.service_id);
-            }
+        // Listen for batches of log lines; acknowledging a batch lets the server send the next one
+        service_socket.on('log_message', function(data, ack) {
+            var lines = data.deflated ? inflateLines(data.deflated) : Promise.resolve(data.lines);
+            lines.then(function(lines) {
+                renderLogLines(data.service_id, lines, data.skipped);
+            }).catch(function(error) {
+                console.error('Error decoding log batch:', error);
+            }).finally(function() {
+                if (ack) {
+                    ack();
+                }
+            });
         });
 
         // Request the stats
@@ -209,19 +291,15 @@ function refreshSocketConnection(serviceId, is_opening_modal) {
         // Listen for stats
         service_socket.on('stats_message', function(data) {
             if (data.service_id === serviceId) {
-                var cpuElement = document.querySelector('#cpu-usage-' + data.service_id);
-                var memoryElement = document.querySelector('#mem-usage-' + data.service_id);
-                var diskElement = document.querySelector('#disk-usage-' + data.service_id);
+                renderStats(data);
+            }
+        });
 
-                if (cpuElement) {
-                    cpuElement.value = data.stats.cpu_usage;
-                }
-                if (memoryElement) {
-                    memoryElement.value = data.stats.memory_usage;
-                }
-                if (diskElement) {
-                    diskElement.value = data.stats.disk_usage;
-                }
+        // Compact sessions get stats as packed binary frames
+        service_socket.on('stats_packed', function(frame) {
+            var data = unpackStats(frame);
+            if (data.service_id === serviceId) {
+                renderStats(data);
             }
         });
     } else {
@@ -233,6 +311,40 @@ function refreshSocketConnection(serviceId, is_opening_modal) {
         service_socket.emit('get_stats', { serviceId: serviceId, command: 'stop' });
         service_socket.off('get_stats_failed');
         service_socket.off('stats_message');
+        service_socket.off('stats_packed');
+    }
+}
+
+function renderLogLines(serviceId, lines, skipped) {
+    var logElement = document.querySelector('#logs-' + serviceId);
+    if (logElement) {
+        var fragment = document.createDocumentFragment();
+        lines.forEach(function(line, index) {
+            var logLine = document.createElement('div');
+            logLine.className = index === 0 && skipped ? 'log-line log-skipped' : 'log-line';
+            logLine.textContent = line;
+            fragment.appendChild(logLine);
+        });
+        logElement.appendChild(fragment);
+
+        // Scroll log container to the bottom
+        scrollLogsToBottom(serviceId);
+    }
+}
+
+function renderStats(data) {
+    var cpuElement = document.querySelector('#cpu-usage-' + data.service_id);
+    var memoryElement = document.querySelector('#mem-usage-' + data.service_id);
+    var diskElement = document.querySelector('#disk-usage-' + data.service_id);
+
+    if (cpuElement) {
+        cpuElement.value = data.stats.cpu_usage;
+    }
+    if (memoryElement) {
+        memoryElement.value = data.stats.memory_usage;
+    }
+    if (diskElement) {
+        diskElement.value = data.stats.disk_usage;
     }
 }
 
@@ -292,6 +404,55 @@ function closeModal(serviceId) {
     refreshSocketConnection(serviceId, false);
 }
 
+// Cursor of the next older page of logs for each open service
+var logCursors = {};
+
+// (Re)subscribe to a service's logs with the filter typed into its log pane
+function requestLogs(serviceId) {
+    serviceId = parseInt(serviceId);
+    var filterElement = document.querySelector('#log-filter-' + serviceId);
+    var filter = filterElement ? filterElement.value : '';
+    clearLogs(serviceId);
+    service_socket.emit('get_logs', {
+        serviceId: serviceId,
+        command: 'start',
+        filter: filter,
+        regex: true,
+    }, function(ack) {
+        logCursors[serviceId] = ack ? ack.cursor : null;
+    });
+}
+
+function loadOlderLogs(serviceId) {
+    serviceId = parseInt(serviceId);
+    var cursor = logCursors[serviceId];
+    if (!cursor) {
+        showToast('No older logs');
+        return;
+    }
+    fetch(`/service/${serviceId}/logs?before=${encodeURIComponent(cursor)}`)
+    .then(response => response.json())
+    .then(data => {
+        if (data.error) {
+            showToast(data.error);
+            return;
+        }
+        logCursors[serviceId] = data.cursor;
+        var logElement = document.querySelector('#logs-' + serviceId);
+        if (logElement) {
+            var fragment = document.createDocumentFragment();
+            data.lines.forEach(function(entry) {
+                var logLine = document.createElement('div');
+                logLine.className = 'log-line';
+                logLine.textContent = entry.line;
+                fragment.appendChild(logLine);
+            });
+            logElement.insertBefore(fragment, logElement.firstChild);
+        }
+    })
+    .catch(error => console.error('Error:', error));
+}
+
 function clearLogs(serviceId) {
     var logElement = document.querySelector('#logs-' + serviceId);
     if (logElement) {
@@ -0,0 +1,367 @@
+"""In-memory container stats history with downsampled rollups persisted to the database."""
+import logging
+import math
+import threading
+import time
+from array import array
+from sqlalchemy import and_, or_
+from app.extensions import db
+
+logger = logging.getLogger(__name__)
+
+# Rollup bucket widths in seconds, and how long each is kept
+RESOLUTIONS = (60, 600, 3600)
+RETENTION = {60: 2 * 24 * 3600, 600: 14 * 24 * 3600, 3600: 365 * 24 * 3600}
+RESOLUTION_NAMES = {"1m": 60, "10m": 600, "1h": 3600}
+
+# Summarized stats keys, in the order they are stored
+FIELDS = ("cpu", "memory", "disk")
+STATS_KEYS = ("cpu_usage", "memory_usage", "disk_usage")
+
+
+class _Ring:
+    """Fixed-capacity ring of raw samples, one flat array per field."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = array("d", [0.0]) * capacity
+        self.values = [array("d", [math.nan]) * capacity for _ in FIELDS]
+        self.head = 0
+        self.count = 0
+
+    def append(self, timestamp, values) -> None:
+        self.times[self.head] = timestamp
+        for column, value in zip(self.values, values):
+            column[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    @property
+    def oldest(self) -> float:
+        if not self.count:
+            return None
+        return self.times[(self.head - self.count) % self.capacity]
+
+    def window(self, since, until) -> list:
+        """Get the raw samples in [since, until) as (timestamp, values) tuples, oldest first."""
+        points = []
+        for offset in range(self.count):
+            position = (self.head - self.count + offset) % self.capacity
+            timestamp = self.times[position]
+            if since <= timestamp < until:
+                points.append((timestamp, [column[position] for column in self.values]))
+        return points
+
+
+class _Bucket:
+    """Running average and maximum of each field over one rollup bucket."""
+
+    __slots__ = ("start", "samples", "sums", "counts", "maxes")
+
+    def __init__(self, start):
+        self.start = start
+        self.samples = 0
+        self.sums = [0.0] * len(FIELDS)
+        self.counts = [0] * len(FIELDS)
+        self.maxes = [None] * len(FIELDS)
+
+    def add(self, values) -> None:
+        self.samples += 1
+        for position, value in enumerate(values):
+            if math.isnan(value):
+                continue
+            self.sums[position] += value
+            self.counts[position] += 1
+            if self.maxes[position] is None or value > self.maxes[position]:
+                self.maxes[position] = value
+
+    def averages(self) -> list:
+        return [
+            total / count if count else None for total, count in zip(self.sums, self.counts)
+        ]
+
+    def to_row(self, service_id, resolution) -> dict:
+        row = {
+            "service_id": service_id,
+            "resolution": resolution,
+            "bucket": self.start,
+            "samples": self.samples,
+        }
+        for field, average, maximum in zip(FIELDS, self.averages(), self.maxes):
+            row[f"{field}_avg"] = average
+            row[f"{field}_max"] = maximum
+        return row
+
+
+class StatsHistory:
+    """Class to keep a compact stats history for every managed service.
+
+    Recent raw samples live in a fixed-size, array-backed ring per service.
+    Every sample also updates running 1m, 10m and 1h rollup buckets. Every
+    `flush_interval` seconds the buckets that changed since the last flush
+    are written to the `service_stat` table in one batch, buckets whose time
+    has passed are dropped from memory, and old rollups are pruned by
+    resolution. Samples come from the live
+    stats streams and, for services nobody is watching, from the host
+    overview's concurrent sampling round every `sample_interval` seconds.
+    """
+
+    def __init__(self, raw_capacity=720, sample_interval=30, flush_interval=60, max_points=500):
+        self.raw_capacity = raw_capacity
+        self.sample_interval = sample_interval
+        self.flush_interval = flush_interval
+        self.max_points = max_points
+        self.app = None
+        self.model = None
+        self.rows_written = 0
+        self.started = False
+        self._lock = threading.Lock()
+        self._rings = {}
+        self._buckets = {}
+        self._dirty = set()
+        self._closed = []
+        self._last_sample = {}
+
+    def init_app(self, app, model) -> None:
+        """Bind the store to an app and the model rollups are persisted to."""
+        self.app = app
+        self.model = model
+
+    def start(self) -> None:
+        """Start the background sampler and flusher."""
+        self.started = True
+        threading.Thread(target=self._sample_forever, daemon=True).start()
+        threading.Thread(target=self._flush_forever, daemon=True).start()
+
+    def record(self, service_id, stats, timestamp=None) -> bool:
+        """Record a summarized stats sample.
+
+        Samples closer than 90% of `sample_interval` to the previous one are
+        ignored, so a live 1 Hz stream and the sampler yield evenly spaced history.
+        Nothing is kept until `start`, so workers that never flush don't buffer rollups.
+
+        Returns:
+            bool: True if the sample was stored.
+        """
+        if not self.started:
+            return False
+        timestamp = timestamp or time.time()
+        values = [_number(stats.get(key)) for key in STATS_KEYS]
+        with self._lock:
+            last = self._last_sample.get(service_id)
+            if last is not None and timestamp - last < self.sample_interval * 0.9:
+                return False
+            self._last_sample[service_id] = timestamp
+            ring = self._rings.get(service_id)
+            if ring is None:
+                ring = self._rings[service_id] = _Ring(self.raw_capacity)
+            ring.append(timestamp, values)
+            for resolution in RESOLUTIONS:
+                key = (service_id, resolution)
+                start = int(timestamp) // resolution * resolution
+                bucket = self._buckets.get(key)
+                if bucket is None or bucket.start != start:
+                    if key in self._dirty:
+                        self._closed.append(bucket.to_row(service_id, resolution))
+                    bucket = self._buckets[key] = _Bucket(start)
+                bucket.add(values)
+                self._dirty.add(key)
+        return True
+
+    def flush(self) -> int:
+        """Write the rollup buckets that changed and prune expired ones in one transaction.
+
+        Buckets whose time has passed are dropped from memory, so services
+        that stopped long ago cost nothing per flush.
+
+        Returns:
+            int: The number of rollup rows written.
+        """
+        now = int(time.time())
+        with self._lock:
+            rows = self._closed + [
+                self._buckets[key].to_row(*key) for key in self._dirty
+            ]
+            self._closed = []
+            self._dirty.clear()
+            self._evict(now)
+        if not rows:
+            return 0
+        model = self.model
+        # Rows of one resolution mostly share a bucket start, so the delete
+        # has a handful of terms however many services there are
+        targets = {}
+        for row in rows:
+            targets.setdefault((row["resolution"], row["bucket"]), set()).add(row["service_id"])
+        with self.app.app_context():
+            try:
+                # Buckets are rewritten on every flush they changed in until they close
+                model.query.filter(
+                    or_(
+                        *[
+                            and_(
+                                model.resolution == resolution,
+                                model.bucket == bucket,
+                                model.service_id.in_(service_ids),
+                            )
+                            for (resolution, bucket), service_ids in targets.items()
+                        ]
+                    )
+                ).delete(synchronize_session=False)
+                db.session.bulk_insert_mappings(model, rows)
+                model.query.filter(
+                    or_(
+                        *[
+                            and_(model.resolution == resolution, model.bucket < now - keep)
+                            for resolution, keep in RETENTION.items()
+                        ]
+                    )
+                ).delete(synchronize_session=False)
+                db.session.commit()
+            except Exception as e:  # pylint: disable=broad-except
+                db.session.rollback()
+                logger.error("Error persisting stats rollups: %s", e)
+                with self._lock:
+                    self._closed = [row for row in rows if self._is_closed(row)] + self._closed
+                    self._dirty.update(
+                        (row["service_id"], row["resolution"])
+                        for row in rows
+                        if not self._is_closed(row)
+                    )
+                return 0
+        self.rows_written += len(rows)
+        return len(rows)
+
+    def query(self, service_id, since=None, until=None, resolution="auto") -> dict:
+        """Get a window of a service's stats at a chosen resolution.
+
+        Args:
+            service_id (int): The service to get history for.
+            since (float, optional): Window start, epoch seconds. Defaults to an hour
+                before `until`.
+            until (float, optional): Window end, epoch seconds. Defaults to now.
+            resolution (str, optional): "raw", "1m", "10m", "1h" or "auto", which
+                picks the finest resolution that covers the window in at most
+                `max_points` points.
+
+        Returns:
+            dict: Column arrays `t`, `cpu`, `memory`, `disk` (and `*_max` for rollups).
+
+        Raises:
+            ValueError: If the resolution is unknown.
+        """
+        until = float(until) if until else time.time()
+        since = float(since) if since else until - 3600
+        if resolution == "auto":
+            resolution = self._pick_resolution(service_id, since, until)
+        if resolution == "raw":
+            with self._lock:
+                ring = self._rings.get(service_id)
+                points = ring.window(since, until) if ring else []
+            series = {"t": [timestamp for timestamp, _ in points]}
+            for position, field in enumerate(FIELDS):
+                series[field] = [_json_number(values[position]) for _, values in points]
+            return {"service_id": service_id, "resolution": "raw", **series}
+        if resolution not in RESOLUTION_NAMES:
+            raise ValueError(f"Unknown resolution {resolution}")
+
+        width = RESOLUTION_NAMES[resolution]
+        model = self.model
+        columns = [column.key for column in model.__table__.columns]
+        rows = {
+            row.bucket: {column: getattr(row, column) for column in columns}
+            for row in model.query.filter(
+                model.service_id == service_id,
+                model.resolution == width,
+                model.bucket >= int(since) // width * width,
+                model.bucket < until,
+            ).order_by(model.bucket)
+        }
+        with self._lock:
+            bucket = self._buckets.get((service_id, width))
+            if bucket is not None and since <= bucket.start + width and bucket.start < until:
+                rows[bucket.start] = bucket.to_row(service_id, width)
+        ordered = [rows[start] for start in sorted(rows)]
+        series = {"t": [row["bucket"] for row in ordered]}
+        for field in FIELDS:
+            series[field] = [row[f"{field}_avg"] for row in ordered]
+            series[f"{field}_max"] = [row[f"{field}_max"] for row in ordered]
+        return {"service_id": service_id, "resolution": resolution, **series}
+
+    def stats(self) -> dict:
+        """Get the number of services tracked, buffered rows and rows written."""
+        with self._lock:
+            return {
+                "services": len(self._rings),
+                "open_buckets": len(self._buckets),
+                "pending_rows": len(self._closed) + len(self._dirty),
+                "rows_written": self.rows_written,
+                "sample_interval": self.sample_interval,
+            }
+
+    def _pick_resolution(self, service_id, since, until) -> str:
+        with self._lock:
+            ring = self._rings.get(service_id)
+            oldest = ring.oldest if ring else None
+        span = until - since
+        fits_raw = span / self.sample_interval <= self.max_points
+        if oldest is not None and oldest <= since and fits_raw:
+            return "raw"
+        for name, width in RESOLUTION_NAMES.items():
+            if span / width <= self.max_points:
+                return name
+        return "1h"
+
+    def _evict(self, now) -> None:
+        """Drop ended buckets and stale rings (caller holds the lock, after queuing dirty rows).
+
+        A bucket is kept for one more `sample_interval` after it ends, for
+        samples that are timestamped a little before they are recorded.
+        """
+        for key, bucket in list(self._buckets.items()):
+            if bucket.start + key[1] + self.sample_interval <= now:
+                del self._buckets[key]
+        horizon = now - self.raw_capacity * self.sample_interval
+        for service_id, last in list(self._last_sample.items()):
+            if last < horizon:
+                # Every raw sample of a service stopped this long ago has aged out
+                del self._last_sample[service_id]
+                self._rings.pop(service_id, None)
+
+    def _is_closed(self, row) -> bool:
+        """Check whether a rollup row is for a bucket that has closed (caller holds the lock)."""
+        bucket = self._buckets.get((row["service_id"], row["resolution"]))
+        return bucket is None or bucket.start != row["bucket"]
+
+    def _sample_forever(self) -> None:
+        """Record the host overview's one-shot samples for services nobody is streaming."""
+        while True:
+            time.sleep(self.sample_interval)
+            try:
+                overview = self.app.docker_manager.host_overview.snapshot()
+            except Exception as e:  # pylint: disable=broad-except
+                logger.debug("Stats sampling round failed: %s", e)
+                continue
+            for container in overview["containers"]:
+                if container["available"]:
+                    self.record(container["service_id"], container, overview["timestamp"])
+
+    def _flush_forever(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+##### Static methods #####
+def _number(value) -> float:
+    """Convert a summarized stats value to a float, with NaN for missing values."""
+    return float(value) if isinstance(value, (int, float)) else math.nan
+
+
+def _json_number(value) -> float:
+    """Convert a stored float back to a JSON-safe value."""
+    return None if math.isnan(value) else value
+
+
+# Shared by the stats hub, the startup pipeline and the routes
+stats_history = StatsHistory()
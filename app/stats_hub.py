@@ -0,0 +1,194 @@
+"""Shared, reference-counted container stats sampling pushed to Socket.IO rooms."""
+import logging
+import threading
+import time
+from flask_socketio import join_room, leave_room
+from app.wire_format import STATS_PACKED, pack_stats
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "/service"
+
+
+class _StatsStream:
+    """A single upstream Docker stats stream and the sessions reading it."""
+
+    def __init__(self, service_id, upstream):
+        self.service_id = service_id
+        self.upstream = upstream
+        self.subscribers = set()
+        self.packed = set()
+        self.latest = None
+        self.closed = False
+
+    @property
+    def room(self) -> str:
+        return stats_room(self.service_id)
+
+    @property
+    def packed_room(self) -> str:
+        return stats_room(self.service_id, packed=True)
+
+
+class StatsHub:
+    """Class to share one Docker stats stream per service between every subscribed session.
+
+    Samples are summarized once and pushed to the service's stats room no
+    more often than `max_push_rate` times per second. The upstream stream is
+    released when the last subscriber leaves. Sessions that negotiated compact
+    mode sit in a second room that is sent packed binary frames.
+    """
+
+    def __init__(
+        self, socketio, max_push_rate=1.0, on_stream_end=None, on_sample=None, wire_modes=None
+    ):
+        self.socketio = socketio
+        self.max_push_rate = max_push_rate
+        self.on_stream_end = on_stream_end
+        self.on_sample = on_sample
+        self.wire_modes = wire_modes
+        self._lock = threading.Lock()
+        self._streams = {}
+
+    def subscribe(self, sid, service_id, open_upstream) -> bool:
+        """Subscribe a socket session to a service's stats.
+
+        Args:
+            sid (str): Socket.IO session id.
+            service_id (int): The service whose stats to stream.
+            open_upstream (callable): Opens an iterator of summarized stats; only
+                called when no stream is open for the service yet. May return None.
+
+        Returns:
+            bool: True if the session is now receiving stats.
+        """
+        upstream = None
+        while True:
+            with self._lock:
+                stream = self._streams.get(service_id)
+                if stream is None and upstream is not None:
+                    stream = _StatsStream(service_id, upstream)
+                    upstream = None
+                    self._streams[service_id] = stream
+                    self.socketio.start_background_task(self._pump, stream)
+                    logger.info("Opened stats stream for service %s", service_id)
+                if stream is not None:
+                    latest = stream.latest
+                    stream.subscribers.add(sid)
+                    is_packed = bool(self.wire_modes) and self.wire_modes.accepts(sid, STATS_PACKED)
+                    if is_packed:
+                        stream.packed.add(sid)
+                    break
+            # Opening the upstream waits on Docker, so it's done without the lock
+            upstream = open_upstream()
+            if upstream is None:
+                return False
+        if upstream is not None:
+            # Another session opened the service's stream in the meantime
+            _close(upstream)
+
+        join_room(stream.packed_room if is_packed else stream.room, sid=sid, namespace=NAMESPACE)
+        if latest is not None:
+            if is_packed:
+                self._emit(service_id, latest, packed_to=sid)
+            else:
+                self._emit(service_id, latest, json_to=sid)
+        return True
+
+    def unsubscribe(self, sid, service_id) -> None:
+        """Unsubscribe a socket session, releasing the upstream if it was the last one."""
+        with self._lock:
+            stream = self._streams.get(service_id)
+            if stream is None or sid not in stream.subscribers:
+                return
+            stream.subscribers.discard(sid)
+            stream.packed.discard(sid)
+            if not stream.subscribers:
+                # The pump notices on its next sample and closes the upstream
+                stream.closed = True
+                del self._streams[service_id]
+                logger.info("Releasing stats stream for service %s", service_id)
+
+        leave_room(stats_room(service_id), sid=sid, namespace=NAMESPACE)
+        leave_room(stats_room(service_id, packed=True), sid=sid, namespace=NAMESPACE)
+
+    def subscriber_count(self, service_id) -> int:
+        """Get the number of sessions reading a service's stats."""
+        with self._lock:
+            stream = self._streams.get(service_id)
+            return len(stream.subscribers) if stream else 0
+
+    def _pump(self, stream) -> None:
+        """Read samples from the upstream and push them to the room at the capped rate."""
+        min_interval = 1.0 / self.max_push_rate if self.max_push_rate else 0.0
+        last_push = 0.0
+        try:
+            for stats in stream.upstream:
+                if stream.closed:
+                    break
+                stream.latest = stats
+                if self.on_sample:
+                    self.on_sample(stream.service_id, stats)
+                now = time.monotonic()
+                if now - last_push < min_interval:
+                    continue
+                last_push = now
+                with self._lock:
+                    has_json = len(stream.subscribers) > len(stream.packed)
+                    has_packed = bool(stream.packed)
+                self._emit(
+                    stream.service_id,
+                    stats,
+                    stream.room if has_json else None,
+                    stream.packed_room if has_packed else None,
+                )
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error("Stats stream for service %s failed: %s", stream.service_id, e)
+        finally:
+            with self._lock:
+                is_current = self._streams.get(stream.service_id) is stream
+                if is_current:
+                    del self._streams[stream.service_id]
+            if is_current:
+                logger.info("Stats stream for service %s ended upstream", stream.service_id)
+                self.socketio.close_room(stream.room, namespace=NAMESPACE)
+                self.socketio.close_room(stream.packed_room, namespace=NAMESPACE)
+                if self.on_stream_end:
+                    self.on_stream_end(stream.service_id, set(stream.subscribers))
+            _close(stream.upstream)
+
+
+    def _emit(self, service_id, stats, json_to=None, packed_to=None) -> None:
+        """Send a sample as JSON and/or as a packed binary frame, each encoded once.
+
+        Rooms only hold this process's sessions, so the emits skip any message queue.
+        """
+        payload = {"service_id": service_id, "stats": stats}
+        if json_to:
+            self.socketio.emit(
+                "stats_message", payload, to=json_to, namespace=NAMESPACE, ignore_queue=True
+            )
+        if packed_to:
+            frame = pack_stats(service_id, stats)
+            if self.wire_modes:
+                self.wire_modes.record(payload, len(frame))
+            self.socketio.emit(
+                "stats_packed", frame, to=packed_to, namespace=NAMESPACE, ignore_queue=True
+            )
+
+
+##### Static methods #####
+def stats_room(service_id, packed=False) -> str:
+    """Get the Socket.IO room name for a service's stats stream."""
+    return f"stats-{service_id}-packed" if packed else f"stats-{service_id}"
+
+
+def _close(upstream) -> None:
+    """Close an upstream stats stream, if it can be closed, ignoring errors."""
+    close = getattr(upstream, "close", None)
+    if close is None:
+        return
+    try:
+        close()
+    except Exception as e:  # pylint: disable=broad-except
+        logger.debug("Error closing stats stream: %s", e)
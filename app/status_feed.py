@@ -0,0 +1,100 @@
+"""Versioned snapshot of every service's status for pollers and event streams."""
+import hashlib
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StatusFeed:
+    """Class to serve every service's status with a version that changes only when they do.
+
+    Statuses are derived from the cached landing page view model, so a poll
+    never queries the database unless that cache was invalidated. Waiters
+    blocked in `wait` are woken by `changed`, which the view cache calls on
+    every invalidation.
+
+    The tag is a digest of the statuses themselves, so every worker process
+    serving the same statuses gives the same tag: a long poll or an event
+    stream that reconnects to another worker only gets a full payload when
+    something actually changed, and a restart keeps tags valid. `version`
+    counts the changes this process has seen, for metrics.
+    """
+
+    def __init__(self, view_cache):
+        self.view_cache = view_cache
+        self.version = 0
+        self.tag = status_tag([])
+        self.waiting = 0
+        self._condition = threading.Condition()
+        self._statuses = None
+        self._changes = 0
+
+    def current(self) -> tuple:
+        """Get the current tag and statuses, re-tagging them if they changed.
+
+        Returns:
+            tuple: (tag, list of status dicts).
+        """
+        statuses = service_statuses(self.view_cache.get())
+        with self._condition:
+            if statuses != self._statuses:
+                self._statuses = statuses
+                self.tag = status_tag(statuses)
+                self.version += 1
+            return self.tag, self._statuses
+
+    def wait(self, tag, timeout) -> tuple:
+        """Block until the statuses no longer match a tag, or the timeout passes.
+
+        Returns:
+            tuple: (tag, statuses) as from `current`; the tag equals the one
+                passed in if nothing changed before the timeout.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            changes = self._changes
+            current_tag, statuses = self.current()
+            remaining = deadline - time.monotonic()
+            if current_tag != tag or remaining <= 0:
+                return current_tag, statuses
+            with self._condition:
+                # Don't sleep through a change that landed while the statuses were read
+                if changes != self._changes:
+                    continue
+                self.waiting += 1
+                try:
+                    self._condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+
+    def changed(self) -> None:
+        """Wake every waiter so it re-reads the statuses."""
+        with self._condition:
+            self._changes += 1
+            self._condition.notify_all()
+
+
+##### Static methods #####
+def status_tag(statuses) -> str:
+    """Get the entity tag for a list of statuses, the same in every worker process."""
+    encoded = json.dumps(statuses, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()[:16]
+
+
+def service_statuses(site) -> list:
+    """Get the status of every service in a site view model, ordered by id."""
+    if site is None:
+        return []
+    return [
+        {
+            "service_id": service.id,
+            "service_name": service.name,
+            "is_running": service.is_running,
+            "is_disabled": service.is_disabled,
+            "url": service.url,
+        }
+        for service in sorted(site.services, key=lambda service: service.id)
+    ]
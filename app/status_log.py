@@ -0,0 +1,92 @@
+"""Short in-memory log of sequenced service status broadcasts."""
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class StatusLog:
+    """Class to number service status broadcasts and replay them to reconnecting clients.
+
+    Every broadcast batch of status changes gets the next sequence number and
+    is kept in a ring of the last `capacity` batches. A client that
+    reconnects sends the last sequence it applied and gets back only the
+    batches it missed. If it is too far behind, or its sequence is from
+    before a restart (the `epoch` differs), it is told to take a snapshot
+    instead.
+    """
+
+    def __init__(self, capacity=256):
+        self.epoch = int(time.time())
+        self.seq = 0
+        self.replays = 0
+        self.snapshots = 0
+        self._lock = threading.Lock()
+        self._batches = deque(maxlen=capacity)
+
+    @property
+    def capacity(self) -> int:
+        return self._batches.maxlen
+
+    @capacity.setter
+    def capacity(self, capacity) -> None:
+        with self._lock:
+            self._batches = deque(self._batches, maxlen=capacity)
+
+    def append(self, statuses) -> int:
+        """Record a batch of status changes.
+
+        Returns:
+            int: The batch's sequence number.
+        """
+        with self._lock:
+            self.seq += 1
+            self._batches.append((self.seq, statuses))
+            return self.seq
+
+    def adopt(self, epoch, seq, statuses) -> bool:
+        """Record a batch numbered by another worker, so this one can replay it too.
+
+        A batch from a different epoch (a new leader, or one that restarted)
+        replaces the whole log.
+
+        Returns:
+            bool: True if the batch was new to this worker.
+        """
+        with self._lock:
+            if epoch == self.epoch and seq <= self.seq:
+                return False
+            if epoch != self.epoch:
+                self.epoch = epoch
+                self._batches.clear()
+            self.seq = seq
+            self._batches.append((seq, statuses))
+            return True
+
+    def since(self, epoch, seq):
+        """Get the batches a client missed after applying `seq`.
+
+        Returns:
+            list: (seq, statuses) pairs in order, or None if the client must
+                take a snapshot instead.
+        """
+        with self._lock:
+            oldest = self._batches[0][0] if self._batches else self.seq + 1
+            if epoch != self.epoch or seq is None or seq > self.seq or seq + 1 < oldest:
+                self.snapshots += 1
+                return None
+            self.replays += 1
+            return [(batch_seq, batch) for batch_seq, batch in self._batches if batch_seq > seq]
+
+    def stats(self) -> dict:
+        """Get the current sequence and how resyncs were served."""
+        with self._lock:
+            return {
+                "epoch": self.epoch,
+                "seq": self.seq,
+                "buffered": len(self._batches),
+                "replays": self.replays,
+                "snapshots": self.snapshots,
+            }
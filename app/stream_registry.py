@@ -0,0 +1,101 @@
+"""Registry of live per-session stream subscriptions."""
+import logging
+import threading
+from collections import Counter
+from enum import Enum
+
+logger = logging.getLogger(__name__)
+
+
+class StreamKind(str, Enum):
+    """Kinds of stream a socket session can subscribe to."""
+
+    LOGS = "logs"
+    STATS = "stats"
+
+
+class StreamLimitReached(Exception):
+    """Exception raised when a new subscription would exceed the stream caps."""
+
+    def __init__(self, message="Too many live streams"):
+        self.message = message
+        super().__init__(self.message)
+
+
+class StreamRegistry:
+    """Class to track live stream subscriptions keyed by (sid, service_id, kind).
+
+    Each socket session's subscriptions are tracked independently, so one
+    session stopping a stream never affects another, and everything a session
+    held can be released when it disconnects.
+    """
+
+    def __init__(self, max_streams=None, max_streams_per_session=None):
+        self.max_streams = max_streams
+        self.max_streams_per_session = max_streams_per_session
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+
+    def add(self, sid, service_id, kind) -> bool:
+        """Register a subscription.
+
+        Returns:
+            bool: True if the subscription is new, False if it already existed.
+
+        Raises:
+            StreamLimitReached: If the global or per-session cap would be exceeded.
+        """
+        key = (sid, service_id, StreamKind(kind))
+        with self._lock:
+            if key in self._subscriptions:
+                return False
+            if self.max_streams and len(self._subscriptions) >= self.max_streams:
+                raise StreamLimitReached()
+            if self.max_streams_per_session and (
+                sum(1 for sub in self._subscriptions if sub[0] == sid)
+                >= self.max_streams_per_session
+            ):
+                raise StreamLimitReached("Too many live streams for this session")
+            self._subscriptions.add(key)
+        return True
+
+    def remove(self, sid, service_id, kind) -> bool:
+        """Unregister a subscription.
+
+        Returns:
+            bool: True if the subscription existed.
+        """
+        key = (sid, service_id, StreamKind(kind))
+        with self._lock:
+            if key not in self._subscriptions:
+                return False
+            self._subscriptions.discard(key)
+        return True
+
+    def remove_session(self, sid) -> list:
+        """Unregister every subscription held by a session.
+
+        Returns:
+            list: The removed (sid, service_id, kind) keys.
+        """
+        with self._lock:
+            removed = [sub for sub in self._subscriptions if sub[0] == sid]
+            self._subscriptions.difference_update(removed)
+        if removed:
+            logger.info("Released %s streams for session %s", len(removed), sid)
+        return removed
+
+    def has(self, sid, service_id, kind) -> bool:
+        """Check whether a subscription is registered."""
+        with self._lock:
+            return (sid, service_id, StreamKind(kind)) in self._subscriptions
+
+    def counts(self) -> dict:
+        """Get the number of live subscriptions for each stream kind."""
+        with self._lock:
+            counts = Counter(sub[2].value for sub in self._subscriptions)
+        return {kind.value: counts.get(kind.value, 0) for kind in StreamKind}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._subscriptions)
@@ -0,0 +1,149 @@
+"""Read-through cache of the landing page's site/service view model."""
+import logging
+import threading
+import time
+from types import SimpleNamespace
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app.models import Site, Contact, About, Service
+from app.models.service import (
+    EnvironmentVar,
+    DockerPort,
+    DockerLabel,
+    DockerVolume,
+    DockerDevice,
+    DockerHealthcheck,
+)
+
+logger = logging.getLogger(__name__)
+
+# Models whose committed changes make the cached view model stale
+WATCHED_MODELS = (
+    Site,
+    Contact,
+    About,
+    Service,
+    EnvironmentVar,
+    DockerPort,
+    DockerLabel,
+    DockerVolume,
+    DockerDevice,
+    DockerHealthcheck,
+)
+DIRTY_FLAG = "site_view_dirty"
+
+
+class SiteViewCache:
+    """Class to cache the landing page's view model as plain, session-free objects.
+
+    The view model is rebuilt on the first request after it is invalidated.
+    Any change to a site or service row committed through the ORM invalidates
+    it, which covers Flask-Admin edits, batched Docker events
+    (`Service.apply_docker_changes`) and the reconciler. State observed by
+    `Service.update_state` is written by `service_state.flush` with
+    `bulk_update_mappings`, which bypasses these session hooks, so the store's
+    `on_flush` callback calls `invalidate` explicitly (wired in `create_app`).
+    Other workers learn of this process's commits through `on_commit`, if set,
+    which is called after each commit that invalidated the cache (wired to the
+    message queue in `create_app`); the TTL bounds staleness when there is no
+    queue. `on_invalidate`, if set, is called after every invalidation.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.on_invalidate = None
+        self.on_commit = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._site = None
+        self._built_at = 0.0
+        self._generation = 0
+        self._watching = False
+
+    def get(self) -> SimpleNamespace:
+        """Get the site view model, building it if it is missing or stale."""
+        site = self._fresh()
+        if site is not None:
+            self.hits += 1
+            return site
+        with self._lock:
+            site = self._fresh()
+            if site is None:
+                self.misses += 1
+                generation = self._generation
+                site = build_site_view(Site.get_with_services())
+                # Don't keep a view built from rows that were changed mid-build
+                if generation == self._generation:
+                    self._site = site
+                    self._built_at = time.monotonic()
+            return site
+
+    def invalidate(self) -> None:
+        """Drop the cached view model."""
+        self._generation += 1
+        self._site = None
+        if self.on_invalidate:
+            self.on_invalidate()
+
+    def watch(self) -> None:
+        """Invalidate the cache whenever a watched model change is committed."""
+        if self._watching:
+            return
+        self._watching = True
+        event.listen(Session, "after_flush", _mark_dirty)
+        event.listen(Session, "after_commit", self._after_commit)
+        event.listen(Session, "after_rollback", _clear_dirty)
+
+    def _fresh(self) -> SimpleNamespace:
+        site = self._site
+        if site is not None and (not self.ttl or time.monotonic() - self._built_at < self.ttl):
+            return site
+        return None
+
+    def _after_commit(self, session) -> None:
+        if session.info.pop(DIRTY_FLAG, False):
+            logger.debug("Site view model invalidated")
+            self.invalidate()
+            if self.on_commit:
+                self.on_commit()
+
+
+##### Static methods #####
+def build_site_view(site) -> SimpleNamespace:
+    """Copy a loaded site graph into plain objects the templates can render without a session."""
+    if site is None:
+        return None
+    view = _columns(site)
+    view.contact = _columns(site.contact)
+    view.about = _columns(site.about)
+    view.services = []
+    for service in site.services:
+        service_view = _columns(service)
+        service_view.url = service.url
+        service_view.environment_vars = [_columns(env) for env in service.environment_vars]
+        service_view.docker_ports = [_columns(port) for port in service.docker_ports]
+        view.services.append(service_view)
+    return view
+
+
+def _columns(instance) -> SimpleNamespace:
+    """Copy an ORM instance's column values into a namespace."""
+    if instance is None:
+        return None
+    mapper = inspect(instance).mapper
+    return SimpleNamespace(
+        **{attr.key: getattr(instance, attr.key) for attr in mapper.column_attrs}
+    )
+
+
+def _mark_dirty(session, _flush_context) -> None:
+    if any(
+        isinstance(instance, WATCHED_MODELS)
+        for instance in (*session.new, *session.dirty, *session.deleted)
+    ):
+        session.info[DIRTY_FLAG] = True
+
+
+def _clear_dirty(session) -> None:
+    session.info.pop(DIRTY_FLAG, None)
@@ -0,0 +1,139 @@
+"""Opt-in compact encodings for high-volume /service messages."""
+import json
+import logging
+import math
+import struct
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Formats a client can negotiate; clients that never negotiate get JSON
+STATS_PACKED = "stats-packed-v1"
+LOGS_DEFLATE = "logs-deflate-v1"
+COMPACT_FORMATS = (STATS_PACKED, LOGS_DEFLATE)
+
+# service_id (uint32), cpu % (float32), memory bytes (float64), disk bytes (float64);
+# NaN stands in for a missing value
+STATS_STRUCT = struct.Struct("<Ifdd")
+
+
+class WireModes:
+    """Class to track which compact formats each socket session accepted.
+
+    It also keeps a running comparison of the bytes actually sent in compact
+    formats with what the same messages would have cost as JSON, to show what
+    compact mode saves on a slow link. Encoding a message as JSON only to
+    measure it costs as much as sending it, so only every `sample_every`th
+    message is measured and the JSON total is estimated from those samples.
+    """
+
+    def __init__(self, sample_every=32):
+        self.sample_every = sample_every
+        self.compact_bytes = 0
+        self.messages = 0
+        self.sampled_json_bytes = 0
+        self.sampled_compact_bytes = 0
+        self._lock = threading.Lock()
+        self._formats = {}
+        self._first_sent = None
+
+    def negotiate(self, sid, requested) -> list:
+        """Record the compact formats a session asked for and that the server supports.
+
+        Returns:
+            list: The accepted formats, to send back to the client.
+        """
+        accepted = [name for name in COMPACT_FORMATS if name in (requested or [])]
+        with self._lock:
+            if accepted:
+                self._formats[sid] = set(accepted)
+            else:
+                self._formats.pop(sid, None)
+        logger.debug("Session %s negotiated wire formats %s", sid, accepted)
+        return accepted
+
+    def accepts(self, sid, name) -> bool:
+        """Check whether a session negotiated a format."""
+        with self._lock:
+            return name in self._formats.get(sid, ())
+
+    def drop(self, sid) -> None:
+        """Forget a disconnected session."""
+        with self._lock:
+            self._formats.pop(sid, None)
+
+    def record(self, payload, compact_size) -> None:
+        """Count one compact message, measuring a sample against the size of `payload` as JSON."""
+        with self._lock:
+            if self._first_sent is None:
+                self._first_sent = time.monotonic()
+            self.compact_bytes += compact_size
+            self.messages += 1
+            sampled = self.sample_every <= 1 or self.messages % self.sample_every == 1
+        if not sampled:
+            return
+        size = json_size(payload)
+        with self._lock:
+            self.sampled_json_bytes += size
+            self.sampled_compact_bytes += compact_size
+
+    def stats(self) -> dict:
+        """Get the sessions using compact mode and the bytes per second it saved."""
+        with self._lock:
+            elapsed = time.monotonic() - self._first_sent if self._first_sent else 0.0
+            ratio = (
+                self.sampled_compact_bytes / self.sampled_json_bytes
+                if self.sampled_json_bytes
+                else None
+            )
+            json_bytes = round(self.compact_bytes / ratio) if ratio else 0
+            saved = json_bytes - self.compact_bytes
+            return {
+                "compact_sessions": len(self._formats),
+                "messages": self.messages,
+                "json_bytes": json_bytes,
+                "compact_bytes": self.compact_bytes,
+                "ratio": round(ratio, 3) if ratio is not None else None,
+                "saved_bytes_per_second": round(saved / elapsed, 1) if elapsed else None,
+            }
+
+
+##### Static methods #####
+def pack_stats(service_id, stats) -> bytes:
+    """Pack a summarized stats sample into a fixed 24-byte frame."""
+    return STATS_STRUCT.pack(
+        service_id,
+        _number(stats.get("cpu_usage")),
+        _number(stats.get("memory_usage")),
+        _number(stats.get("disk_usage")),
+    )
+
+
+def unpack_stats(frame) -> dict:
+    """Unpack a frame built by `pack_stats` (the inverse of what the browser does)."""
+    service_id, cpu, memory, disk = STATS_STRUCT.unpack(frame)
+    return {
+        "service_id": service_id,
+        "stats": {
+            "cpu_usage": None if math.isnan(cpu) else round(cpu, 2),
+            "memory_usage": None if math.isnan(memory) else int(memory),
+            "disk_usage": None if math.isnan(disk) else int(disk),
+        },
+    }
+
+
+def deflate_lines(lines) -> bytes:
+    """Compress a batch of log lines as raw deflate (`DecompressionStream("deflate-raw")`)."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    return compressor.compress("\n".join(lines).encode("utf-8")) + compressor.flush()
+
+
+def json_size(payload) -> int:
+    """Get the size of a payload encoded as a JSON text frame."""
+    return len(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+
+
+def _number(value) -> float:
+    return float(value) if isinstance(value, (int, float)) else math.nan
@@ -0,0 +1,34 @@
+"""Add the service start-order dependency
+
+Revision ID: 3f1c2a9d7e51
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7e51'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A new database has no tables yet; db.create_all() creates them complete
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('service'):
+        return
+    if 'depends_on_id' in {column['name'] for column in inspector.get_columns('service')}:
+        return
+    with op.batch_alter_table('service') as batch_op:
+        batch_op.add_column(sa.Column('depends_on_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_depends_on_id', 'service', ['depends_on_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('service') as batch_op:
+        batch_op.drop_constraint('fk_depends_on_id', type_='foreignkey')
+        batch_op.drop_column('depends_on_id')
@@ -0,0 +1,44 @@
+"""Add the service_stat rollup table
+
+Revision ID: 8a4e6b0c2d17
+Revises: 3f1c2a9d7e51
+Create Date: 2026-10-18 09:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e6b0c2d17'
+down_revision = '3f1c2a9d7e51'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A new database has no tables yet; db.create_all() creates them complete
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('service') or inspector.has_table('service_stat'):
+        return
+    op.create_table(
+        'service_stat',
+        sa.Column('service_id', sa.Integer(), nullable=False),
+        sa.Column('resolution', sa.Integer(), nullable=False),
+        sa.Column('bucket', sa.Integer(), nullable=False),
+        sa.Column('samples', sa.Integer(), nullable=False),
+        sa.Column('cpu_avg', sa.Float(), nullable=True),
+        sa.Column('cpu_max', sa.Float(), nullable=True),
+        sa.Column('memory_avg', sa.Float(), nullable=True),
+        sa.Column('memory_max', sa.Float(), nullable=True),
+        sa.Column('disk_avg', sa.Float(), nullable=True),
+        sa.Column('disk_max', sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ['service_id'], ['service.id'], name='fk_service_stat_service_id', ondelete='CASCADE'
+        ),
+        sa.PrimaryKeyConstraint('service_id', 'resolution', 'bucket'),
+    )
+
+
+def downgrade():
+    op.drop_table('service_stat')
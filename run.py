@@ -1,11 +1,13 @@
 """Python script passthrough to invoke the app with Gunicorn."""
+import os
 import subprocess
 
 def run_gunicorn():
     command = [
         "gunicorn",
         "-k", "eventlet",    # Worker class
-        "-w", "1",           # Number of workers
+        # Number of workers; more than one relays Socket.IO through Postgres
+        "-w", os.environ.get("WEB_CONCURRENCY", "1"),
         "--reload",          # Auto-reload on code changes
         "app:create_app()",  # Application factory
         "--bind", "0.0.0.0:5000"
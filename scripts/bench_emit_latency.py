@@ -0,0 +1,95 @@
+"""bench_emit_latency.py - Measure Socket.IO emit latency while slow database queries run.
+
+A ticker green thread emits every `--interval` seconds and records how late
+each emit went out, while `--queries` green threads keep running
+`SELECT pg_sleep(--sleep)` through the app's connection pool. The run is done
+once with psycopg2's default blocking waits and once with the eventlet wait
+callback the app installs, so the difference is the stall every open log and
+stats stream would see.
+
+Usage: python scripts/bench_emit_latency.py [--queries 8] [--sleep 0.25] [--seconds 5]
+Needs the app's Postgres database.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+#pylint: disable=wrong-import-position
+import eventlet
+from sqlalchemy import text
+from app import db, create_app
+from app.socket_events import socketio
+from app.green_db import make_psycopg_blocking, make_psycopg_green
+#pylint: enable=wrong-import-position
+
+
+def run_queries(app, sleep, deadline, counts):
+    """Run slow queries back to back until the deadline."""
+    with app.app_context():
+        while time.monotonic() < deadline:
+            db.session.execute(text("SELECT pg_sleep(:seconds)"), {"seconds": sleep})
+            db.session.rollback()
+            counts.append(1)
+        db.session.remove()
+
+
+def tick(interval, deadline, lags):
+    """Emit on a fixed schedule and record how late each emit went out."""
+    target = time.monotonic() + interval
+    while target < deadline:
+        eventlet.sleep(max(0.0, target - time.monotonic()))
+        lags.append(time.monotonic() - target)
+        socketio.emit("bench_tick", {"sent": time.time()}, namespace="/bench")
+        target += interval
+
+
+def measure(app, args) -> dict:
+    """Run the ticker alongside the slow queries and summarize the emit lag."""
+    with app.app_context():
+        # Connections only pick up the wait callback when they are created
+        db.engine.dispose()
+    lags, counts = [], []
+    deadline = time.monotonic() + args.seconds
+    pool = eventlet.GreenPool(args.queries + 1)
+    for _ in range(args.queries):
+        pool.spawn(run_queries, app, args.sleep, deadline, counts)
+    pool.spawn(tick, args.interval, deadline, lags)
+    pool.waitall()
+    lags.sort()
+    return {
+        "emits": len(lags),
+        "queries": len(counts),
+        "p50_ms": statistics.median(lags) * 1000,
+        "p95_ms": lags[int(len(lags) * 0.95) - 1] * 1000,
+        "max_ms": lags[-1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=8)
+    parser.add_argument("--sleep", type=float, default=0.25)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--interval", type=float, default=0.02)
+    args = parser.parse_args()
+
+    app = create_app(warmup=False)
+    print(
+        f"{args.queries} green threads running pg_sleep({args.sleep}) for {args.seconds}s, "
+        f"emitting every {args.interval * 1000:.0f}ms"
+    )
+    for name, install in (("blocking", make_psycopg_blocking), ("green", make_psycopg_green)):
+        install()
+        result = measure(app, args)
+        print(
+            f"{name:>9}: {result['emits']:4d} emits, {result['queries']:4d} queries, "
+            f"emit lag p50 {result['p50_ms']:7.1f}ms  p95 {result['p95_ms']:7.1f}ms  "
+            f"max {result['max_ms']:7.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,6 @@ from eralchemy2 import render_er
 from app import db, create_app
 
 # Generate intermediate markdown file
-app = create_app()
+app = create_app(warmup=False)
 with app.app_context():
     render_er(db.metadata, 'db_model.pdf')
@@ -0,0 +1,74 @@
+"""measure_wire.py - Compare JSON and compact Socket.IO payload sizes for a busy service.
+
+Synthesizes a Klipper-like log stream and 1 Hz stats, encodes them the way
+the log broker and stats hub do, and reports bytes per second and the time
+one minute of traffic takes over a slow link.
+
+Usage: python scripts/measure_wire.py [--lines-per-second 200] [--link-kbps 1000]
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.wire_format import deflate_lines, json_size, pack_stats
+
+TEMPLATES = (
+    "Stats {t:.1f}: gcodein=0 mcu: mcu_awake=0.004 mcu_task_avg=0.000012 bytes_write={n} "
+    "bytes_read={m} send_seq={n} receive_seq={n} retransmit_seq=2 srtt=0.001 rttvar=0.000",
+    "INFO:root:Receive: {n} {t:.3f} {t:.3f} 33: seq: 1{m}, identify_response offset=0",
+    "DEBUG:root:Sent {n} {t:.3f} {t:.3f} 12: seq: 13, queue_step oid=4 interval={m} count=1 add=0",
+    "extruder: target=210 temp={temp:.1f} pwm=0.412 heater_bed: target=60 temp=60.0 pwm=0.213",
+)
+
+
+def synthesize_lines(count, started):
+    """Build `count` lines shaped like a printer host's busy log output."""
+    return [
+        random.choice(TEMPLATES).format(
+            t=started + position / 100.0,
+            n=random.randint(10_000, 99_999),
+            m=random.randint(100, 9_999),
+            temp=random.uniform(205.0, 215.0),
+        )
+        for position in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines-per-second", type=int, default=200)
+    parser.add_argument("--batch-lines", type=int, default=200)
+    parser.add_argument("--link-kbps", type=int, default=1000)
+    parser.add_argument("--seconds", type=int, default=60)
+    args = parser.parse_args()
+
+    lines = synthesize_lines(args.lines_per_second * args.seconds, 1_000.0)
+    json_bytes = compact_bytes = 0
+    for start in range(0, len(lines), args.batch_lines):
+        batch = lines[start : start + args.batch_lines]
+        json_bytes += json_size({"service_id": 1, "lines": batch, "skipped": 0})
+        compact_bytes += len(deflate_lines(batch))
+
+    for second in range(args.seconds):
+        stats = {
+            "cpu_usage": random.uniform(5.0, 80.0),
+            "memory_usage": random.randint(100, 400) * 1024 * 1024,
+            "disk_usage": second * 4096,
+        }
+        json_bytes += json_size({"service_id": 1, "stats": stats})
+        compact_bytes += len(pack_stats(1, stats))
+
+    link_bytes = args.link_kbps * 1000 / 8
+    print(f"{args.lines_per_second} lines/s and 1 stats sample/s for {args.seconds}s")
+    for name, total in (("json", json_bytes), ("compact", compact_bytes)):
+        print(
+            f"{name:>8}: {total / args.seconds / 1024:8.1f} KiB/s, "
+            f"{total / link_bytes:6.1f}s to deliver over {args.link_kbps} kbit/s"
+        )
+    print(f"   ratio: {compact_bytes / json_bytes:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -23,7 +23,7 @@ from app.models.service import (
 
 # Create app context
 # NOTE: This must be done before reading environment variables
-app = create_app()
+app = create_app(warmup=False)
 
 # Read environment variables
 ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD") or "admin"
@@ -0,0 +1,48 @@
+"""Waiting on Postgres through the eventlet wait callback doesn't stall other green threads."""
+import socket
+import time
+import eventlet
+from psycopg2 import extensions
+from app.green_db import eventlet_wait_callback
+
+# Slow query time simulated per wait, and the worst emit lag allowed meanwhile
+QUERY_SECONDS = 0.5
+MAX_EMIT_LAG = 0.05
+
+
+class SlowConnection:
+    """Stand-in for a psycopg2 async connection whose result arrives after a delay."""
+
+    def __init__(self, delay):
+        self._reader, self._writer = socket.socketpair()
+        self._ready_at = time.monotonic() + delay
+        eventlet.spawn_after(delay, self._writer.send, b"x")
+
+    def fileno(self) -> int:
+        return self._reader.fileno()
+
+    def poll(self) -> int:
+        if time.monotonic() < self._ready_at:
+            return extensions.POLL_READ
+        return extensions.POLL_OK
+
+
+def tick(interval, deadline, lags):
+    """Emit on a fixed schedule and record how late each tick ran."""
+    target = time.monotonic() + interval
+    while target < deadline:
+        eventlet.sleep(max(0.0, target - time.monotonic()))
+        lags.append(time.monotonic() - target)
+        target += interval
+
+
+def test_slow_query_wait_does_not_delay_emits():
+    lags = []
+    deadline = time.monotonic() + QUERY_SECONDS
+    pool = eventlet.GreenPool(5)
+    for _ in range(4):
+        pool.spawn(eventlet_wait_callback, SlowConnection(QUERY_SECONDS))
+    pool.spawn(tick, 0.02, deadline, lags)
+    pool.waitall()
+    assert len(lags) > QUERY_SECONDS / 0.02 / 2
+    assert max(lags) < MAX_EMIT_LAG
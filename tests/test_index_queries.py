@@ -0,0 +1,87 @@
+"""The landing page's view model is built in a fixed number of queries."""
+import pytest
+from flask import Flask
+from sqlalchemy import event
+from app.extensions import db
+from app.models import Site, Contact, About, Service, EnvironmentVar
+from app.models.service import DockerPort, DockerVolume, DockerLabel
+from app.view_cache import build_site_view
+
+# Site with contact and about, the services, then one SELECT per service relationship
+MAX_INDEX_QUERIES = 2 + len(Service.graph_options())
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def add_site(service_count):
+    """Add a site with `service_count` services, each with a few rows in every relationship."""
+    contact = Contact(name="Ops", email="ops@example.com")
+    site = Site(
+        title="Site",
+        subtitle="Subtitle",
+        url="http://example.com",
+        logo="logo.png",
+        contact=contact,
+        about=About(title="About", description="About the site"),
+    )
+    for index in range(service_count):
+        service = Service(
+            name=f"service-{index}",
+            description="A service",
+            logo="logo.png",
+            docker_image="example/service",
+            docker_image_tag="latest",
+            site=site,
+        )
+        service.environment_vars = [
+            EnvironmentVar(key="SERVICE_DOMAIN", value="example.com"),
+            EnvironmentVar(key="SERVICE_PORT", value=str(8000 + index)),
+        ]
+        service.docker_ports = [DockerPort(container_port=80, host_port=8000 + index)]
+        service.docker_volumes = [DockerVolume(container_path="/data", host_path=f"/srv/{index}")]
+        service.docker_labels = [DockerLabel(key="tier", value="web")]
+    db.session.add(site)
+    db.session.commit()
+    db.session.expunge_all()
+
+
+def count_index_queries() -> int:
+    """Build the landing page's view model and count the SQL statements it took."""
+    statements = []
+
+    def count(*_args):
+        statements.append(1)
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        site = build_site_view(Site.get_with_services())
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+    assert len(site.services) > 0
+    return len(statements)
+
+
+@pytest.mark.parametrize("service_count", [1, 5, 40])
+def test_index_query_count_is_bounded(app, service_count):
+    add_site(service_count)
+    assert count_index_queries() <= MAX_INDEX_QUERIES
+
+
+def test_index_query_count_does_not_grow_with_services(app):
+    add_site(2)
+    few = count_index_queries()
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    add_site(30)
+    assert count_index_queries() == few